@@ -0,0 +1,438 @@
+"""Streamlit-free analysis pipeline shared by the app and the batch CLI
+
+Query validation, the per-mode system prompts, prompt assembly, PDF passage
+retrieval, the cached/pooled model call and entity extraction live here and
+take every shared object (model, pool, caches, extractor) as an argument, so
+``main.get_gemini_response`` and ``batch_cli`` build exactly the same prompts
+and ``st.session_state`` is never touched.
+"""
+import json
+import re
+
+from pdf_retrieval import estimate_tokens, format_passages, get_document_index
+from prompt_budget import Section, assemble, summarize
+from response_cache import make_key
+from scope_gate import KeywordMatcher, load_classifier
+
+# SSAM-related keywords
+SSAM_KEYWORDS = [
+    'csam', 'cold spray', 'uam', 'ultrasonic', 'fsam', 'friction stir',
+    'afsd', 'additive friction', 'solid state', 'solid-state',
+    'kinetic spray', 'supersonic', 'cold gas', 'friction', 'ultrasonic welding',
+    'microstructure', 'bonding', 'deposition', 'particle', 'substrate',
+    'aluminum', 'copper', 'titanium', 'metal', 'alloy', 'coating',
+    # process terms that rarely appear outside SSAM questions
+    'deposit', 'spray', 'splat', 'sonotrode', 'nozzle', 'powder', 'foil', 'weld density',
+    'stir zone', 'feedstock', 'feed rod', 'baseplate', 'build plate', 'standoff',
+    'recrystallization', 'interlayer', 'micrograph', 'tool pin', 'tool shoulder', 'process gas',
+    'critical velocity', 'residual stress', 'porosity', 'consolidation', 'ebsd',
+    'kinetic metallization', 'adiabatic shear', 'process window', 'traverse speed',
+    'rotation speed', 'de laval', 'inconel'
+]
+
+# Non-SSAM manufacturing processes to reject
+EXCLUDED_KEYWORDS = [
+    'fdm', 'fused deposition', 'sla', 'stereolithography', 'sls', 'selective laser',
+    'dmls', 'direct metal laser', 'ebm', 'electron beam', 'binder jetting',
+    'material jetting', 'polyjet', '3d printing', 'powder bed',
+    'laser melting', 'laser sintering', 'arc welding', 'mig', 'tig',
+    'casting', 'forging', 'machining', 'cnc', 'injection molding',
+    'extrusion', 'thermoforming', 'stamping', 'rolling'
+]
+
+# Both lists compiled once into whole-word matchers
+SSAM_MATCHER = KeywordMatcher(SSAM_KEYWORDS)
+EXCLUDED_MATCHER = KeywordMatcher(EXCLUDED_KEYWORDS)
+
+# P(in scope) from the local classifier needed to accept a query without
+# SSAM keywords, and below which a keyword hit is still rejected (e.g. "price
+# of copper"). Held-out (5-fold) rates on assets/scope_queries.jsonl: 5.6%
+# of off-topic queries accepted, 20.8% of SSAM ones rejected; most of the
+# latter are context-free follow-ups ("Why is that the case?")
+SCOPE_ACCEPT = 0.85
+SCOPE_VETO = 0.4
+
+# Conversation history kept per session and how it is packed into prompts
+HISTORY_TURNS = 10
+HISTORY_ANSWER_CHARS = 4000
+RECENT_TURNS = 2
+QUESTION_CHARS = 200
+SUMMARY_TOKENS_PER_TURN = 60
+DEFAULT_PROMPT_TOKENS = 4000
+
+SYSTEM_PROMPTS = {
+    "microstructure": """You are an expert metallurgist specializing EXCLUSIVELY in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) microstructure analysis.
+
+CRITICAL: You ONLY discuss solid-state additive manufacturing processes. If asked about fusion-based AM, powder bed fusion, FDM, SLA, or any non-solid-state processes, politely decline and redirect to SSAM topics.
+
+Analyze the provided images/content focusing on:
+1. Grain structure and morphology in SSAM processes
+2. Phase composition in solid-state deposited materials
+3. SSAM-specific defects (porosity, cracks, unbonded regions, particle boundaries)
+4. Interface characteristics in cold spray, UAM, friction stir processes
+5. Particle deformation (for CSAM/cold spray)
+6. Bonding quality indicators specific to solid-state bonding
+
+Provide detailed technical analysis with specific observations related to CSAM, UAM, FSAM, or AFSD.""",
+    "process_design": """You are a manufacturing process engineer specializing EXCLUSIVELY in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD).
+
+CRITICAL: You ONLY provide guidance on solid-state AM processes. Do not discuss or recommend fusion-based AM, conventional welding, casting, or any non-solid-state manufacturing. If asked, politely redirect to SSAM alternatives.
+
+Analyze the query and provide:
+1. Process parameter recommendations for CSAM, UAM, FSAM, or AFSD
+2. Material-process compatibility in solid-state processes
+3. Expected outcomes and properties from solid-state bonding
+4. SSAM-specific challenges and solutions
+5. Best practices for solid-state AM
+6. Quality control considerations for solid-state deposited materials
+
+Be specific with numerical ranges and practical guidance for solid-state processes only.""",
+    "troubleshooting": """You are a solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) troubleshooting expert EXCLUSIVELY.
+
+CRITICAL: You ONLY troubleshoot solid-state AM issues. Do not provide solutions for fusion-based AM, conventional manufacturing, or other processes. If asked about non-SSAM processes, explain this is outside your expertise and redirect to SSAM topics.
+
+Analyze the problem and provide:
+1. Root cause analysis for SSAM-specific issues
+2. Diagnostic steps for solid-state processes
+3. Corrective actions applicable to CSAM, UAM, FSAM, or AFSD
+4. Preventive measures for solid-state AM
+5. Process parameter adjustments for solid-state bonding
+6. Quality inspection methods for solid-state deposited parts
+
+Focus on practical, actionable solutions for solid-state AM only.""",
+    "comparison": """You are an expert in solid-state additive manufacturing processes (CSAM, UAM, FSAM, AFSD) EXCLUSIVELY.
+
+CRITICAL: You ONLY compare solid-state AM processes with each other or discuss solid-state vs fusion-based trade-offs. Do not provide detailed guidance on fusion-based processes. Always frame comparisons from a solid-state perspective.
+
+Compare the requested processes/materials providing:
+1. Key differences and similarities between SSAM processes
+2. Advantages and disadvantages within solid-state AM context
+3. Application suitability for CSAM, UAM, FSAM, AFSD
+4. Cost considerations specific to solid-state processes
+5. Performance characteristics of solid-state bonding
+6. Selection criteria among SSAM processes
+
+Use tables or structured comparisons. If comparing SSAM to non-SSAM, focus on why SSAM is preferred.""",
+    "general": """You are an expert in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) EXCLUSIVELY.
+
+CRITICAL SCOPE LIMITATION: 
+- You ONLY discuss solid-state additive manufacturing: Cold Spray (CSAM), Ultrasonic AM (UAM), Friction Stir AM (FSAM), and Additive Friction Stir Deposition (AFSD)
+- You do NOT discuss: FDM, SLA, SLS, DMLS, EBM, powder bed fusion, laser melting, binder jetting, or any fusion-based or polymer AM processes
+- If asked about non-SSAM topics, politely explain: "This system specializes exclusively in solid-state additive manufacturing. For questions about [other process], please consult resources specific to that technology."
+
+Provide comprehensive, technical analysis covering:
+1. Detailed explanations of SSAM concepts and mechanisms
+2. Technical parameters specific to solid-state processes
+3. Material behavior in solid-state bonding
+4. Solid-state process mechanics (kinetic energy, ultrasonic, friction)
+5. Applications and best practices for CSAM, UAM, FSAM, AFSD
+6. Current research in solid-state additive manufacturing
+
+Be thorough and technically accurate about solid-state AM only.""",
+}
+
+MANDATORY_INSTRUCTIONS = """MANDATORY INSTRUCTIONS:
+- This system is EXCLUSIVELY for solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD)
+- If images are provided, analyze them ONLY in the context of solid-state processes
+- Include technical terminology specific to solid-state bonding mechanisms
+- Provide quantitative information relevant to SSAM processes
+- Reference ONLY CSAM, UAM, FSAM, or AFSD processes
+- If the query mentions non-solid-state processes, politely explain that this is outside the scope
+- DO NOT provide guidance on fusion-based AM, FDM, SLA, SLS, DMLS, EBM, or other non-solid-state processes
+- Structure your response clearly with SSAM focus"""
+
+ENTITY_PROMPT = """Analyze this text about solid-state additive manufacturing and extract:
+
+Text: {text}
+
+Return JSON with:
+1. "entities": list of main technical concepts (max 12)
+2. "relationships": list of {{"source", "relation", "target"}} dictionaries
+
+Focus on: processes, materials, parameters, properties, defects, applications.
+Format: {{"entities": ["term1", "term2"], "relationships": [{{"source": "term1", "relation": "uses", "target": "term2"}}]}}"""
+
+
+OUT_OF_SCOPE_MESSAGE = "This app specializes exclusively in Solid-State Additive Manufacturing (CSAM, UAM, FSAM, AFSD). Please ask questions specifically about these solid-state processes, their materials, parameters, or applications."
+
+
+def _excluded_message(excluded):
+    return f"This app is exclusively for Solid-State Additive Manufacturing (CSAM, UAM, FSAM, AFSD). Questions about '{excluded}' and other non-solid-state processes are outside the scope."
+
+
+def validate_ssam_query(query):
+    """Validate that query is related to solid-state additive manufacturing"""
+    return validate_ssam_queries([query])[0]
+
+
+def validate_ssam_queries(queries):
+    """``validate_ssam_query`` for many queries, as a list of ``(is_valid, message)``
+
+    Excluded processes are rejected outright. Everything else is scored by the
+    local classifier in one batch: queries with SSAM keywords pass unless it
+    is confident they are off-topic, others need ``SCOPE_ACCEPT``. Very short
+    queries (< 3 words, usually follow-ups) stay lenient. Without the
+    classifier's weights the keyword rules alone decide.
+    """
+    results = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        excluded = EXCLUDED_MATCHER.search(query)
+        if excluded:
+            results[i] = (False, _excluded_message(excluded))
+        else:
+            pending.append(i)
+
+    classifier = load_classifier()
+    scores = {}
+    if classifier is not None and len(pending) == 1:
+        scores = {pending[0]: classifier.score(queries[pending[0]])}
+    elif classifier is not None and pending:
+        scores = dict(zip(pending, classifier.predict_proba([queries[i] for i in pending])))
+    for i in pending:
+        query = queries[i]
+        score = scores.get(i)
+        if SSAM_MATCHER.search(query):
+            in_scope = score is None or score >= SCOPE_VETO
+        else:
+            in_scope = score is not None and score >= SCOPE_ACCEPT
+        # If query is very short (< 3 words), be lenient
+        if len(query.split()) < 3:
+            in_scope = True
+        results[i] = (True, "") if in_scope else (False, OUT_OF_SCOPE_MESSAGE)
+    return results
+
+
+def collect_pdf_context(prompt, pdf_files, open_pdf, top_k, token_budget, max_image_pages=10, on_error=None):
+    """Retrieve the passages of each PDF most relevant to ``prompt``
+
+    ``open_pdf(pdf_file)`` returns a ``PdfIngestor``; each document is read
+    and opened at most once. Returns ``(documents, [(image, label)], digests)``
+    where ``documents`` is ``[(name, passages)]`` with up to ``top_k``
+    passages (``token_budget`` tokens) per document, best first, as returned
+    by ``DocumentIndex.ranked``. ``on_error(pdf_file, exc)`` is called for a
+    PDF that cannot be processed.
+    """
+    documents = []
+    images = []
+    digests = []
+    for pdf_file in pdf_files or ():
+        try:
+            with open_pdf(pdf_file) as pdf:
+                digests.append(pdf.digest)
+                index = get_document_index(pdf.digest, pdf.page_texts)
+                passages = index.ranked(prompt, top_k=top_k, token_budget=token_budget)
+                if passages:
+                    documents.append((pdf_file.name, passages))
+                
+                for idx, img in enumerate(pdf.images(max_pages=max_image_pages)):
+                    images.append((img, f"PDF Page {idx + 1}: {pdf_file.name}"))
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(pdf_file, e)
+    return documents, images, digests
+
+
+def format_pdf_context(documents, max_tokens=None):
+    """PDF prompt section: each document's passages in page order
+
+    With ``max_tokens`` the best-scoring passages across all documents are
+    kept until the section would exceed the budget.
+    """
+    hits = [(score, doc, chunk_id, page, text)
+            for doc, (_, passages) in enumerate(documents)
+            for score, chunk_id, page, text in passages]
+
+    def render(selected):
+        blocks = []
+        for doc, (name, _) in enumerate(documents):
+            passages = sorted((chunk_id, page, text) for _, d, chunk_id, page, text in selected if d == doc)
+            if passages:
+                blocks.append(f"PDF Content ({name}, most relevant passages):\n"
+                              f"{format_passages([(page, text) for _, page, text in passages])}")
+        return "\n\n".join(blocks)
+
+    if max_tokens is None:
+        return render(hits)
+    selected = []
+    for hit in sorted(hits, key=lambda hit: -hit[0]):
+        if estimate_tokens(render(selected + [hit])) <= max_tokens:
+            selected.append(hit)
+    return render(selected)
+
+
+def update_context(conversation_context, prompt, response_text):
+    """Conversation turns after one more (bounded; long answers are capped)"""
+    turns = list(conversation_context or ())
+    turns.append({"q": prompt, "a": response_text[:HISTORY_ANSWER_CHARS]})
+    return turns[-HISTORY_TURNS:]
+
+
+def _history_sections(turns, query):
+    """Prompt sections for recent turns (verbatim) and earlier ones (summaries)"""
+    recent, earlier = turns[-RECENT_TURNS:], turns[:-RECENT_TURNS]
+
+    def verbatim(turn):
+        return f"Q: {turn['q']}\nA: {turn['a']}"
+
+    def compact(turn, max_tokens=SUMMARY_TOKENS_PER_TURN):
+        return f"Q: {turn['q'][:QUESTION_CHARS]}\nA (summary): {summarize(turn['a'], query, max_tokens)}"
+
+    def render_recent(lines):
+        return "Recent conversation context:\n" + "\n".join(lines) if lines else ""
+
+    def fit_recent(max_tokens):
+        # newest turn first; a turn that does not fit verbatim is summarized
+        lines = []
+        for turn in reversed(recent):
+            for candidate in (verbatim(turn), compact(turn)):
+                if estimate_tokens(render_recent([candidate] + lines)) <= max_tokens:
+                    lines.insert(0, candidate)
+                    break
+            else:
+                break
+        return render_recent(lines)
+
+    summaries = [
+        f"- Q: {turn['q'][:QUESTION_CHARS]} -> {summarize(turn['a'], query, SUMMARY_TOKENS_PER_TURN)}"
+        for turn in earlier
+    ]
+
+    def render_earlier(lines):
+        return "Earlier in this conversation (summary):\n" + "\n".join(lines) if lines else ""
+
+    def fit_earlier(max_tokens):
+        lines = []
+        for line in reversed(summaries):
+            if estimate_tokens(render_earlier([line] + lines)) > max_tokens:
+                break
+            lines.insert(0, line)
+        return render_earlier(lines)
+
+    return (
+        Section("history (earlier)", render_earlier(summaries), priority=3, fit=fit_earlier),
+        Section("history (recent)", render_recent([verbatim(turn) for turn in recent]), priority=2,
+                fit=fit_recent),
+    )
+
+
+def build_prompt(prompt, mode="general", documents=(), history=(), image_count=0,
+                 token_budget=DEFAULT_PROMPT_TOKENS):
+    """Full prompt text for one query in one analysis mode, packed into ``token_budget``
+
+    The system prompt, the query and the mandatory instructions are always
+    included; PDF passages, then the recent turns, then summaries of earlier
+    turns get the rest of the budget. Returns ``(prompt_text, report,
+    context)`` where ``report`` comes from ``prompt_budget.assemble`` and
+    ``context`` is the history text that made it in (part of the cache key).
+    """
+    system_prompt = SYSTEM_PROMPTS.get(mode, SYSTEM_PROMPTS["general"])
+    earlier, recent = _history_sections(list(history), prompt)
+    sections = [
+        Section("system", system_prompt, priority=0, required=True),
+        Section("query", f"User Query: {prompt}", priority=0, required=True),
+        Section("pdf", format_pdf_context(documents), priority=1,
+                fit=lambda max_tokens: format_pdf_context(documents, max_tokens)),
+        earlier,
+        recent,
+        Section("instructions", MANDATORY_INSTRUCTIONS, priority=0, required=True),
+    ]
+    if image_count:
+        sections.append(Section(
+            "images", f"Analyzing {image_count} image(s). Provide detailed visual analysis.",
+            priority=0, required=True
+        ))
+    prompt_text, report = assemble(sections, token_budget)
+    report["images"] = image_count
+    context = "\n".join(section.packed for section in (earlier, recent) if section.packed)
+    return prompt_text, report, context
+
+
+def generate_answer(prompt, mode, content_parts, attachment_hashes, context, model, pool, session_id,
+                    response_cache=None, semantic_cache=None, on_text=None):
+    """Answer from the response caches or one pooled model call
+
+    Returns ``(text, timings)``; ``timings['cached']`` is set for cache hits.
+    Either cache may be ``None``; the semantic tier is only consulted for
+    attachment-free queries without conversation ``context``, since its
+    vectors describe the query alone and an answer that leaned on earlier
+    turns must not be served to a paraphrase asked in a different thread.
+    """
+    cache_key = make_key("answer", prompt, mode, attachment_hashes, context)
+    response_text = response_cache.get(cache_key) if response_cache is not None else None
+    similarity = None
+    use_semantic = semantic_cache is not None and not attachment_hashes and not context
+    if response_text is None and use_semantic and response_cache is not None:
+        similar_key, similarity = semantic_cache.lookup(prompt, mode)
+        if similar_key is not None:
+            response_text = response_cache.get(similar_key)
+            if response_text is None:
+                semantic_cache.forget(similar_key)
+    
+    if response_text is not None:
+        timings = {'ttft': 0.0, 'total': 0.0, 'chunks': 0, 'cached': True}
+        if similarity is not None:
+            timings['similarity'] = similarity
+        if on_text is not None:
+            on_text(response_text)
+        return response_text, timings
+    
+    response_text, timings = pool.generate(session_id, model, content_parts, on_text=on_text)
+    if response_text and response_cache is not None:
+        response_cache.put(cache_key, response_text, namespace="answer")
+        if use_semantic:
+            semantic_cache.add(prompt, mode, cache_key)
+    return response_text, timings
+
+
+def extract_entities_and_relations(text, model, extractor, cache, pool, session_id, min_entities):
+    """Extract key entities and their relationships from text
+    
+    The local vocabulary extractor runs first; the LLM is only asked when it
+    finds fewer than ``min_entities`` entities, and its answers are kept in
+    ``cache`` (optional). Falls back to the local result if the call fails.
+    """
+    local_entities, local_relationships = extractor.extract(text)
+    if len(local_entities) >= min_entities:
+        return local_entities, local_relationships
+    
+    cache_key = make_key("entities", text)
+    if cache is not None:
+        cached = cache.get_json(cache_key)
+        if cached is not None:
+            return cached['entities'], cached['relationships']
+    
+    extraction_prompt = ENTITY_PROMPT.format(text=text[:1500])
+    try:
+        if model:
+            response, _ = pool.call(session_id, lambda timeout: model.generate_content(
+                extraction_prompt, request_options={"timeout": timeout}))
+            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+            if json_match:
+                data = json.loads(json_match.group())
+                entities, relationships = data.get('entities', []), data.get('relationships', [])
+                if cache is not None:
+                    cache.put_json(cache_key, {'entities': entities, 'relationships': relationships},
+                                   namespace="entities")
+                return entities, relationships
+    except Exception:
+        pass
+    
+    # Fallback: whatever the local extractor found
+    return local_entities, local_relationships
+
+
+def build_references(all_images, model_name="Gemini 2.0 Flash"):
+    """Reference list for an answer (uploaded content plus the model)"""
+    references = [{
+        'type': 'Uploaded Content',
+        'title': source,
+        'description': 'User-provided material for analysis'
+    } for _, source in all_images]
+    references.append({
+        'type': 'AI Knowledge Base',
+        'title': model_name,
+        'description': 'Expert knowledge in solid-state additive manufacturing'
+    })
+    return references
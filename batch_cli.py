@@ -0,0 +1,349 @@
+"""Headless batch analysis: run a JSONL file of questions without the UI
+
+Each input line is one job::
+
+    {"id": "q1", "prompt": "Why do cold spray deposits crack?", "mode": "troubleshooting",
+     "pdfs": ["papers/*.pdf"], "images": ["micrographs/run7.png"]}
+
+Only ``prompt`` is required; ``mode`` defaults to ``general`` and ``id`` to
+the line number. Attachment paths are resolved relative to the job file and
+may be glob patterns. Jobs go through the same validation, PDF retrieval,
+image payload, prompt, cache and entity-extraction code as the app
+(``analysis``) on a worker pool, with model calls bounded and retried by a
+``ModelPool``. Every finished job is appended to the output JSONL (answer,
+entities, relationships, prompt budget report and timings, ``wall``
+covering the whole job) and flushed, so an interrupted run resumes where it
+stopped when started again with the same output file.
+
+    python batch_cli.py jobs.jsonl results.jsonl --backend gemini --workers 8
+    python batch_cli.py jobs.jsonl results.jsonl --backend fake   # offline
+
+``--backend`` is ``fake`` (``fake_model.FakeModel``, no network), ``gemini``
+(API key from ``--api-key`` or ``GEMINI_API_KEY``) or ``module:callable``,
+a factory that takes the API key and returns an object with the
+``generate_content`` interface.
+"""
+import argparse
+import glob
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+import analysis
+from config import (
+    LOCAL_EXTRACTION_MIN_ENTITIES, MODEL_CONCURRENCY, MODEL_DEADLINE_S, MODEL_MAX_RETRIES,
+    PDF_CACHE_DIR, PDF_CACHE_DISK_MB, PDF_CACHE_MEMORY_MB, PDF_TOKEN_BUDGET, PDF_TOP_K_CHUNKS,
+    PROMPT_TOKEN_BUDGET, create_gemini_model
+)
+from entity_extractor import EntityExtractor
+from image_payload import prepare_image_payload
+from model_pool import ModelPool
+from pdf_cache import PdfCache
+from response_cache import ResponseCache, content_hash
+from ssam_databases import MATERIAL_DATABASE, SSAM_PROCESSES
+
+BATCH_SESSION = "batch"
+DEFAULT_WORKERS = 8
+
+
+def load_backend(spec):
+    """Model factory ``factory(api_key)`` for a ``--backend`` value"""
+    if spec == "fake":
+        from fake_model import FakeModel
+        return lambda api_key: FakeModel()
+    if spec == "gemini":
+        return create_gemini_model
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"unknown backend {spec!r} (use fake, gemini or module:callable)")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _expand(patterns, base_dir):
+    paths = []
+    for pattern in patterns or ():
+        pattern = os.path.join(base_dir, os.path.expanduser(pattern))
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(matches)
+    return paths
+
+
+def load_jobs(path):
+    """Parse the job file; attachment patterns are expanded to file paths"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})") from None
+            if not isinstance(job, dict) or not job.get("prompt"):
+                raise ValueError(f"{path}:{line_no}: a job needs a non-empty 'prompt'")
+            job_id = str(job.get("id", f"line-{line_no}"))
+            if job_id in seen:
+                raise ValueError(f"{path}:{line_no}: duplicate job id {job_id!r}")
+            seen.add(job_id)
+            jobs.append({
+                "id": job_id,
+                "prompt": job["prompt"],
+                "mode": job.get("mode", "general"),
+                "pdfs": _expand(job.get("pdfs"), base_dir),
+                "images": _expand(job.get("images"), base_dir),
+            })
+    return jobs
+
+
+def finished_ids(path, retry_errors=True):
+    """IDs already recorded in an output file (checkpoint for resuming)
+
+    Failed jobs are run again unless ``retry_errors`` is False. A truncated
+    last line (from a killed run) is ignored.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if retry_errors and record.get("status") == "error":
+                continue
+            done.add(record.get("id"))
+    return done
+
+
+class ResultWriter:
+    """Thread-safe JSONL appender that makes every record durable"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, "a+", encoding="utf-8")
+        # a killed run may have left half a line; start on a fresh one
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell():
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _load_pdf(path):
+    """File-like PDF named like an upload (basename), as ``PdfIngestor`` expects"""
+    with open(path, "rb") as f:
+        buffer = io.BytesIO(f.read())
+    buffer.name = os.path.basename(path)
+    return buffer
+
+
+def _load_image(path):
+    image = Image.open(path)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    return image
+
+
+class BatchRunner:
+    """Runs single jobs through the shared analysis pipeline
+
+    Holds the shared objects a job needs; ``run(job)`` is thread-safe and
+    returns the output record instead of raising.
+    """
+
+    def __init__(self, model, pool, extractor, response_cache=None, pdf_cache=None, renderer=None,
+                 top_k=PDF_TOP_K_CHUNKS, token_budget=PDF_TOKEN_BUDGET,
+                 prompt_budget=PROMPT_TOKEN_BUDGET, min_entities=LOCAL_EXTRACTION_MIN_ENTITIES, graph_db=None):
+        self.model = model
+        self.pool = pool
+        self.extractor = extractor
+        self.response_cache = response_cache
+        self.pdf_cache = pdf_cache
+        self.renderer = renderer
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.prompt_budget = prompt_budget
+        self.min_entities = min_entities
+        self.graph_db = graph_db
+        self._verdicts = {}
+
+    def validate_all(self, jobs):
+        """Scope-check every job's prompt in one batch; ``run`` reuses the verdicts"""
+        verdicts = analysis.validate_ssam_queries([job["prompt"] for job in jobs])
+        self._verdicts.update(zip((job["id"] for job in jobs), verdicts))
+
+    def open_pdf(self, pdf_file):
+        from pdf_ingest import PdfIngestor
+        return PdfIngestor.from_file(pdf_file, cache=self.pdf_cache, renderer=self.renderer)
+
+    def run(self, job):
+        start = time.perf_counter()
+        record = {"id": job["id"], "prompt": job["prompt"], "mode": job["mode"],
+                  "attachments": [os.path.basename(p) for p in job["pdfs"] + job["images"]]}
+        try:
+            record.update(self._analyze(job, start))
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record.setdefault("timings", {})["wall"] = time.perf_counter() - start
+        return record
+
+    def _analyze(self, job, start):
+        prompt, mode = job["prompt"], job["mode"]
+        verdict = self._verdicts.get(job["id"])
+        is_valid, error_msg = verdict if verdict is not None else analysis.validate_ssam_query(prompt)
+        if not is_valid:
+            return {"status": "rejected", "answer": error_msg, "entities": [], "relationships": []}
+
+        pdf_files = [_load_pdf(path) for path in job["pdfs"]]
+        documents, all_images, attachment_hashes = analysis.collect_pdf_context(
+            prompt, pdf_files, self.open_pdf, self.top_k, self.token_budget
+        )
+        for idx, path in enumerate(job["images"]):
+            all_images.append((_load_image(path), f"Uploaded Image {idx + 1}"))
+        all_images, image_parts, payload_report = prepare_image_payload(all_images, mode=mode)
+        attachment_hashes.extend(content_hash(part['data']) for part in image_parts)
+
+        prompt_text, prompt_report, _ = analysis.build_prompt(
+            prompt, mode, documents, image_count=len(all_images), token_budget=self.prompt_budget
+        )
+        ingest = time.perf_counter() - start
+
+        answer, timings = analysis.generate_answer(
+            prompt, mode, [prompt_text] + image_parts, attachment_hashes, "",
+            self.model, self.pool, BATCH_SESSION, response_cache=self.response_cache
+        )
+
+        extract_start = time.perf_counter()
+        entities, relationships = analysis.extract_entities_and_relations(
+            answer, self.model, self.extractor, self.response_cache, self.pool, BATCH_SESSION,
+            self.min_entities
+        )
+        if self.graph_db is not None:
+            self.graph_db.write_batch(entities, relationships)
+
+        timings.update(ingest=ingest, extract=time.perf_counter() - extract_start,
+                       prompt_chars=len(prompt_text), images=len(image_parts))
+        return {"status": "ok", "answer": answer, "entities": entities,
+                "relationships": relationships, "timings": timings, "prompt_report": prompt_report,
+                "image_report": payload_report}
+
+
+def run_batch(jobs, runner, writer, workers=DEFAULT_WORKERS, progress=None):
+    """Run ``jobs`` on ``workers`` threads, writing each record as it finishes
+
+    Returns a ``{status: count}`` summary. On KeyboardInterrupt queued jobs
+    are cancelled; everything already written stays checkpointed.
+    """
+    summary = {}
+    runner.validate_all(jobs)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(runner.run, job) for job in jobs]
+        for n, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            writer.write(record)
+            summary[record["status"]] = summary.get(record["status"], 0) + 1
+            if progress is not None:
+                progress(n, len(jobs), record)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return summary
+
+
+def _report(n, total, record):
+    seconds = record["timings"]["wall"]
+    print(f"[{n}/{total}] {record['id']}: {record['status']} ({seconds:.1f}s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("jobs", help="input JSONL, one job per line")
+    parser.add_argument("output", help="output JSONL (appended to; finished jobs are skipped)")
+    parser.add_argument("--backend", default="gemini", help="fake, gemini or module:callable")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="jobs processed at once (PDF/image work and waiting on the model)")
+    parser.add_argument("--concurrency", type=int, default=MODEL_CONCURRENCY,
+                        help="model calls in flight at once")
+    parser.add_argument("--retries", type=int, default=MODEL_MAX_RETRIES)
+    parser.add_argument("--deadline", type=float, default=MODEL_DEADLINE_S,
+                        help="seconds per model request, including queueing and retries")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="response cache database (e.g. the app's, to share answers)")
+    parser.add_argument("--prompt-budget", type=int, default=PROMPT_TOKEN_BUDGET,
+                        help="token budget of each prompt's text (default: %(default)s)")
+    parser.add_argument("--graph-db", metavar="PATH", help="also merge entities into this shared graph")
+    parser.add_argument("--retry-errors", action=argparse.BooleanOptionalAction, default=True,
+                        help="rerun jobs recorded as errors when resuming")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.jobs)
+    done = finished_ids(args.output, retry_errors=args.retry_errors)
+    pending = [job for job in jobs if job["id"] not in done]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run",
+          file=sys.stderr)
+    if not pending:
+        return 0
+
+    if args.backend == "gemini" and not args.api_key:
+        parser.error("the gemini backend needs --api-key or GEMINI_API_KEY")
+    pool = ModelPool(factory=load_backend(args.backend), max_concurrency=args.concurrency,
+                     max_retries=args.retries, deadline=args.deadline)
+    extractor = EntityExtractor.from_databases(SSAM_PROCESSES, MATERIAL_DATABASE)
+    graph_db = None
+    if args.graph_db:
+        from graph_db import GraphDatabase
+        graph_db = GraphDatabase(args.graph_db, resolve=extractor.canonical_name)
+    runner = BatchRunner(
+        model=pool.client(args.api_key),
+        pool=pool,
+        extractor=extractor,
+        response_cache=ResponseCache(path=args.cache) if args.cache else None,
+        pdf_cache=PdfCache(max_memory_bytes=PDF_CACHE_MEMORY_MB * 1024 * 1024,
+                           max_disk_bytes=PDF_CACHE_DISK_MB * 1024 * 1024,
+                           **({'cache_dir': PDF_CACHE_DIR} if PDF_CACHE_DIR else {})),
+        prompt_budget=args.prompt_budget,
+        graph_db=graph_db,
+    )
+
+    writer = ResultWriter(args.output)
+    start = time.perf_counter()
+    try:
+        summary = run_batch(pending, runner, writer, workers=args.workers, progress=_report)
+    except KeyboardInterrupt:
+        print("interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    print(f"done in {elapsed:.1f}s: " + ", ".join(f"{k}={v}" for k, v in sorted(summary.items()))
+          + f"; retries={stats['retries']}, queue wait p95={stats['wait_p95']:.2f}s", file=sys.stderr)
+    return 1 if summary.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Knowledge-graph figure build benchmark
+
+Compares the old one-trace-per-edge figure with ``build_graph_figure`` at
+100, 1k and 10k edges. Reports build time and serialized JSON size; layout is
+excluded (random positions) so only figure construction is measured.
+
+    python benchmarks/bench_graph_figure.py
+"""
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from graph_figure import build_graph_figure  # noqa: E402
+
+EDGE_COUNTS = (100, 1000, 10000)
+
+
+def legacy_figure(G, pos):
+    """The previous create_knowledge_graph rendering: one Scatter per edge"""
+    edge_trace = []
+    for u, v in G.edges():
+        x0, y0 = pos[u]
+        x1, y1 = pos[v]
+        edge_trace.append(go.Scatter(x=[x0, x1, None], y=[y0, y1, None], mode='lines',
+                                     line=dict(width=2, color='#94a3b8'),
+                                     hoverinfo='none', showlegend=False))
+    node_x, node_y, node_text, node_size = [], [], [], []
+    for node in G.nodes():
+        x, y = pos[node]
+        node_x.append(x)
+        node_y.append(y)
+        node_text.append(node)
+        node_size.append(20 + G.degree(node) * 10)
+    node_trace = go.Scatter(x=node_x, y=node_y, mode='markers+text', text=node_text,
+                            hoverinfo='text', marker=dict(size=node_size), showlegend=False)
+    return go.Figure(data=edge_trace + [node_trace])
+
+
+def synthetic_graph(n_edges, seed=0):
+    """Scale-free graph with roughly ``n_edges`` edges"""
+    G = nx.barabasi_albert_graph(max(n_edges // 2, 3), 2, seed=seed)
+    G = nx.relabel_nodes(G, {i: f"Concept {i}" for i in G})
+    rng = np.random.default_rng(seed)
+    pos = {node: rng.uniform(-1, 1, 2) for node in G}
+    return G, pos
+
+
+def measure(build, G, pos):
+    start = time.perf_counter()
+    fig = build(G, pos)
+    built = time.perf_counter() - start
+    payload = fig.to_json()
+    serialized = time.perf_counter() - start - built
+    return built, serialized, len(payload), len(fig.data)
+
+
+def main():
+    print(f"{'edges':>6} {'variant':<12} {'traces':>7} {'build s':>9} {'to_json s':>10} {'JSON MB':>9}")
+    variants = [
+        ("legacy", legacy_figure),
+        ("single", build_graph_figure),
+        ("single+lod", lambda G, pos: build_graph_figure(G, pos, max_nodes=500, label_min_degree=3)),
+    ]
+    for n_edges in EDGE_COUNTS:
+        G, pos = synthetic_graph(n_edges)
+        for name, build in variants:
+            if name == "legacy" and n_edges > 1000 and "--all" not in sys.argv:
+                print(f"{G.number_of_edges():>6} {name:<12} {'skipped (pass --all)':>38}")
+                continue
+            built, serialized, size, traces = measure(build, G, pos)
+            print(f"{G.number_of_edges():>6} {name:<12} {traces:>7} {built:>9.3f} {serialized:>10.3f} {size / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
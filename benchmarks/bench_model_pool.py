@@ -0,0 +1,69 @@
+"""Load test of the shared model pool against the local fake model
+
+Simulates several sessions issuing requests at once (one "heavy" session
+plus light ones) against ``FakeModel`` with a fixed latency and injected
+429 errors, and reports peak concurrency, retries, queue-wait percentiles and
+how long each session waited for its first answer.
+
+    python benchmarks/bench_model_pool.py [--sessions 8] [--requests 5] [--limit 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from fake_model import FakeModel  # noqa: E402
+from model_pool import ModelPool  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5, help="requests per light session")
+    parser.add_argument("--heavy", type=int, default=40, help="requests from the heavy session")
+    parser.add_argument("--limit", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failures", type=int, default=10, help="injected 429 errors")
+    args = parser.parse_args()
+
+    model = FakeModel("Cold spray bonding occurs above the critical velocity.",
+                      latency=args.latency, failures=args.failures)
+    pool = ModelPool(max_concurrency=args.limit, base_delay=0.02, max_delay=0.2)
+    first_answer = {}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run(session, n):
+        for _ in range(n):
+            pool.generate(session, model, ["What is the critical velocity?"])
+            with lock:
+                first_answer.setdefault(session, time.perf_counter() - start)
+
+    # the heavy session submits all of its requests at once
+    threads = [threading.Thread(target=run, args=("heavy", 1)) for _ in range(args.heavy)] + \
+              [threading.Thread(target=run, args=(f"light-{i}", args.requests)) for i in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = pool.stats()
+    total = args.heavy + args.sessions * args.requests
+    print(f"{total} requests in {elapsed:.2f} s ({total / elapsed:.1f} req/s), limit {args.limit}")
+    print(f"peak concurrent model calls: {model.max_active}")
+    print(f"retries: {stats['retries']}  failures: {stats['failures']}  "
+          f"max queue depth: {stats['max_queue_depth']}")
+    print(f"queue wait p50 {stats['wait_p50'] * 1e3:.0f} ms, p95 {stats['wait_p95'] * 1e3:.0f} ms, "
+          f"max {stats['wait_max'] * 1e3:.0f} ms")
+    light = [t for s, t in first_answer.items() if s != "heavy"]
+    print(f"first answer: heavy {first_answer['heavy'] * 1e3:.0f} ms, "
+          f"light sessions median {statistics.median(light) * 1e3:.0f} ms, max {max(light) * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Cold-start and rerun profile of the Streamlit app
+
+Reports the slowest imports (``python -X importtime``) when ``main.py`` is
+loaded in a fresh interpreter, the first-paint time of a fresh AppTest
+session and the mean time of further reruns.
+
+    python benchmarks/bench_startup.py [--top 15] [--reruns 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def import_profile(top):
+    """Slowest direct imports of main.py as ``[(cumulative_us, module)]``, plus its total"""
+    code = "import warnings; warnings.simplefilter('ignore'); import main"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    )
+    rows = []
+    main_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() == "main":
+            main_us = int(cumulative_us)
+        elif depth == 1:  # imported directly by main.py
+            rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top], main_us
+
+
+def apptest_timings(reruns):
+    from streamlit.testing.v1 import AppTest
+
+    env = {
+        "SSAM_RESPONSE_CACHE_PATH": tempfile.mktemp(suffix=".sqlite3"),
+        "SSAM_GRAPH_DB_PATH": tempfile.mktemp(suffix=".sqlite3"),
+    }
+    os.environ.update(env)
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    return first, statistics.mean(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    rows, total = import_profile(args.top)
+    print(f"import main (fresh interpreter): {total / 1e6:.3f} s")
+    for us, name in rows:
+        print(f"  {us / 1e3:9.1f} ms  {name}")
+
+    sys.path.insert(0, ROOT)
+    first, rerun = apptest_timings(args.reruns)
+    print(f"first paint (AppTest, same process): {first:.3f} s")
+    print(f"rerun mean over {args.reruns}: {rerun * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""Offline microbenchmarks for the ingestion, validation and graph hot paths
+
+Measures ``extract_pdf_text`` and ``extract_pdf_images`` on synthetic PDFs of
+5, 50 and 500 pages (cold and warm PDF cache; ``cold+disk`` also waits for
+the background disk-cache writes), ``validate_ssam_query`` (one
+by one and batched) on a synthetic query mix, ``create_knowledge_graph`` on
+synthetic graphs of 10 to 1000 concepts (cold layout),
+``create_parameter_table``, parameter database range queries, the cold
+spray deposition window on a 4M-point grid and one full batch job through
+the analysis pipeline against the local fake model.
+
+Every case runs in a fresh interpreter so memory numbers are not polluted by
+earlier cases. Per case it reports the median and minimum wall time over
+``--repeat`` runs, peak RSS of the process and how much the first call raised
+it, and the Python heap peak and net allocated blocks of one call
+(``tracemalloc``; memory allocated inside PyMuPDF is only visible in RSS).
+
+Results are compared with ``benchmarks/microbench_baseline.json``; a case
+regresses when its fastest run (less noisy than the median) or its memory use
+exceeds the baseline by more than the relative threshold *and* a small
+absolute slack, and the script then exits with status 1. Baselines are machine-specific: refresh with
+``--save-baseline`` on the machine that runs the comparison.
+
+    python benchmarks/microbench.py [--filter pdf] [--quick] [--repeat 5]
+    python benchmarks/microbench.py --save-baseline
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "microbench_baseline.json")
+PDF_DIR = os.path.join(tempfile.gettempdir(), "ssam_bench_pdfs")
+
+PDF_PAGES = (5, 50, 500)
+GRAPH_SIZES = (10, 100, 1000)
+QUERY_COUNT = 1000
+
+# (relative, absolute) slack before a metric counts as a regression
+DEFAULT_TIME_THRESHOLD = 0.30
+DEFAULT_MEMORY_THRESHOLD = 0.20
+ABSOLUTE_SLACK = {"min_s": 0.005, "rss_growth_mb": 8.0, "alloc_peak_mb": 1.0}
+
+VOCABULARY = (
+    "cold spray", "critical velocity", "particle", "substrate", "deposition efficiency",
+    "copper", "aluminum", "Ti-6Al-4V", "nitrogen", "helium", "nozzle", "standoff distance",
+    "ultrasonic consolidation", "sonotrode", "friction stir", "tool rotation", "axial force",
+    "porosity", "grain refinement", "recrystallization", "bonding", "interface", "hardness",
+    "residual stress", "adiabatic shear instability", "oxide layer", "feedstock", "layer",
+)
+FILLER = ("the", "of", "and", "was", "with", "at", "for", "in", "shows", "increases",
+          "reduces", "measured", "observed", "between", "during")
+
+
+# -- synthetic inputs ----------------------------------------------------
+def synthetic_paragraph(rng, words=120):
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(VOCABULARY) if rng.random() < 0.35 else rng.choice(FILLER))
+    return " ".join(out).capitalize() + "."
+
+
+def synthetic_pdf(pages, seed=0):
+    """Path of a deterministic ``pages``-page PDF (text plus a simple figure per page)"""
+    path = os.path.join(PDF_DIR, f"synthetic_{pages}p_s{seed}.pdf")
+    if os.path.exists(path):
+        return path
+    import fitz
+
+    os.makedirs(PDF_DIR, exist_ok=True)
+    rng = random.Random(seed)
+    document = fitz.open()
+    for page_num in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 60), f"Section {page_num + 1}: Solid-state deposition study", fontsize=14)
+        page.insert_textbox(fitz.Rect(72, 80, 540, 470), " ".join(
+            synthetic_paragraph(rng) for _ in range(3)), fontsize=9)
+        for bar in range(6):
+            height = rng.uniform(40, 200)
+            page.draw_rect(fitz.Rect(100 + bar * 60, 720 - height, 140 + bar * 60, 720),
+                           color=(0, 0, 0), fill=(0.2, 0.4, 0.6 + bar * 0.05))
+    tmp = path + ".tmp"
+    document.save(tmp)
+    document.close()
+    os.replace(tmp, path)
+    return path
+
+
+def uploaded(path):
+    """BytesIO with a ``name``, like a Streamlit upload"""
+    with open(path, "rb") as f:
+        buffer = io.BytesIO(f.read())
+    buffer.name = os.path.basename(path)
+    return buffer
+
+
+def synthetic_queries(count, seed=0):
+    rng = random.Random(seed)
+    templates = (
+        "What {v} should I use for {m} in cold spray?",
+        "How does {v} affect {m} bonding in UAM builds",
+        "Explain {v} and {m} for friction stir additive manufacturing with long context " + "detail " * 30,
+        "Compare FDM and selective laser melting for {m}",
+        "What is the best recipe for chocolate cake",
+        "{m}?",
+    )
+    return [rng.choice(templates).format(v=rng.choice(VOCABULARY), m=rng.choice(VOCABULARY))
+            for _ in range(count)]
+
+
+def synthetic_graph(n_entities, seed=0):
+    rng = random.Random(seed)
+    entities = [f"{rng.choice(VOCABULARY)} {i}" for i in range(n_entities)]
+    relationships = []
+    for i in range(1, n_entities):
+        for _ in range(2):
+            j = rng.randrange(i)
+            relationships.append({"source": entities[i], "relation": "affects", "target": entities[j]})
+    return entities, relationships
+
+
+# -- cases ---------------------------------------------------------------
+def _import_main():
+    import warnings
+    warnings.simplefilter("ignore")
+    import main
+    return main
+
+
+def case_pdf_text(pages, warm=False):
+    main = _import_main()
+    pdf = uploaded(synthetic_pdf(pages))
+    cache = main.get_pdf_cache()
+
+    def reset():
+        if not warm:
+            cache.clear()
+
+    return (lambda: main.extract_pdf_text(pdf, max_pages=pages)), reset
+
+
+def case_pdf_images(pages, warm=False, flush=False):
+    """``flush`` also times the background disk-cache writes of the call"""
+    main = _import_main()
+    pdf = uploaded(synthetic_pdf(pages))
+    cache = main.get_pdf_cache()
+
+    def reset():
+        cache.flush()  # no writes from the previous run overlap this one
+        if not warm:
+            cache.clear()
+
+    def run():
+        images = main.extract_pdf_images(pdf)
+        if flush:
+            cache.flush()
+        return images
+
+    return run, reset
+
+
+def case_validate(count):
+    main = _import_main()
+    queries = synthetic_queries(count)
+    validate = main.validate_ssam_query
+    return (lambda: [validate(q) for q in queries]), None
+
+
+def case_validate_batch(count):
+    import analysis
+    queries = synthetic_queries(count)
+    return (lambda: analysis.validate_ssam_queries(queries)), None
+
+
+def case_knowledge_graph(n_entities):
+    main = _import_main()
+    entities, relationships = synthetic_graph(n_entities)
+    return (lambda: main.create_knowledge_graph(entities, relationships)), main.get_layout_engine.clear
+
+
+def case_parameter_table():
+    main = _import_main()
+    names = list(main.SSAM_PROCESSES) + ["unknown"]
+    return (lambda: [main.create_parameter_table(name) for name in names]), None
+
+
+def case_parameter_query(count):
+    """Two-condition range queries against the parameter database"""
+    from parameter_db import get_parameter_db
+    db = get_parameter_db()
+    rng = random.Random(0)
+    velocities = [rng.uniform(100, 1500) for _ in range(count)]
+    return (lambda: [db.covers("Particle Velocity", v, "m/s") & db.below("Temperature Range", 0.5, "Tm")
+                     for v in velocities]), None
+
+
+def case_deposition_window(points_per_axis):
+    """Cold spray window over every material x size x temperature x pressure"""
+    import numpy as np
+    from deposition_window import deposition_window, material_properties, sprayable_materials
+
+    materials = sprayable_materials()
+    properties = material_properties(materials)
+    n = points_per_axis
+    diameters, temperatures = np.linspace(5, 80, n), np.linspace(100, 1000, n)
+    pressures = np.linspace(1, 7, max(1, 4_000_000 // (len(materials) * n * n)))
+    return (lambda: deposition_window(materials, diameters, temperatures, pressures,
+                                      properties=properties)), None
+
+
+def case_fake_pipeline(pages):
+    """One ``batch_cli`` job (PDF retrieval, prompt, pooled fake model call, extraction)"""
+    import pdf_retrieval
+    from batch_cli import BatchRunner
+    from entity_extractor import EntityExtractor
+    from fake_model import FakeModel
+    from model_pool import ModelPool
+    from pdf_cache import PdfCache
+    from ssam_databases import MATERIAL_DATABASE, SSAM_PROCESSES
+
+    cache = PdfCache(max_disk_bytes=0)
+    runner = BatchRunner(
+        model=FakeModel(lambda prompt: synthetic_paragraph(random.Random(len(prompt)), 300)),
+        pool=ModelPool(max_concurrency=1),
+        extractor=EntityExtractor.from_databases(SSAM_PROCESSES, MATERIAL_DATABASE),
+        pdf_cache=cache,
+    )
+    job = {"id": "bench", "prompt": "How does particle velocity affect copper bonding in cold spray?",
+           "mode": "general", "pdfs": [synthetic_pdf(pages)], "images": []}
+
+    def run():
+        record = runner.run(job)
+        if record["status"] != "ok":
+            raise RuntimeError(record.get("error"))
+
+    def reset():
+        cache.clear()
+        pdf_retrieval._index_cache.clear()  # measure indexing too
+
+    return run, reset
+
+
+def build_cases(quick=False):
+    """``{name: (factory, args)}`` in report order"""
+    cases = {}
+    for pages in PDF_PAGES:
+        if quick and pages > 50:
+            continue
+        cases[f"extract_pdf_text[{pages}p,cold]"] = (case_pdf_text, (pages, False))
+        cases[f"extract_pdf_text[{pages}p,warm]"] = (case_pdf_text, (pages, True))
+        cases[f"extract_pdf_images[{pages}p,cold]"] = (case_pdf_images, (pages, False))
+        cases[f"extract_pdf_images[{pages}p,cold+disk]"] = (case_pdf_images, (pages, False, True))
+        cases[f"extract_pdf_images[{pages}p,warm]"] = (case_pdf_images, (pages, True))
+    cases[f"validate_ssam_query[{QUERY_COUNT}q]"] = (case_validate, (QUERY_COUNT,))
+    cases[f"validate_ssam_queries[{QUERY_COUNT}q,batch]"] = (case_validate_batch, (QUERY_COUNT,))
+    for n in GRAPH_SIZES:
+        cases[f"create_knowledge_graph[{n}n]"] = (case_knowledge_graph, (n,))
+    cases["create_parameter_table[all]"] = (case_parameter_table, ())
+    cases[f"parameter_db_query[{QUERY_COUNT}q]"] = (case_parameter_query, (QUERY_COUNT,))
+    cases["deposition_window[4M points]"] = (case_deposition_window, (250,))
+    cases["fake_model_pipeline[50p]"] = (case_fake_pipeline, (50,))
+    return cases
+
+
+# -- measurement (runs in the child process) -----------------------------
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB on Linux
+
+
+def measure_case(name, repeat, quick):
+    factory, args = build_cases(quick)[name]
+    run, reset = factory(*args)
+    reset = reset or (lambda: None)
+
+    # first call: warms imports/pools and shows how far it pushes peak RSS
+    reset()
+    gc.collect()
+    rss_before = _max_rss_mb()
+    run()
+    rss_after = _max_rss_mb()
+
+    times = []
+    for _ in range(repeat):
+        reset()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    reset()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": max(0.0, rss_after - rss_before),
+        "alloc_peak_mb": peak / 1e6,
+        "alloc_blocks": blocks,
+    }
+
+
+def run_child(name, repeat, quick):
+    env = dict(os.environ, PYTHONWARNINGS="ignore", STREAMLIT_LOGGER_LEVEL="error",
+               SSAM_PDF_CACHE_DIR=tempfile.mkdtemp(prefix="ssam_bench_cache_"),
+               SSAM_RENDER_WORKERS=os.environ.get("SSAM_RENDER_WORKERS", "1"))
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name, "--repeat", str(repeat)]
+    if quick:
+        cmd.append("--quick")
+    result = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -- comparison ----------------------------------------------------------
+def regressions(current, baseline, time_threshold, memory_threshold):
+    """``[(metric, baseline, current)]`` that got worse beyond the thresholds"""
+    worse = []
+    for metric, threshold in (("min_s", time_threshold), ("rss_growth_mb", memory_threshold),
+                              ("alloc_peak_mb", memory_threshold)):
+        old, new = baseline.get(metric), current.get(metric)
+        if old is None or new is None:
+            continue
+        if new > old * (1 + threshold) and new - old > ABSOLUTE_SLACK[metric]:
+            worse.append((metric, old, new))
+    return worse
+
+
+def machine_info():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="skip the 500-page PDF cases")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write these results (merged into the existing file) as the baseline")
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(measure_case(args.child, args.repeat, args.quick)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    base_results = baseline.get("results", {})
+    if base_results and baseline.get("machine") != machine_info():
+        print(f"note: baseline was recorded on {baseline.get('machine')}", file=sys.stderr)
+
+    names = [name for name in build_cases(args.quick) if args.filter in name]
+    results = {}
+    failed = []
+    print(f"{'case':<36} {'median s':>10} {'min s':>10} {'peak RSS':>9} {'+RSS MB':>8} "
+          f"{'heap MB':>8} {'blocks':>8}  vs baseline")
+    for name in names:
+        result = run_child(name, args.repeat, args.quick)
+        results[name] = result
+        old = base_results.get(name)
+        if old is None:
+            verdict = "new"
+        else:
+            worse = regressions(result, old, args.time_threshold, args.memory_threshold)
+            ratio = result["min_s"] / old["min_s"] if old["min_s"] else 1.0
+            verdict = f"{ratio:.2f}x time"
+            if worse:
+                failed.append((name, worse))
+                verdict += "  REGRESSION"
+        print(f"{name:<36} {result['median_s']:>10.4f} {result['min_s']:>10.4f} "
+              f"{result['peak_rss_mb']:>9.0f} {result['rss_growth_mb']:>8.1f} "
+              f"{result['alloc_peak_mb']:>8.2f} {result['alloc_blocks']:>8}  {verdict}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "results": results}, f, indent=2)
+    if args.save_baseline:
+        merged = dict(base_results, **results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {os.path.relpath(args.baseline)}")
+        return 0
+
+    for name, worse in failed:
+        for metric, old, new in worse:
+            print(f"REGRESSION {name}: {metric} {old:.4g} -> {new:.4g}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
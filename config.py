@@ -0,0 +1,81 @@
+"""Settings shared by the app and the batch CLI
+
+Every ``SSAM_*`` environment variable is read here, once per process. The
+module has no Streamlit dependency, so ``batch_cli`` and other headless
+entry points import it directly; the app's ``st.cache_resource`` factories
+live in ``resources``.
+"""
+import os
+
+# PDF cache limits (override with SSAM_PDF_CACHE_MEMORY_MB / SSAM_PDF_CACHE_DISK_MB)
+PDF_CACHE_MEMORY_MB = int(os.environ.get("SSAM_PDF_CACHE_MEMORY_MB", "256"))
+PDF_CACHE_DISK_MB = int(os.environ.get("SSAM_PDF_CACHE_DISK_MB", "1024"))
+PDF_CACHE_DIR = os.environ.get("SSAM_PDF_CACHE_DIR")
+
+# Page rasterization workers (SSAM_RENDER_WORKERS=1 renders serially)
+RENDER_WORKERS = int(os.environ.get("SSAM_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Retrieval budget per attached PDF (replaces the old first-3000-characters cut)
+PDF_TOP_K_CHUNKS = int(os.environ.get("SSAM_PDF_TOP_K", "6"))
+PDF_TOKEN_BUDGET = int(os.environ.get("SSAM_PDF_TOKEN_BUDGET", "750"))
+
+# Whole-prompt text budget: PDF passages and conversation history are packed
+# into what the system prompt, query and instructions leave over
+PROMPT_TOKEN_BUDGET = int(os.environ.get("SSAM_PROMPT_TOKEN_BUDGET", "4000"))
+
+# Background knowledge-graph extraction (keeps the second LLM call off the answer path)
+EXTRACTION_WORKERS = int(os.environ.get("SSAM_EXTRACTION_WORKERS", "4"))
+
+# Local extraction is used whenever it finds at least this many entities;
+# only sparser answers fall back to the LLM extraction call
+LOCAL_EXTRACTION_MIN_ENTITIES = int(os.environ.get("SSAM_LOCAL_EXTRACTION_MIN_ENTITIES", "3"))
+
+# Exact-match response cache (SQLite, shared by all sessions)
+RESPONSE_CACHE_PATH = os.environ.get("SSAM_RESPONSE_CACHE_PATH")
+RESPONSE_CACHE_TTL_HOURS = float(os.environ.get("SSAM_RESPONSE_CACHE_TTL_HOURS", "168"))
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("SSAM_RESPONSE_CACHE_MAX_MB", "100"))
+
+# Near-duplicate query tier in front of the exact cache (attachment-free queries only)
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SSAM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SSAM_SEMANTIC_CACHE_MAX_ENTRIES", "100000"))
+
+# Full-resolution chat images live on disk; messages keep thumbnails only
+IMAGE_STORE_DISK_MB = int(os.environ.get("SSAM_IMAGE_STORE_DISK_MB", "2048"))
+IMAGE_STORE_DIR = os.environ.get("SSAM_IMAGE_STORE_DIR")
+SESSION_MEMORY_MB = float(os.environ.get("SSAM_SESSION_MEMORY_MB", "32"))
+
+# Chat history window: only the last N messages are rendered on each rerun
+HISTORY_WINDOW = int(os.environ.get("SSAM_HISTORY_WINDOW", "20"))
+
+# Knowledge graph shared by all sessions (SQLite, survives reloads and Clear Chat)
+GRAPH_DB_PATH = os.environ.get("SSAM_GRAPH_DB_PATH")
+
+# Shared model clients: bounded concurrency, fair queue across sessions, retries
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+MODEL_CONCURRENCY = int(os.environ.get("SSAM_MODEL_CONCURRENCY", "4"))
+MODEL_MAX_RETRIES = int(os.environ.get("SSAM_MODEL_MAX_RETRIES", "4"))
+MODEL_DEADLINE_S = float(os.environ.get("SSAM_MODEL_DEADLINE_S", "120"))
+MODEL_MAX_CLIENTS = int(os.environ.get("SSAM_MODEL_MAX_CLIENTS", "16"))
+
+# Per-stage latency and cost telemetry (SSAM_METRICS_PORT serves /metrics; SSAM_METRICS_LOG
+# appends one JSON line per turn)
+METRICS_PORT = int(os.environ.get("SSAM_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("SSAM_METRICS_HOST", "0.0.0.0")
+METRICS_LOG_PATH = os.environ.get("SSAM_METRICS_LOG")
+SESSION_METRIC_SAMPLES = 500
+TURN_TRACE_HISTORY = 200
+
+
+def create_gemini_model(api_key):
+    """Client factory used by the model pool
+
+    Each model gets its own ``GenerativeServiceClient`` bound to ``api_key``:
+    ``genai.configure`` sets one key for the whole process, so sessions with
+    different keys would all call with whichever key was configured last.
+    """
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    # GenerativeModel only falls back to the process-wide client while _client is unset
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
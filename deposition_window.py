@@ -0,0 +1,174 @@
+"""Vectorized cold spray deposition-window estimates over parameter grids
+
+For every combination of material, particle diameter, gas stagnation
+temperature and pressure, ``deposition_window`` estimates in one broadcast
+NumPy pass:
+
+- gas exit velocity from isentropic expansion to the nozzle's exit Mach
+  number, ``v_g = M sqrt(gamma R T0 / (1 + (gamma - 1) / 2 M^2))``;
+- particle impact velocity from the Dykhuizen-Smith drag relation,
+  ``v_p = v_g / (1 + 0.85 sqrt(d / x) sqrt(rho_p v_g^2 / p0))``;
+- particle impact temperature as a fixed fraction (``heating``) of the way
+  from room temperature to the gas temperature;
+- critical velocity after Schmidt et al. (2006),
+  ``v_cr = sqrt(F1 4 sigma_TS (1 - (Ti - TR) / (Tm - TR)) / rho + F2 cp (Tm - Ti))``
+  with F1 = 1.2, F2 = 0.3, scaled by ``(d_ref / d)^0.19`` for particle
+  size, and erosion velocity ``v_er = 2 v_cr`` (same relation with
+  four-times larger constants);
+- the feasibility mask ``v_cr <= v_p <= v_er`` and the window parameter
+  ``eta = v_p / v_cr``.
+
+Material properties (density, solidus, tensile strength, specific heat)
+come from the parameter database. The results are screening estimates for
+choosing where to start, not a substitute for nozzle-specific CFD or
+spray trials.
+
+Work is done at the smallest shape each quantity depends on and only the
+impact velocity and the mask are materialized over the whole grid (float32
+by default), so millions of grid points take a fraction of a second.
+"""
+import numpy as np
+
+# gas -> (heat capacity ratio, specific gas constant J/kg·K)
+GASES = {
+    "N2": (1.40, 296.8),
+    "He": (1.66, 2077.1),
+    "Air": (1.40, 287.0),
+}
+
+ROOM_TEMPERATURE_K = 293.15
+SCHMIDT_F1 = 1.2
+SCHMIDT_F2 = 0.3
+EROSION_FACTOR = 2.0
+SIZE_EXPONENT = 0.19
+REFERENCE_DIAMETER_UM = 25.0
+
+DEFAULT_NOZZLE_LENGTH_MM = 150.0
+DEFAULT_EXIT_MACH = 2.5
+DEFAULT_HEATING = 0.3
+
+_REQUIRED = ("Density", "Melting Point", "Tensile Strength", "Specific Heat")
+
+
+def material_properties(materials, db=None):
+    """``{density, melting, tensile, specific_heat}`` arrays (SI) for ``materials``
+
+    Melting ranges use their lower bound (solidus).
+    """
+    if db is None:
+        from parameter_db import get_parameter_db
+        db = get_parameter_db()
+
+    def column(parameter):
+        return np.array([db.get(m, parameter)[0] for m in materials], dtype=np.float64)
+
+    return {
+        "density": column("Density"),
+        "melting": column("Melting Point"),
+        "tensile": column("Tensile Strength"),
+        "specific_heat": column("Specific Heat"),
+    }
+
+
+def sprayable_materials(db=None):
+    """Materials with every property ``deposition_window`` needs"""
+    if db is None:
+        from parameter_db import get_parameter_db
+        db = get_parameter_db()
+    return [m for m in db.subjects(kind="material")
+            if all(db.text_of(m, p, None) is not None and np.isfinite(db.get(m, p)[0])
+                   for p in _REQUIRED)]
+
+
+class DepositionWindow:
+    """Grid results; arrays are indexed ``[material, diameter, temperature, pressure]``
+
+    ``critical_velocity`` and ``erosion_velocity`` do not depend on pressure
+    and have a pressure axis of length 1 (they broadcast against the others).
+    """
+
+    def __init__(self, materials, diameters_um, gas_temperatures_c, pressures_mpa,
+                 particle_velocity, critical_velocity, erosion_velocity, feasible):
+        self.materials = list(materials)
+        self.diameters_um = diameters_um
+        self.gas_temperatures_c = gas_temperatures_c
+        self.pressures_mpa = pressures_mpa
+        self.particle_velocity = particle_velocity
+        self.critical_velocity = critical_velocity
+        self.erosion_velocity = erosion_velocity
+        self.feasible = feasible
+
+    @property
+    def shape(self):
+        return self.feasible.shape
+
+    @property
+    def size(self):
+        return self.feasible.size
+
+    @property
+    def eta(self):
+        """``v_p / v_cr`` (deposition starts at 1, erosion at ``EROSION_FACTOR``)"""
+        return self.particle_velocity / self.critical_velocity
+
+    def feasible_fraction(self):
+        """Share of feasible grid points per material"""
+        return self.feasible.reshape(len(self.materials), -1).mean(axis=1)
+
+    def plane(self, material, pressure_mpa):
+        """``(eta, feasible)`` over diameter x temperature at the nearest pressure"""
+        m = self.materials.index(material)
+        p = int(np.abs(np.asarray(self.pressures_mpa) - pressure_mpa).argmin())
+        v_p = self.particle_velocity[m, :, :, p]
+        return v_p / self.critical_velocity[m, :, :, 0], self.feasible[m, :, :, p]
+
+
+def deposition_window(materials, diameters_um, gas_temperatures_c, pressures_mpa, gas="N2",
+                      nozzle_length_mm=DEFAULT_NOZZLE_LENGTH_MM, exit_mach=DEFAULT_EXIT_MACH,
+                      heating=DEFAULT_HEATING, dtype=np.float32, properties=None):
+    """Estimate the deposition window over the full grid of the given axes
+
+    ``materials`` are names in the material database (or any names when
+    ``properties`` from ``material_properties`` is passed); the three other
+    axes are 1-D arrays in µm, °C and MPa.
+    """
+    if gas not in GASES:
+        raise ValueError(f"unknown gas {gas!r}; expected one of {sorted(GASES)}")
+    gamma, gas_constant = GASES[gas]
+    props = properties if properties is not None else material_properties(materials)
+
+    def shape4(values, axis):
+        return np.asarray(values, dtype=dtype).reshape([-1 if i == axis else 1 for i in range(4)])
+
+    rho = shape4(props["density"], 0)
+    melting = shape4(props["melting"], 0)
+    tensile = shape4(props["tensile"], 0)
+    cp = shape4(props["specific_heat"], 0)
+    d = shape4(diameters_um, 1) * dtype(1e-6)
+    t0 = shape4(gas_temperatures_c, 2) + dtype(273.15)
+    p0 = shape4(pressures_mpa, 3) * dtype(1e6)
+
+    # gas exit velocity: depends on temperature only
+    exit_temperature = t0 / dtype(1 + (gamma - 1) / 2 * exit_mach ** 2)
+    v_gas = dtype(exit_mach) * np.sqrt(dtype(gamma * gas_constant) * exit_temperature)
+
+    # particle velocity: full grid
+    drag = dtype(0.85) * np.sqrt(d / dtype(nozzle_length_mm * 1e-3))        # (1, D, 1, 1)
+    inertia = np.sqrt(rho * v_gas ** 2 / p0)                                # (M, 1, T, P)
+    particle_velocity = v_gas / (dtype(1) + drag * inertia)
+
+    # critical / erosion velocity: material x diameter x temperature
+    impact_temperature = dtype(ROOM_TEMPERATURE_K) + dtype(heating) * (t0 - dtype(ROOM_TEMPERATURE_K))
+    impact_temperature = np.minimum(impact_temperature, melting)            # (M, 1, T, 1)
+    softening = dtype(1) - (impact_temperature - dtype(ROOM_TEMPERATURE_K)) / (
+        melting - dtype(ROOM_TEMPERATURE_K))
+    v_cr_ref = np.sqrt(dtype(SCHMIDT_F1 * 4) * tensile * softening / rho
+                       + dtype(SCHMIDT_F2) * cp * (melting - impact_temperature))
+    size_factor = (dtype(REFERENCE_DIAMETER_UM * 1e-6) / d) ** dtype(SIZE_EXPONENT)
+    critical_velocity = v_cr_ref * size_factor                               # (M, D, T, 1)
+    erosion_velocity = critical_velocity * dtype(EROSION_FACTOR)
+
+    feasible = (particle_velocity >= critical_velocity) & (particle_velocity <= erosion_velocity)
+    return DepositionWindow(materials, np.asarray(diameters_um), np.asarray(gas_temperatures_c),
+                            np.asarray(pressures_mpa), particle_velocity, critical_velocity,
+                            erosion_velocity, feasible)
@@ -0,0 +1,295 @@
+"""Deterministic local entity/relation extraction from the SSAM vocabulary
+
+All surface forms (process codes and names, materials, parameters, properties,
+defects, applications and their synonyms) are folded into a character trie and
+compiled into one prefix-factored, word-bounded regular expression, so a
+response is scanned in a single pass without backtracking across thousands of
+alternatives. Relations are inferred from entities that co-occur
+in the same sentence, labelled by the pair of entity categories. Output order
+depends only on the input text, never on hashing.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+
+from parameter_db import process_parameter_name
+
+# Canonical name -> extra surface forms. Extend freely; matching is
+# case-insensitive except for mixed-case aliases of three characters or fewer
+# (element symbols such as "Al" or "Ti") and the words in CASE_SENSITIVE_FORMS,
+# which must match exactly. Write short acronyms in capitals ("UTS").
+SYNONYMS = {
+    "CSAM": ["cold spray", "cold spraying", "cold gas dynamic spray", "cold gas spray",
+             "kinetic spray", "kinetic metallization", "cold spray additive manufacturing"],
+    "UAM": ["ultrasonic additive manufacturing", "ultrasonic consolidation",
+            "ultrasonic welding", "ultrasonic am"],
+    "FSAM": ["friction stir additive manufacturing", "friction stir welding", "FSW"],
+    "AFSD": ["additive friction stir deposition", "MELD"],
+    "Aluminum 6061": ["al6061", "al 6061", "aa6061", "6061"],
+    "Aluminum": ["aluminium", "Al"],
+    "Copper": ["Cu"],
+    "Titanium Ti-6Al-4V": ["ti-6al-4v", "ti64", "ti6al4v"],
+    "Titanium": ["Ti"],
+    "Stainless Steel 316L": ["316l", "ss316l", "ss 316l"],
+    "Stainless Steel": ["stainless"],
+    "Steel": [],
+    "Magnesium": ["Mg"],
+    "Nickel": ["Ni"],
+    "Inconel": ["inconel 718", "inconel 625", "in718", "in625"],
+    "Composites": ["composite", "metal matrix composite", "MMC"],
+    "Particle Velocity": ["impact velocity", "particle speed"],
+    "Critical Velocity": ["critical velocity"],
+    "Gas Pressure": ["inlet pressure", "stagnation pressure"],
+    "Gas Temperature": ["stagnation temperature", "process gas temperature"],
+    "Standoff Distance": ["stand-off distance", "spray distance"],
+    "Traverse Speed": ["traverse velocity", "travel speed", "scan speed"],
+    "Rotation Speed": ["rotational speed", "spindle speed", "RPM"],
+    "Feed Rate": ["feed rate", "feedstock rate", "material feed rate"],
+    "Axial Force": ["downward force", "forging force"],
+    "Normal Force": ["normal load"],
+    "Amplitude": ["vibration amplitude", "oscillation amplitude"],
+    "Frequency": ["vibration frequency"],
+    "Layer Thickness": ["layer height"],
+    "Tool Design": ["tool geometry", "tool profile"],
+    "Carrier Gas": ["helium", "nitrogen", "process gas"],
+    "Porosity": ["pores", "voids"],
+    "Cracks": ["crack", "cracking", "microcracks"],
+    "Delamination": ["layer delamination", "interlayer delamination"],
+    "Oxidation": ["oxide", "oxides"],
+    "Residual Stress": ["residual stresses"],
+    "Unbonded Regions": ["unbonded", "lack of bonding", "interparticle boundaries"],
+    "Tool Wear": [],
+    "Adhesion Strength": ["bond strength", "adhesion"],
+    "Hardness": ["microhardness"],
+    "Yield Strength": [],
+    "Tensile Strength": ["ultimate tensile strength", "UTS"],
+    "Ductility": ["elongation"],
+    "Density": ["relative density"],
+    "Thermal Conductivity": [],
+    "Grain Refinement": ["grain size", "refined grains", "recrystallization",
+                        "dynamic recrystallization"],
+    "Microstructure": ["microstructures"],
+    "Plastic Deformation": ["severe plastic deformation", "adiabatic shear instability"],
+    "Deposition Efficiency": [],
+    "Deposition Rate": ["build rate"],
+    "Substrate": ["substrates"],
+    "Nozzle": ["de laval nozzle", "converging-diverging nozzle"],
+    "Heat Treatment": ["annealing", "post-processing heat treatment"],
+}
+
+# Trade names that are also ordinary English words: only the capitalized
+# spelling counts ("MELD", not "the meld")
+CASE_SENSITIVE_FORMS = {"MELD"}
+
+# Categories for canonical names not derived from the process/material databases
+_CATEGORY_HINTS = {
+    "parameter": ["Particle Velocity", "Critical Velocity", "Gas Pressure", "Gas Temperature",
+                  "Standoff Distance", "Traverse Speed", "Rotation Speed", "Feed Rate",
+                  "Axial Force", "Normal Force", "Amplitude", "Frequency", "Layer Thickness",
+                  "Tool Design", "Carrier Gas", "Nozzle", "Heat Treatment"],
+    "defect": ["Porosity", "Cracks", "Delamination", "Oxidation", "Residual Stress",
+               "Unbonded Regions", "Tool Wear"],
+    "property": ["Adhesion Strength", "Hardness", "Yield Strength", "Tensile Strength",
+                 "Ductility", "Density", "Thermal Conductivity", "Grain Refinement",
+                 "Microstructure", "Plastic Deformation", "Deposition Efficiency",
+                 "Deposition Rate", "Substrate"],
+    "material": ["Aluminum", "Copper", "Titanium", "Stainless Steel", "Steel", "Magnesium",
+                 "Nickel", "Inconel", "Composites"],
+}
+
+# (category, category) -> relation label; looked up in both orders
+RELATION_RULES = {
+    ("process", "material"): "deposits",
+    ("process", "parameter"): "controlled_by",
+    ("process", "defect"): "may_cause",
+    ("process", "property"): "affects",
+    ("process", "application"): "used_for",
+    ("process", "process"): "compared_with",
+    ("parameter", "defect"): "influences",
+    ("parameter", "property"): "influences",
+    ("parameter", "material"): "depends_on",
+    ("material", "property"): "has_property",
+    ("material", "defect"): "prone_to",
+    ("material", "application"): "used_for",
+    ("defect", "property"): "degrades",
+}
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+# ``typical_*`` keys in SSAM_PROCESSES -> canonical parameter names
+def _trie_pattern(forms):
+    """Prefix-factored regex source matching any of ``forms`` (longest first)"""
+    trie = {}
+    for form in forms:
+        node = trie
+        for ch in form:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def render(node):
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A word may also end here: make the longer continuation optional (greedy)
+        return f"(?:{body})?" if "" in node else body
+
+    return render(trie)
+
+
+def _case_sensitive(form):
+    """Element symbols ("Al") and CASE_SENSITIVE_FORMS match exactly;
+    all-capital acronyms ("UAM", "RPM") match in any case"""
+    if form in CASE_SENSITIVE_FORMS:
+        return True
+    return len(form) <= 3 and not (form.isalpha() and form.isupper())
+
+
+class EntityExtractor:
+    """Single-pass vocabulary matcher with co-occurrence relations"""
+
+    def __init__(self, vocabulary, max_entities=12, max_relationships=20):
+        """``vocabulary`` maps canonical name -> (category, [surface forms])"""
+        self.max_entities = max_entities
+        self.max_relationships = max_relationships
+        self.categories = {}
+        self._relations = {}
+        self._lookup_ci = {}
+        self._lookup_cs = {}
+        for canonical, (category, forms) in vocabulary.items():
+            self.categories[canonical] = category
+            for form in [canonical] + list(forms):
+                if _case_sensitive(form):
+                    self._lookup_cs.setdefault(form, canonical)
+                else:
+                    self._lookup_ci.setdefault(form.lower(), canonical)
+
+        alternatives = []
+        if self._lookup_ci:
+            alternatives.append(f"(?i:{_trie_pattern(self._lookup_ci)})")
+        if self._lookup_cs:
+            alternatives.append(_trie_pattern(self._lookup_cs))
+        self._pattern = re.compile(
+            rf"(?<![\w-])(?:{'|'.join(alternatives) or '(?!)'})(?![\w-])"
+        )
+
+    @classmethod
+    def from_databases(cls, processes, materials, synonyms=None, **kwargs):
+        """Build the vocabulary from ``SSAM_PROCESSES`` and ``MATERIAL_DATABASE``"""
+        synonyms = SYNONYMS if synonyms is None else synonyms
+        vocabulary = {}
+
+        def add(name, category, forms=()):
+            entry = vocabulary.setdefault(name, (category, []))
+            entry[1].extend(forms)
+
+        for code, process in processes.items():
+            add(code, "process", [process["name"]])
+            for key in process:
+                if key.startswith("typical_") and key != "typical_materials":
+                    add(process_parameter_name(key), "parameter")
+            for application in process.get("applications", []):
+                add(application, "application")
+        for category, names in _CATEGORY_HINTS.items():
+            for name in names:
+                add(name, category)
+        for name, props in materials.items():
+            add(name, "material")
+            for prop in props:
+                if prop not in ("ssam_compatibility", "common_applications"):
+                    add(prop.replace("_", " ").title(), "property")
+            for application in props.get("common_applications", "").split(","):
+                if application.strip():
+                    add(application.strip().capitalize(), "application")
+        for name, forms in synonyms.items():
+            category = vocabulary.get(name, ("concept",))[0]
+            add(name, category, forms)
+        return cls(vocabulary, **kwargs)
+
+    def _matches(self, text):
+        """Yield ``(start, canonical)`` for every vocabulary hit, left to right"""
+        for m in self._pattern.finditer(text):
+            surface = m.group()
+            canonical = self._lookup_ci.get(surface.lower()) or self._lookup_cs.get(surface)
+            if canonical is not None:
+                yield m.start(), canonical
+
+    def canonical_name(self, name):
+        """Canonical name if ``name`` as a whole is a known surface form, else None"""
+        name = name.strip()
+        return self._lookup_ci.get(name.lower()) or self._lookup_cs.get(name)
+
+    def entity_set(self, text):
+        """Canonical names of every vocabulary entity mentioned in ``text``"""
+        return frozenset(canonical for _, canonical in self._matches(text))
+
+    def canonicalize(self, text):
+        """Replace every vocabulary hit with a single canonical token
+
+        ``"best cold spray settings for aluminium"`` ->
+        ``"best csam settings for aluminum"``; used to embed queries so that
+        synonyms land on the same features.
+        """
+        pieces, last = [], 0
+        for m in self._pattern.finditer(text):
+            surface = m.group()
+            canonical = self._lookup_ci.get(surface.lower()) or self._lookup_cs.get(surface)
+            if canonical is None:
+                continue
+            pieces.append(text[last:m.start()])
+            pieces.append(canonical.lower().replace(" ", "_"))
+            last = m.end()
+        pieces.append(text[last:])
+        return "".join(pieces)
+
+    def relation_for(self, source, target):
+        """Relation label and direction for two co-occurring entities"""
+        key = (source, target)
+        relation = self._relations.get(key)
+        if relation is None:
+            a, b = self.categories.get(source), self.categories.get(target)
+            if (a, b) in RELATION_RULES:
+                relation = (source, RELATION_RULES[(a, b)], target)
+            elif (b, a) in RELATION_RULES:
+                relation = (target, RELATION_RULES[(b, a)], source)
+            else:
+                relation = (source, "relates_to", target)
+            self._relations[key] = relation
+        return relation
+
+    def extract(self, text):
+        """Return ``(entities, relationships)`` in the LLM extractor's format"""
+        counts = Counter()
+        first_seen = {}
+        breaks = [m.end() for m in _SENTENCE_BREAK.finditer(text)]
+        sentences = {}
+        for start, canonical in self._matches(text):
+            counts[canonical] += 1
+            first_seen.setdefault(canonical, len(first_seen))
+            found = sentences.setdefault(bisect_right(breaks, start), [])
+            if canonical not in found:
+                found.append(canonical)
+        sentence_entities = [found for found in sentences.values() if len(found) > 1]
+
+        ranked = sorted(counts, key=lambda e: (-counts[e], first_seen[e]))[:self.max_entities]
+        entities = sorted(ranked, key=first_seen.get)
+        keep = set(entities)
+
+        pair_counts = Counter()
+        pair_order = {}
+        for found in sentence_entities:
+            found = [e for e in found if e in keep]
+            for i, a in enumerate(found):
+                for b in found[i + 1:]:
+                    pair = self.relation_for(a, b)
+                    pair_counts[pair] += 1
+                    pair_order.setdefault(pair, len(pair_order))
+
+        top_pairs = sorted(pair_counts, key=lambda p: (-pair_counts[p], pair_order[p]))
+        relationships = [
+            {"source": source, "relation": relation, "target": target}
+            for source, relation, target in sorted(top_pairs[:self.max_relationships],
+                                                   key=pair_order.get)
+        ]
+        return entities, relationships
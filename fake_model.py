@@ -0,0 +1,115 @@
+"""Local stand-in for ``genai.GenerativeModel``
+
+Returns canned text, optionally split into chunks with a per-chunk delay, so
+streaming, caching and batch code paths can be exercised without network
+access or an API key. ``failures`` makes the first calls raise
+``FakeRateLimit`` (HTTP 429) to exercise retries.
+"""
+import threading
+import time
+
+
+class FakeRateLimit(Exception):
+    """Stand-in for ``google.api_core.exceptions.ResourceExhausted``"""
+    code = 429
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    @property
+    def text(self):
+        return "".join(chunk.text for chunk in self._chunks)
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+
+class _StreamingResponse:
+    def __init__(self, pieces, delay, latency=0.0, on_close=None):
+        self._pieces = pieces
+        self._delay = delay
+        self._latency = latency
+        self._on_close = on_close
+        self._consumed = []
+
+    def __iter__(self):
+        try:
+            if self._latency:
+                time.sleep(self._latency)
+            for piece in self._pieces:
+                if self._delay:
+                    time.sleep(self._delay)
+                chunk = FakeChunk(piece)
+                self._consumed.append(chunk)
+                yield chunk
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+    @property
+    def text(self):
+        return "".join(chunk.text for chunk in self._consumed)
+
+
+class FakeModel:
+    """Minimal ``generate_content`` implementation
+
+    ``reply`` is either a string, a list of chunk strings, or a callable
+    taking the prompt text and returning one of those. ``delay`` is slept
+    before each chunk (``latency`` once before the first one). The first
+    ``failures`` calls raise ``error`` (default ``FakeRateLimit``).
+    ``max_active`` records the highest number of concurrent calls seen.
+    """
+
+    def __init__(self, reply="Cold spray bonding occurs above the critical velocity.",
+                 delay=0.0, latency=0.0, failures=0, error=None):
+        self.reply = reply
+        self.delay = delay
+        self.latency = latency
+        self.failures = failures
+        self.error = error or FakeRateLimit("429 Resource has been exhausted")
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _pieces(self, contents):
+        prompt = contents if isinstance(contents, str) else next(
+            (part for part in contents if isinstance(part, str)), "")
+        reply = self.reply(prompt) if callable(self.reply) else self.reply
+        if isinstance(reply, str):
+            words = reply.split(" ")
+            reply = [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+        return list(reply)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        with self._lock:
+            self.calls.append(contents)
+            if self.failures > 0:
+                self.failures -= 1
+                raise self.error
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        pieces = self._pieces(contents)
+        if stream:
+            return _StreamingResponse(pieces, self.delay, self.latency, on_close=self._done)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if self.delay:
+                time.sleep(self.delay * len(pieces))
+            return FakeResponse([FakeChunk(piece) for piece in pieces])
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self.active -= 1
@@ -0,0 +1,255 @@
+"""Persistent knowledge graph shared by all sessions
+
+Facts extracted in any session are written to one SQLite database after each
+turn (one transaction per turn), so the graph survives page reloads and
+"Clear Chat" and grows with the whole team's conversations. Nodes are
+interned under the same normalized/alias-resolved key as
+``KnowledgeGraphStore``; each ``(source, relation, target)`` fact is one row
+with a mention count. Queries (neighbours, k-hop subgraph, top-degree nodes)
+walk the indexes and load only the subgraph being shown.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+
+from knowledge_store import normalize_name
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "ssam_knowledge_graph.sqlite3")
+
+# Node IDs of a read query, bound as one JSON array parameter: reads never
+# write, so they do not hold a transaction (and a stale WAL snapshot) open
+_SELECTION = "WITH selection(id) AS (SELECT DISTINCT value FROM json_each(?)) "
+
+# Seconds a writer waits for another process's write lock before failing
+BUSY_TIMEOUT_S = 30.0
+
+
+class GraphDatabase:
+    """SQLite-backed concept graph with batched writes and subgraph queries
+
+    ``resolve`` maps a raw name to its canonical form (or ``None``), e.g.
+    ``EntityExtractor.canonical_name``. A node's ``degree`` is its number of
+    distinct neighbours.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, resolve=None):
+        self.path = path
+        self._resolve = resolve
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS nodes (
+                   id INTEGER PRIMARY KEY,
+                   key TEXT NOT NULL UNIQUE,
+                   name TEXT NOT NULL,
+                   mentions INTEGER NOT NULL DEFAULT 0,
+                   degree INTEGER NOT NULL DEFAULT 0
+               );
+               CREATE INDEX IF NOT EXISTS nodes_degree ON nodes(degree);
+               CREATE TABLE IF NOT EXISTS aliases (
+                   alias TEXT PRIMARY KEY,
+                   node INTEGER NOT NULL
+               ) WITHOUT ROWID;
+               CREATE TABLE IF NOT EXISTS edges (
+                   src INTEGER NOT NULL,
+                   dst INTEGER NOT NULL,
+                   relation TEXT NOT NULL,
+                   count INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (src, dst, relation)
+               ) WITHOUT ROWID;
+               CREATE INDEX IF NOT EXISTS edges_dst ON edges(dst, src);"""
+        )
+        self._conn.commit()
+
+    # -- writes --------------------------------------------------------
+    def _canonical(self, name):
+        display = " ".join(str(name).split())
+        if self._resolve is not None:
+            canonical = self._resolve(display)
+            if canonical is not None:
+                return canonical
+        return display
+
+    def _intern(self, name):
+        """Node ID for ``name``, creating node and alias rows (inside a transaction)"""
+        alias = normalize_name(name)
+        if not alias:
+            return None
+        row = self._conn.execute("SELECT node FROM aliases WHERE alias = ?", (alias,)).fetchone()
+        if row is not None:
+            return row[0]
+        display = self._canonical(name)
+        key = normalize_name(display)
+        self._conn.execute("INSERT OR IGNORE INTO nodes (key, name) VALUES (?, ?)", (key, display))
+        node = self._conn.execute("SELECT id FROM nodes WHERE key = ?", (key,)).fetchone()[0]
+        self._conn.executemany("INSERT OR IGNORE INTO aliases (alias, node) VALUES (?, ?)",
+                               [(alias, node), (key, node)])
+        return node
+
+    def write_batch(self, entities, relationships):
+        """Merge one turn's extraction result in a single transaction
+
+        The transaction takes the write lock up front (``BEGIN IMMEDIATE``),
+        so a concurrent writer in another process makes it wait up to
+        ``BUSY_TIMEOUT_S`` instead of failing half-way once its reads are
+        stale. ``sqlite3.OperationalError`` still escapes if the lock never
+        frees up.
+        """
+        if not entities and not relationships:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            ids = {}
+
+            def intern(name):
+                if name not in ids:
+                    ids[name] = self._intern(name)
+                return ids[name]
+
+            mentions = Counter(node for node in map(intern, entities) if node is not None)
+            self._conn.executemany("UPDATE nodes SET mentions = mentions + ? WHERE id = ?",
+                                   [(count, node) for node, count in mentions.items()])
+
+            facts = Counter()
+            for rel in relationships:
+                if 'source' not in rel or 'target' not in rel:
+                    continue
+                u, v = intern(rel['source']), intern(rel['target'])
+                if u is None or v is None or u == v:
+                    continue
+                facts[(u, v, rel.get('relation') or 'relates_to')] += 1
+
+            degree = Counter()
+            for (u, v, _), _ in facts.items():
+                if (u, v) in degree or (v, u) in degree:
+                    continue
+                linked = self._conn.execute(
+                    "SELECT 1 FROM edges WHERE (src = ? AND dst = ?) OR (src = ? AND dst = ?) LIMIT 1",
+                    (u, v, v, u)
+                ).fetchone()
+                degree[(u, v)] = 0 if linked else 1
+            increments = Counter()
+            for (u, v), new in degree.items():
+                increments[u] += new
+                increments[v] += new
+            self._conn.executemany(
+                """INSERT INTO edges (src, dst, relation, count) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (src, dst, relation) DO UPDATE SET count = count + excluded.count""",
+                [(u, v, relation, count) for (u, v, relation), count in facts.items()]
+            )
+            self._conn.executemany("UPDATE nodes SET degree = degree + ? WHERE id = ?",
+                                   [(n, node) for node, n in increments.items() if n])
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM edges")
+            self._conn.execute("DELETE FROM aliases")
+            self._conn.execute("DELETE FROM nodes")
+
+    # -- queries -------------------------------------------------------
+    def node_id(self, name):
+        """ID of ``name`` (or one of its aliases), None if unknown"""
+        with self._lock:
+            for alias in (normalize_name(name), normalize_name(self._canonical(name))):
+                row = self._conn.execute("SELECT node FROM aliases WHERE alias = ?", (alias,)).fetchone()
+                if row is not None:
+                    return row[0]
+        return None
+
+    def neighbors(self, name, limit=None):
+        """``[(neighbour, weight)]`` in either direction, strongest first"""
+        node = self.node_id(name)
+        if node is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT n.name, SUM(c) AS weight FROM (
+                       SELECT dst AS other, count AS c FROM edges WHERE src = ?
+                       UNION ALL
+                       SELECT src AS other, count AS c FROM edges WHERE dst = ?
+                   ) JOIN nodes n ON n.id = other
+                   GROUP BY other ORDER BY weight DESC, n.name LIMIT ?""",
+                (node, node, -1 if limit is None else limit)
+            ).fetchall()
+        return rows
+
+    def top_nodes(self, limit=20):
+        """``[(name, degree)]`` of the best-connected concepts"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, degree FROM nodes ORDER BY degree DESC, id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def subgraph(self, seeds, hops=1, max_nodes=500):
+        """NetworkX graph of everything within ``hops`` of ``seeds``
+
+        Each hop adds the best-connected new neighbours first and stops at
+        ``max_nodes``.
+        """
+        if isinstance(seeds, str):
+            seeds = [seeds]
+        ids = [node for node in map(self.node_id, seeds) if node is not None]
+        with self._lock:
+            selected = list(dict.fromkeys(ids))[:max_nodes]
+            frontier = selected
+            for _ in range(hops):
+                if not frontier or len(selected) >= max_nodes:
+                    break
+                rows = self._conn.execute(
+                    _SELECTION + """SELECT n.id FROM (
+                           SELECT e.dst AS other FROM selection s JOIN edges e ON e.src = s.id
+                           UNION
+                           SELECT e.src AS other FROM selection s JOIN edges e ON e.dst = s.id
+                       ) JOIN nodes n ON n.id = other
+                       ORDER BY n.degree DESC, n.id""",
+                    (json.dumps(frontier),)
+                ).fetchall()
+                seen = set(selected)
+                frontier = [row[0] for row in rows if row[0] not in seen][:max_nodes - len(selected)]
+                selected.extend(frontier)
+            return self._induced(selected)
+
+    def top_subgraph(self, max_nodes=300):
+        """Graph induced by the ``max_nodes`` highest-degree concepts"""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM nodes ORDER BY degree DESC, id LIMIT ?", (max_nodes,)
+            )]
+            return self._induced(ids)
+
+    def _induced(self, ids):
+        """Nodes ``ids`` and the edges among them (caller holds the lock)"""
+        import networkx as nx
+
+        selection = (json.dumps(ids),)
+        G = nx.Graph()
+        names = dict(self._conn.execute(
+            _SELECTION + "SELECT n.id, n.name FROM selection s JOIN nodes n ON n.id = s.id",
+            selection
+        ))
+        G.add_nodes_from(names[node] for node in ids if node in names)
+        relations = {}
+        for src, dst, relation, count in self._conn.execute(
+            _SELECTION + """SELECT e.src, e.dst, e.relation, e.count
+               FROM selection s JOIN edges e ON e.src = s.id
+               WHERE e.dst IN (SELECT id FROM selection)""",
+            selection
+        ):
+            pair = (min(src, dst), max(src, dst))
+            relations.setdefault(pair, Counter())[relation] += count
+        for (u, v), counter in relations.items():
+            G.add_edge(names[u], names[v], weight=sum(counter.values()),
+                       label=counter.most_common(1)[0][0])
+        return G
+
+    def stats(self):
+        with self._lock:
+            nodes = self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+            edges = self._conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        return {"nodes": nodes, "edges": edges}
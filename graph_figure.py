@@ -0,0 +1,84 @@
+"""Plotly figure construction for knowledge graphs
+
+All edges are drawn as one trace whose segments are separated by NaN gaps
+(instead of one ``go.Scatter`` per edge), and large graphs switch to WebGL
+(``go.Scattergl``). Level-of-detail options cap the number of rendered nodes
+by degree and hide labels of weakly connected nodes.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# Above this many nodes + edges the figure is rendered with WebGL
+WEBGL_THRESHOLD = 1000
+
+
+def select_top_nodes(G, max_nodes):
+    """Keep the ``max_nodes`` highest-degree nodes (ties broken by name)"""
+    if not max_nodes or G.number_of_nodes() <= max_nodes:
+        return G
+    ranked = sorted(G.degree(), key=lambda item: (-item[1], str(item[0])))
+    return G.subgraph(node for node, _ in ranked[:max_nodes])
+
+
+def build_graph_figure(G, pos, max_nodes=None, label_min_degree=0,
+                       webgl_threshold=WEBGL_THRESHOLD, title="Knowledge Graph"):
+    """Render graph ``G`` with node positions ``pos`` as a Plotly figure"""
+    full_degree = dict(G.degree())
+    G = select_top_nodes(G, max_nodes)
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    coords = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+    use_webgl = G.number_of_nodes() + G.number_of_edges() > webgl_threshold
+    scatter = go.Scattergl if use_webgl else go.Scatter
+
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    segments = np.full((len(edges), 3, 2), np.nan)
+    segments[:, 0] = coords[edges[:, 0]]
+    segments[:, 1] = coords[edges[:, 1]]
+    segments = segments.reshape(-1, 2)
+    edge_trace = scatter(
+        x=segments[:, 0],
+        y=segments[:, 1],
+        mode='lines',
+        line=dict(width=2, color='#94a3b8'),
+        hoverinfo='none',
+        showlegend=False
+    )
+
+    degrees = np.array([full_degree[node] for node in nodes], dtype=np.int64)
+    labels = [str(node) if degree >= label_min_degree else ""
+              for node, degree in zip(nodes, degrees)]
+    node_trace = scatter(
+        x=coords[:, 0], y=coords[:, 1],
+        mode='markers+text',
+        text=labels,
+        hovertext=[str(node) for node in nodes],
+        textposition="top center",
+        textfont=dict(size=10, color='#1e293b', family='Arial Black'),
+        hoverinfo='text',
+        marker=dict(
+            size=np.minimum(20 + degrees * 10, 60),
+            color='#3b82f6',
+            line=dict(width=2, color='#1e40af'),
+            symbol='circle'
+        ),
+        showlegend=False
+    )
+
+    fig = go.Figure(data=[edge_trace, node_trace])
+
+    fig.update_layout(
+        title={'text': title, 'x': 0.5, 'xanchor': 'center',
+               'font': {'size': 20, 'color': '#1e293b', 'family': 'Arial Black'}},
+        showlegend=False,
+        hovermode='closest',
+        margin=dict(b=20, l=5, r=5, t=40),
+        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        plot_bgcolor='rgba(240, 249, 255, 0.5)',
+        paper_bgcolor='white',
+        height=500
+    )
+
+    return fig
@@ -0,0 +1,231 @@
+"""Cached, incremental and scalable knowledge-graph layout
+
+``LayoutEngine.layout`` memoizes positions by graph signature, so Streamlit
+reruns never recompute a layout they have already seen. When a graph grows
+(the global graph after each turn), the previous positions of the same scope
+seed the next layout and stay fixed, so only the new nodes settle. Small
+graphs use ``nx.spring_layout`` as before; large ones use ``barnes_hut_layout``,
+a vectorized Fruchterman-Reingold layout whose repulsion is approximated on a
+quadtree of cell centres of mass (O(n log n) per iteration).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+LARGE_GRAPH_NODES = 300
+
+
+def graph_signature(G):
+    """Order-independent hash of a graph's nodes and edges"""
+    h = hashlib.sha1()
+    for node in sorted(map(str, G.nodes())):
+        h.update(node.encode("utf-8"))
+        h.update(b"\x00")
+    h.update(b"\x01")
+    for edge in sorted("\x1f".join(sorted((str(u), str(v)))) for u, v in G.edges()):
+        h.update(edge.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _rescale(pos):
+    """Centre on the origin and scale into [-1, 1] like ``nx.rescale_layout``"""
+    pos = pos - pos.mean(axis=0)
+    scale = np.abs(pos).max()
+    return pos / scale if scale > 0 else pos
+
+
+def barnes_hut_layout(n, edges, pos=None, fixed=None, iterations=50, seed=0, depth=None):
+    """Vectorized force-directed layout for ``n`` nodes
+
+    ``edges`` is an ``(m, 2)`` integer array of node indices, ``pos`` optional
+    initial ``(n, 2)`` positions and ``fixed`` an optional boolean mask of
+    nodes that must not move. Far-field repulsion is taken from quadtree cell
+    centres of mass: at every level a node interacts with the cells that are
+    children of its parent's neighbours but not its own neighbours (at most
+    27 per level), so each iteration costs O(n log n).
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, size=(n, 2)) if pos is None else np.array(pos, dtype=np.float64)
+    if n < 2:
+        return pos
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    movable = np.ones(n, dtype=bool) if fixed is None else ~np.asarray(fixed, dtype=bool)
+    if depth is None:
+        depth = int(np.clip(np.ceil(np.log(max(n, 4) / 2) / np.log(4)), 2, 9))
+
+    k = 2.0 / np.sqrt(n)  # ideal edge length inside a [-1, 1] box
+    k2 = k * k
+    temperature = 0.2
+    cooling = temperature / (iterations + 1)
+    offsets = np.arange(-2, 4)  # children of the parent's 3x3 neighbourhood
+
+    active = np.flatnonzero(movable)
+    if not len(active):
+        return pos
+    if len(edges):
+        # only edges touching a movable node contribute to its displacement
+        edges = edges[movable[edges[:, 0]] | movable[edges[:, 1]]]
+
+    for _ in range(iterations):
+        p = pos[active]
+        disp = np.zeros_like(p)
+        lo = pos.min(axis=0)
+        span = (pos.max(axis=0) - lo).max() or 1.0
+        unit_all = (pos - lo) / span * (1 - 1e-9)
+
+        for level in range(1, depth + 1):
+            size = 1 << level
+            cid_all = np.floor(unit_all * size).astype(np.int64)
+            flat = cid_all[:, 0] * size + cid_all[:, 1]
+            mass = np.bincount(flat, minlength=size * size).astype(np.float64)
+            com_x = np.bincount(flat, weights=pos[:, 0], minlength=size * size)
+            com_y = np.bincount(flat, weights=pos[:, 1], minlength=size * size)
+
+            cell = cid_all[active]
+            parent = cell // 2
+            for ox in offsets:
+                cx = 2 * parent[:, 0] + ox
+                for oy in offsets:
+                    cy = 2 * parent[:, 1] + oy
+                    inside = (cx >= 0) & (cx < size) & (cy >= 0) & (cy < size)
+                    far = (np.abs(cx - cell[:, 0]) > 1) | (np.abs(cy - cell[:, 1]) > 1)
+                    # near cells are refined at the next level, except at the finest one
+                    use = inside & far if level < depth else inside
+                    if not use.any():
+                        continue
+                    target = np.where(use, cx * size + cy, 0)
+                    m = np.where(use, mass[target], 0.0)
+                    cxm = com_x[target]
+                    cym = com_y[target]
+                    # remove the node itself from its own cell
+                    own = use & (cx == cell[:, 0]) & (cy == cell[:, 1])
+                    cxm = np.where(own, cxm - p[:, 0], cxm)
+                    cym = np.where(own, cym - p[:, 1], cym)
+                    m = np.where(own, m - 1, m)
+                    valid = m > 0
+                    safe_m = np.where(valid, m, 1.0)
+                    dx = p[:, 0] - cxm / safe_m
+                    dy = p[:, 1] - cym / safe_m
+                    d2 = np.maximum(dx * dx + dy * dy, 1e-9)
+                    force = np.where(valid, m * k2 / d2, 0.0)
+                    disp[:, 0] += dx * force
+                    disp[:, 1] += dy * force
+
+        if len(edges):
+            full = np.zeros_like(pos)
+            src, dst = edges[:, 0], edges[:, 1]
+            delta = pos[src] - pos[dst]
+            dist = np.sqrt(np.maximum((delta * delta).sum(axis=1), 1e-9))
+            pull = delta * (dist / k)[:, None]
+            for axis in (0, 1):
+                full[:, axis] -= np.bincount(src, weights=pull[:, axis], minlength=n)
+                full[:, axis] += np.bincount(dst, weights=pull[:, axis], minlength=n)
+            disp += full[active]
+
+        length = np.sqrt(np.maximum((disp * disp).sum(axis=1), 1e-12))
+        step = np.minimum(length, temperature) / length
+        pos[active] = p + disp * step[:, None]
+        temperature -= cooling
+
+    return pos
+
+
+class LayoutEngine:
+    """Memoized, incremental layouts shared by all sessions"""
+
+    def __init__(self, max_entries=256, max_scopes=256, large_graph_nodes=LARGE_GRAPH_NODES,
+                 iterations=50, seed=42):
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.large_graph_nodes = large_graph_nodes
+        self.iterations = iterations
+        self.seed = seed
+        self._layouts = OrderedDict()
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def layout(self, G, scope=None):
+        """Return ``{node: (x, y)}`` for ``G``
+
+        ``scope`` names a graph that grows over time (e.g. one session's
+        global graph); its last positions seed the next layout.
+        """
+        signature = graph_signature(G)
+        with self._lock:
+            pos = self._layouts.get(signature)
+            if pos is not None:
+                self._layouts.move_to_end(signature)
+                self.hits += 1
+            previous = self._scopes.get(scope) if scope is not None else None
+        if pos is None:
+            self.misses += 1
+            pos = self._compute(G, previous)
+
+        with self._lock:
+            self._layouts[signature] = pos
+            while len(self._layouts) > self.max_entries:
+                self._layouts.popitem(last=False)
+            if scope is not None:
+                self._scopes[scope] = pos
+                self._scopes.move_to_end(scope)
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+        return pos
+
+    def forget_scope(self, scope):
+        with self._lock:
+            self._scopes.pop(scope, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._layouts)}
+
+    def _initial_positions(self, G, previous):
+        """Previous positions for known nodes, neighbour centroid for new ones"""
+        rng = np.random.default_rng(self.seed)
+        init = {}
+        for node in G.nodes():
+            if node in previous:
+                init[node] = np.asarray(previous[node], dtype=np.float64)
+        for node in G.nodes():
+            if node in init:
+                continue
+            anchors = [init[nb] for nb in G.neighbors(node) if nb in init]
+            centre = np.mean(anchors, axis=0) if anchors else np.zeros(2)
+            init[node] = centre + rng.normal(scale=0.1, size=2)
+        return init
+
+    def _compute(self, G, previous):
+        nodes = list(G.nodes())
+        if not nodes:
+            return {}
+
+        known = [node for node in nodes if previous and node in previous]
+        if previous and len(known) == len(nodes):
+            return {node: previous[node] for node in nodes}
+        init = self._initial_positions(G, previous) if known else None
+
+        if len(nodes) < self.large_graph_nodes:
+            if init is None:
+                return nx.spring_layout(G, k=2, iterations=self.iterations, seed=self.seed)
+            return nx.spring_layout(G, k=2, pos=init, fixed=known, iterations=self.iterations,
+                                    seed=self.seed)
+
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges() if u != v],
+                         dtype=np.int64).reshape(-1, 2)
+        start = None
+        fixed = None
+        if init is not None:
+            start = np.array([init[node] for node in nodes])
+            fixed = np.array([node in previous for node in nodes])
+        coords = barnes_hut_layout(len(nodes), edges, pos=start, fixed=fixed,
+                                   iterations=self.iterations, seed=self.seed)
+        if fixed is None:
+            coords = _rescale(coords)
+        return {node: coords[i] for i, node in enumerate(nodes)}
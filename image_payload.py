@@ -0,0 +1,125 @@
+"""Image payload preparation before model calls
+
+Images are downscaled to a per-mode maximum edge, near-duplicates are dropped
+using a perceptual difference hash, and the rest are re-encoded as compact JPEG
+blobs. Without this the SDK ships each full-size PIL image as lossless WebP.
+"""
+import io
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Longest image edge sent to the model, per analysis mode
+MODE_MAX_EDGE = {
+    "microstructure": 2048,
+    "troubleshooting": 1536,
+    "general": 1024,
+    "process_design": 1024,
+    "comparison": 1024,
+}
+DEFAULT_MAX_EDGE = 1024
+JPEG_QUALITY = 85
+DUPLICATE_HAMMING_DISTANCE = 6
+DUPLICATE_COLOR_DISTANCE = 12.0
+
+
+def dhash(image, hash_size=8):
+    """128-bit difference hash (row and column gradients) of an image
+
+    Robust to rescaling and re-encoding; returned as a Python int.
+    """
+    gray = image.convert("L")
+    rows = np.asarray(gray.resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    cols = np.asarray(gray.resize((hash_size, hash_size + 1), Image.BILINEAR), dtype=np.int16)
+    bits = np.concatenate([
+        (rows[:, 1:] > rows[:, :-1]).ravel(),
+        (cols[1:, :] > cols[:-1, :]).ravel(),
+    ])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _color_signature(image):
+    """Tiny RGB thumbnail; separates low-texture images that share a hash"""
+    return np.asarray(image.convert("RGB").resize((8, 8), Image.BILINEAR), dtype=np.float32)
+
+
+def _is_duplicate(fingerprint, seen, hamming, color_distance):
+    phash, colors = fingerprint
+    for other_hash, other_colors in seen:
+        if (bin(phash ^ other_hash).count("1") <= hamming
+                and float(np.abs(colors - other_colors).mean()) <= color_distance):
+            return True
+    return False
+
+
+def _downscale(image, max_edge):
+    if max(image.size) <= max_edge:
+        return image
+    resized = image.copy()
+    resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return resized
+
+
+def _encode_jpeg(image, quality):
+    if image.mode != "RGB":
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        else:
+            image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def prepare_image_payload(images, mode="general", max_edge=None, quality=JPEG_QUALITY,
+                          duplicate_distance=DUPLICATE_HAMMING_DISTANCE,
+                          color_distance=DUPLICATE_COLOR_DISTANCE):
+    """Downscale, deduplicate and encode ``(image, label)`` pairs for the model
+
+    Returns ``(kept, parts, report)`` where ``kept`` are the surviving
+    ``(image, label)`` pairs (original images, for display), ``parts`` are
+    ``{"mime_type", "data"}`` blobs to pass to ``generate_content`` and
+    ``report`` counts the images and bytes sent. ``decoded_bytes`` is the
+    uncompressed pixel size of the kept images, for scale only: it is not
+    what was sent before (the SDK's lossless WebP encoding of each image).
+    """
+    if max_edge is None:
+        max_edge = MODE_MAX_EDGE.get(mode, DEFAULT_MAX_EDGE)
+
+    kept, parts, seen = [], [], []
+    decoded_bytes = sent_bytes = 0
+    dropped = []
+    for image, label in images:
+        fingerprint = (dhash(image), _color_signature(image))
+        if _is_duplicate(fingerprint, seen, duplicate_distance, color_distance):
+            dropped.append(label)
+            continue
+        seen.append(fingerprint)
+
+        decoded_bytes += image.width * image.height * len(image.getbands())
+        data = _encode_jpeg(_downscale(image, max_edge), quality)
+        sent_bytes += len(data)
+        kept.append((image, label))
+        parts.append({"mime_type": "image/jpeg", "data": data})
+
+    report = {
+        "mode": mode,
+        "max_edge": max_edge,
+        "images_in": len(images),
+        "images_sent": len(parts),
+        "duplicates_dropped": dropped,
+        "decoded_bytes": decoded_bytes,
+        "sent_bytes": sent_bytes,
+    }
+    if images:
+        logger.info(
+            "image payload (%s): %d/%d images, %d bytes sent (%d decoded), %d duplicate(s) dropped",
+            mode, len(parts), len(images), sent_bytes, decoded_bytes, len(dropped),
+        )
+    return kept, parts, report
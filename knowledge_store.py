@@ -0,0 +1,164 @@
+"""Indexed, deduplicated knowledge-graph store
+
+Every concept is interned once: names are normalized (case, whitespace,
+surrounding punctuation) and optionally resolved through an alias function,
+so "Cold Spray", "cold spray" and "CSAM" share one node ID. Adjacency is kept
+as one set of neighbour IDs per node and each directed fact
+``(source, relation, target)`` is stored once with a mention count, so memory
+and the cost of building the global graph grow with the number of unique
+facts, not with the number of turns.
+"""
+import re
+from collections import Counter
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\r\n.,;:!?\"'`*()[]{}"
+
+
+def normalize_name(name):
+    """Case-, whitespace- and punctuation-insensitive key for a concept name"""
+    return _WHITESPACE.sub(" ", str(name)).strip(_EDGE_PUNCTUATION).casefold()
+
+
+class KnowledgeGraphStore:
+    """Session knowledge graph with interned nodes and counted edges
+
+    ``resolve`` maps a raw name to its canonical form (or ``None`` when it
+    is not a known alias), e.g. ``EntityExtractor.canonical_name``.
+    """
+
+    def __init__(self, resolve=None):
+        self._resolve = resolve
+        self._ids = {}          # normalized name or alias -> node id
+        self._names = []        # node id -> display name
+        self._mentions = []     # node id -> times the concept was extracted
+        self._adjacency = []    # node id -> set of neighbour ids (undirected)
+        self._edges = {}        # (source id, target id) -> Counter(relation -> count)
+        self.version = 0        # bumped on every change; cheap staleness check
+
+    # -- interning -----------------------------------------------------
+    def node_id(self, name):
+        """ID of ``name`` (after alias resolution) or None if unknown"""
+        key = normalize_name(name)
+        node = self._ids.get(key)
+        if node is None and self._resolve is not None:
+            canonical = self._resolve(str(name).strip())
+            if canonical is not None:
+                node = self._ids.get(normalize_name(canonical))
+        return node
+
+    def intern(self, name):
+        """Return the ID of ``name``, creating the node if needed"""
+        key = normalize_name(name)
+        if not key:
+            return None
+        node = self._ids.get(key)
+        if node is not None:
+            return node
+        display = _WHITESPACE.sub(" ", str(name)).strip()
+        if self._resolve is not None:
+            canonical = self._resolve(display)
+            if canonical is not None:
+                display = canonical
+                node = self._ids.get(normalize_name(canonical))
+        if node is None:
+            node = len(self._names)
+            self._names.append(display)
+            self._mentions.append(0)
+            self._adjacency.append(set())
+            self._ids[normalize_name(display)] = node
+        # remember the surface form so the alias resolves in O(1) next time
+        self._ids[key] = node
+        return node
+
+    # -- updates -------------------------------------------------------
+    def add_entity(self, name):
+        node = self.intern(name)
+        if node is not None:
+            self._mentions[node] += 1
+            self.version += 1
+        return node
+
+    def add_relation(self, source, relation, target):
+        """Record one mention of ``source -relation-> target``"""
+        u, v = self.intern(source), self.intern(target)
+        if u is None or v is None or u == v:
+            return False
+        self._adjacency[u].add(v)
+        self._adjacency[v].add(u)
+        self._edges.setdefault((u, v), Counter())[relation or "relates_to"] += 1
+        self.version += 1
+        return True
+
+    def merge(self, entities, relationships):
+        """Merge one extraction result (``entities``, ``[{source, relation, target}]``)"""
+        for entity in entities:
+            self.add_entity(entity)
+        for rel in relationships:
+            if 'source' in rel and 'target' in rel:
+                self.add_relation(rel['source'], rel.get('relation', 'relates_to'), rel['target'])
+
+    # -- lookups -------------------------------------------------------
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return self.node_id(name) is not None
+
+    def nodes(self):
+        return list(self._names)
+
+    def number_of_edges(self):
+        """Unique (source, relation, target) facts"""
+        return sum(len(relations) for relations in self._edges.values())
+
+    def neighbors(self, name):
+        """Names of all concepts linked to ``name`` in either direction"""
+        node = self.node_id(name)
+        if node is None:
+            return []
+        return [self._names[other] for other in self._adjacency[node]]
+
+    def degree(self, name):
+        node = self.node_id(name)
+        return len(self._adjacency[node]) if node is not None else 0
+
+    def has_edge(self, source, target):
+        """True if the concepts are linked in either direction"""
+        u, v = self.node_id(source), self.node_id(target)
+        return u is not None and v is not None and v in self._adjacency[u]
+
+    def relations(self, source, target):
+        """``{relation: count}`` for ``source -> target``"""
+        u, v = self.node_id(source), self.node_id(target)
+        return dict(self._edges.get((u, v), {}))
+
+    def weight(self, source, target):
+        """Total mentions of any relation between the two concepts"""
+        u, v = self.node_id(source), self.node_id(target)
+        return sum(self._edges.get((u, v), {}).values()) + sum(self._edges.get((v, u), {}).values())
+
+    def mentions(self, name):
+        node = self.node_id(name)
+        return self._mentions[node] if node is not None else 0
+
+    def edges(self):
+        """Yield ``(source, relation, target, count)`` for every unique fact"""
+        for (u, v), relations in self._edges.items():
+            for relation, count in relations.items():
+                yield self._names[u], relation, self._names[v], count
+
+    def to_networkx(self):
+        """Undirected graph with ``weight`` and ``label`` (most frequent relation) per edge"""
+        import networkx as nx
+
+        G = nx.Graph()
+        G.add_nodes_from(self._names)
+        for (u, v), relations in self._edges.items():
+            a, b = self._names[u], self._names[v]
+            weight = sum(relations.values())
+            if G.has_edge(a, b):
+                G[a][b]['weight'] += weight
+                continue
+            G.add_edge(a, b, weight=weight, label=relations.most_common(1)[0][0])
+        return G
@@ -1,17 +1,36 @@
 import streamlit as st
-import google.generativeai as genai
 from PIL import Image
-import io
 from datetime import datetime
-import re
-import fitz  # PyMuPDF
-import plotly.graph_objects as go
-import plotly.express as px
-import networkx as nx
-from collections import defaultdict
+from collections import OrderedDict
+import functools
 import json
-import pandas as pd
-import numpy as np
+import uuid
+import time
+
+# Heavy third-party modules (google.generativeai, pandas, plotly, networkx,
+# PyMuPDF) are imported inside the functions that use them, so first paint
+# and turns that never touch a PDF or a graph do not pay for them.
+import analysis
+from analysis import validate_ssam_query
+from config import (
+    HISTORY_WINDOW, LOCAL_EXTRACTION_MIN_ENTITIES, PDF_TOKEN_BUDGET, PDF_TOP_K_CHUNKS, PROMPT_TOKEN_BUDGET,
+    SESSION_MEMORY_MB, SESSION_METRIC_SAMPLES, TURN_TRACE_HISTORY
+)
+from image_payload import prepare_image_payload
+from knowledge_store import KnowledgeGraphStore
+from model_pool import DeadlineExceeded
+from parameter_db import get_parameter_db
+from pdf_retrieval import estimate_tokens
+from prompt_budget import format_report
+from resources import (
+    get_blob_writer, get_entity_extractor, get_extraction_executor, get_graph_database,
+    get_image_store, get_layout_engine, get_metrics_exporter, get_model_pool, get_page_renderer,
+    get_pdf_cache, get_response_cache, get_semantic_cache, get_telemetry, load_css
+)
+from response_cache import content_hash
+from session_images import enforce_budget, estimate_session_bytes, load_original, spill_image
+from ssam_databases import MATERIAL_DATABASE, SSAM_PROCESSES
+from telemetry import Telemetry, Trace
 
 # Page config
 st.set_page_config(
@@ -21,86 +40,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Enhanced CSS
-st.markdown("""
-    <style>
-    .main {background: linear-gradient(135deg, #1e3a8a 0%, #1e40af 50%, #1e3a8a 100%);}
-    .chat-message {
-        padding: 1.5rem;
-        border-radius: 0.8rem;
-        margin-bottom: 1rem;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        animation: fadeIn 0.5s;
-    }
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    .user-message {
-        background: linear-gradient(135deg, #2563eb 0%, #3b82f6 100%);
-        color: white;
-        margin-left: 15%;
-        border-left: 4px solid #1d4ed8;
-    }
-    .assistant-message {
-        background: white;
-        color: black;
-        margin-right: 15%;
-        border-left: 4px solid #10b981;
-    }
-    .reference-box {
-        background: #f0f9ff;
-        border-left: 4px solid #0284c7;
-        padding: 1rem;
-        margin: 1rem 0;
-        border-radius: 0.5rem;
-    }
-    .knowledge-graph-container {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 0.8rem;
-        margin: 1rem 0;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-    }
-    .parameter-card {
-        background: white;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 0.5rem 0;
-        border-left: 3px solid #3b82f6;
-    }
-    .comparison-table {
-        background: white;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 1rem 0;
-    }
-    h1, h2, h3 {
-        color: white !important;
-        text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
-    }
-    .stButton > button {
-        background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%);
-        color: white;
-        border: none;
-        padding: 0.6rem 2rem;
-        border-radius: 0.5rem;
-        font-weight: 600;
-        transition: all 0.3s;
-    }
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(37, 99, 235, 0.4);
-    }
-    .metric-card {
-        background: white;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        text-align: center;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-    }
-    </style>
-""", unsafe_allow_html=True)
+# Enhanced CSS (read once per process)
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Session state initialization
 if 'messages' not in st.session_state:
@@ -109,139 +50,72 @@ if 'api_key' not in st.session_state:
     st.session_state.api_key = None
 if 'model' not in st.session_state:
     st.session_state.model = None
-if 'knowledge_graph' not in st.session_state:
-    st.session_state.knowledge_graph = defaultdict(list)
 if 'process_comparisons' not in st.session_state:
     st.session_state.process_comparisons = []
 if 'material_database' not in st.session_state:
     st.session_state.material_database = {}
 if 'conversation_context' not in st.session_state:
     st.session_state.conversation_context = []
+if 'last_response_timings' not in st.session_state:
+    st.session_state.last_response_timings = None
+if 'last_prompt_report' not in st.session_state:
+    st.session_state.last_prompt_report = None
+if 'pending_extractions' not in st.session_state:
+    st.session_state.pending_extractions = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'kg_figures' not in st.session_state:
+    st.session_state.kg_figures = OrderedDict()
+if 'session_telemetry' not in st.session_state:
+    st.session_state.session_telemetry = Telemetry(max_samples=SESSION_METRIC_SAMPLES)
+if 'turn_traces' not in st.session_state:
+    st.session_state.turn_traces = []
 
-# Solid-State AM Process Database
-SSAM_PROCESSES = {
-    "CSAM": {
-        "name": "Cold Spray Additive Manufacturing",
-        "temperature_range": "< 0.5 Tm",
-        "bonding_mechanism": "Kinetic energy, plastic deformation",
-        "typical_materials": ["Al", "Cu", "Ti", "Stainless Steel", "Composites"],
-        "advantages": ["No melting", "Low oxidation", "High deposition rate", "Thick coatings"],
-        "limitations": ["Limited geometry", "Porosity control", "Equipment cost"],
-        "typical_velocity": "300-1200 m/s",
-        "typical_pressure": "1-5 MPa",
-        "applications": ["Repair", "Coatings", "Structural components"]
-    },
-    "UAM": {
-        "name": "Ultrasonic Additive Manufacturing",
-        "temperature_range": "< 0.5 Tm",
-        "bonding_mechanism": "Ultrasonic vibration, solid-state welding",
-        "typical_materials": ["Al", "Cu", "Stainless Steel", "Ti", "Composites"],
-        "advantages": ["Precision", "Embedded sensors", "Low temperature", "Dissimilar metals"],
-        "limitations": ["Slow deposition", "Layer delamination", "Surface finish"],
-        "typical_frequency": "20 kHz",
-        "typical_force": "1000-4000 N",
-        "applications": ["Aerospace", "Electronics", "Embedded systems"]
-    },
-    "FSAM": {
-        "name": "Friction Stir Additive Manufacturing",
-        "temperature_range": "0.6-0.9 Tm",
-        "bonding_mechanism": "Friction heat, plastic deformation",
-        "typical_materials": ["Al alloys", "Mg alloys", "Steel", "Ti"],
-        "advantages": ["Dense parts", "Good mechanical properties", "Large components"],
-        "limitations": ["Tool wear", "Complex geometries limited", "Force requirements"],
-        "typical_rotation": "200-2000 RPM",
-        "typical_traverse": "50-500 mm/min",
-        "applications": ["Structural parts", "Large components", "Repair"]
-    },
-    "AFSD": {
-        "name": "Additive Friction Stir Deposition",
-        "temperature_range": "0.7-0.95 Tm",
-        "bonding_mechanism": "Friction heat, severe plastic deformation",
-        "typical_materials": ["Al", "Mg", "Ti", "Steel", "Inconel"],
-        "advantages": ["High density", "Excellent properties", "Large parts", "High deposition"],
-        "limitations": ["Equipment requirements", "Process control", "Tool design"],
-        "typical_rotation": "300-600 RPM",
-        "typical_feed_rate": "100-300 mm/min",
-        "applications": ["Aerospace", "Defense", "Large structures"]
-    }
-}
-
-# Material properties database
-MATERIAL_DATABASE = {
-    "Aluminum 6061": {
-        "density": "2.70 g/cm³",
-        "melting_point": "582-652°C",
-        "thermal_conductivity": "167 W/m·K",
-        "yield_strength": "276 MPa",
-        "ssam_compatibility": ["CSAM", "UAM", "FSAM", "AFSD"],
-        "common_applications": "Aerospace, automotive, structural"
-    },
-    "Copper": {
-        "density": "8.96 g/cm³",
-        "melting_point": "1085°C",
-        "thermal_conductivity": "401 W/m·K",
-        "yield_strength": "70 MPa",
-        "ssam_compatibility": ["CSAM", "UAM"],
-        "common_applications": "Electronics, heat exchangers, conductors"
-    },
-    "Titanium Ti-6Al-4V": {
-        "density": "4.43 g/cm³",
-        "melting_point": "1604-1660°C",
-        "thermal_conductivity": "6.7 W/m·K",
-        "yield_strength": "880 MPa",
-        "ssam_compatibility": ["CSAM", "UAM", "FSAM", "AFSD"],
-        "common_applications": "Aerospace, biomedical, high-performance"
-    },
-    "Stainless Steel 316L": {
-        "density": "8.00 g/cm³",
-        "melting_point": "1375-1400°C",
-        "thermal_conductivity": "16 W/m·K",
-        "yield_strength": "170 MPa",
-        "ssam_compatibility": ["CSAM", "UAM", "FSAM"],
-        "common_applications": "Corrosion resistance, marine, chemical"
-    }
-}
+def store_image(image, label):
+    """Thumbnail reference for a chat message; the original goes to disk"""
+    return spill_image(image, label, get_image_store(), executor=get_blob_writer(), pdf_cache=get_pdf_cache())
 
 def configure_gemini(api_key):
-    """Configure Gemini API"""
+    """Configure Gemini API (one shared client per key, see ``get_model_pool``)"""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        return model
+        return get_model_pool().client(api_key)
     except Exception as e:
         st.error(f"Configuration Error: {str(e)}")
         return None
 
-def extract_entities_and_relations(text):
-    """Extract key entities and their relationships from text"""
-    extraction_prompt = f"""Analyze this text about solid-state additive manufacturing and extract:
-
-Text: {text[:1500]}
-
-Return JSON with:
-1. "entities": list of main technical concepts (max 12)
-2. "relationships": list of {{"source", "relation", "target"}} dictionaries
-
-Focus on: processes, materials, parameters, properties, defects, applications.
-Format: {{"entities": ["term1", "term2"], "relationships": [{{"source": "term1", "relation": "uses", "target": "term2"}}]}}"""
+def extract_entities_and_relations(text, model=None, extractor=None, cache=None, pool=None, session_id=None):
+    """Extract key entities and their relationships from text
     
-    try:
-        if st.session_state.model:
-            response = st.session_state.model.generate_content(extraction_prompt)
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                data = json.loads(json_match.group())
-                return data.get('entities', []), data.get('relationships', [])
-    except Exception as e:
-        pass
+    The local vocabulary extractor runs first; the LLM is only asked when it
+    finds fewer than LOCAL_EXTRACTION_MIN_ENTITIES entities, and its answers
+    are kept in the response cache. Pass ``model``, ``extractor``, ``cache``,
+    ``pool`` and ``session_id`` explicitly when calling from a worker thread,
+    where ``st.session_state`` is not available.
+    """
+    if model is None:
+        model = st.session_state.model
+    if pool is None:
+        pool = get_model_pool()
+    if session_id is None:
+        session_id = st.session_state.session_id
+    if extractor is None:
+        extractor = get_entity_extractor()
+    if cache is None:
+        cache = get_response_cache()
     
-    # Fallback: extract technical keywords
-    keywords = re.findall(r'\b[A-Z][A-Za-z]{3,}\b', text)
-    unique_keywords = list(set(keywords))[:12]
-    return unique_keywords, []
+    return analysis.extract_entities_and_relations(text, model, extractor, cache, pool, session_id,
+                                                   LOCAL_EXTRACTION_MIN_ENTITIES)
 
-def create_knowledge_graph(entities, relationships):
-    """Create interactive knowledge graph"""
+def create_knowledge_graph(entities, relationships, layout_scope=None, max_nodes=None, label_min_degree=0):
+    """Create interactive knowledge graph
+    
+    Layouts are memoized by graph signature; pass ``layout_scope`` for a graph
+    that grows over time so its previous positions seed the next layout.
+    ``max_nodes`` keeps only the best-connected nodes and ``label_min_degree``
+    hides labels of weakly connected ones.
+    """
+    import networkx as nx
+    
     G = nx.Graph()
     
     for entity in entities:
@@ -255,70 +129,27 @@ def create_knowledge_graph(entities, relationships):
         for i in range(len(entities) - 1):
             G.add_edge(entities[i], entities[i + 1])
     
-    pos = nx.spring_layout(G, k=2, iterations=50)
-    
-    edge_trace = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_trace.append(
-            go.Scatter(
-                x=[x0, x1, None],
-                y=[y0, y1, None],
-                mode='lines',
-                line=dict(width=2, color='#94a3b8'),
-                hoverinfo='none',
-                showlegend=False
-            )
-        )
-    
-    node_x, node_y, node_text, node_size = [], [], [], []
-    
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(node)
-        node_size.append(20 + G.degree(node) * 10)
-    
-    node_trace = go.Scatter(
-        x=node_x, y=node_y,
-        mode='markers+text',
-        text=node_text,
-        textposition="top center",
-        textfont=dict(size=10, color='#1e293b', family='Arial Black'),
-        hoverinfo='text',
-        marker=dict(
-            size=node_size,
-            color='#3b82f6',
-            line=dict(width=2, color='#1e40af'),
-            symbol='circle'
-        ),
-        showlegend=False
-    )
-    
-    fig = go.Figure(data=edge_trace + [node_trace])
+    return plot_knowledge_graph(G, layout_scope, max_nodes, label_min_degree)
+
+def plot_knowledge_graph(G, layout_scope=None, max_nodes=None, label_min_degree=0):
+    """Lay out and render an existing NetworkX graph"""
+    from graph_figure import build_graph_figure, select_top_nodes
     
-    fig.update_layout(
-        title={'text': "Knowledge Graph", 'x': 0.5, 'xanchor': 'center',
-               'font': {'size': 20, 'color': '#1e293b', 'family': 'Arial Black'}},
-        showlegend=False,
-        hovermode='closest',
-        margin=dict(b=20, l=5, r=5, t=40),
-        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        plot_bgcolor='rgba(240, 249, 255, 0.5)',
-        paper_bgcolor='white',
-        height=500
-    )
+    if max_nodes:
+        G = select_top_nodes(G, max_nodes)
+    with stage("graph_layout"):
+        pos = get_layout_engine().layout(G, scope=layout_scope)
     
-    return fig
+    with stage("graph_figure"):
+        return build_graph_figure(G, pos, label_min_degree=label_min_degree)
 
 def create_process_comparison_chart(processes):
     """Create comparison chart for SSAM processes"""
     if not processes or len(processes) < 2:
         return None
     
+    import plotly.graph_objects as go
+    
     categories = ['Temperature', 'Deposition Rate', 'Precision', 'Material Range', 'Cost']
     
     # Normalized scores for comparison (0-10 scale)
@@ -351,78 +182,91 @@ def create_process_comparison_chart(processes):
     
     return fig
 
+# shared read-only across sessions (st.plotly_chart serializes a copy); st.cache_data
+# would unpickle a fresh Figure on every hit, which costs far more than building one
+@st.cache_resource(max_entries=32, show_spinner=False)
+def create_deposition_window_chart(material, gas, pressure_mpa, grid_points=150):
+    """Heatmap of estimated v_p / v_cr over particle size x gas temperature
+
+    The window (1 <= v_p / v_cr <= 2) is outlined; returns ``(fig, feasible_fraction)``.
+    Memoized per (material, gas, pressure, grid); the temperature axis is part of the grid.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+    from deposition_window import EROSION_FACTOR, deposition_window
+    
+    diameters = np.linspace(5, 80, grid_points)
+    temperatures = np.linspace(100, 1000, grid_points)
+    window = deposition_window([material], diameters, temperatures, [pressure_mpa], gas=gas)
+    eta, feasible = window.plane(material, pressure_mpa)
+    
+    # red: no bonding (< 1), green: window, purple: erosion (> EROSION_FACTOR)
+    zmax = 1.5 * EROSION_FACTOR
+    lower, upper = 1 / zmax, EROSION_FACTOR / zmax
+    colorscale = [
+        [0, '#b2182b'], [lower, '#fddbc7'], [lower, '#a6dba0'],
+        [upper, '#1b7837'], [upper, '#c2a5cf'], [1, '#762a83']
+    ]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Heatmap(
+        x=diameters, y=temperatures, z=eta.T,
+        zmin=0, zmax=zmax, colorscale=colorscale,
+        colorbar=dict(title='v_p / v_cr'),
+        hovertemplate='d %{x:.0f} µm<br>T %{y:.0f} °C<br>v_p / v_cr %{z:.2f}<extra></extra>'
+    ))
+    fig.add_trace(go.Contour(
+        x=diameters, y=temperatures, z=eta.T,
+        contours=dict(start=1, end=EROSION_FACTOR, size=EROSION_FACTOR - 1, coloring='lines', showlabels=True),
+        line=dict(color='black', width=2), showscale=False, hoverinfo='skip'
+    ))
+    fig.update_layout(
+        title=f"Deposition window: {material}, {gas} at {pressure_mpa:.1f} MPa",
+        xaxis_title='Particle diameter (µm)',
+        yaxis_title='Gas temperature (°C)',
+        height=500
+    )
+    return fig, float(feasible.mean())
+
+def lazy_expander(label, key):
+    """Collapsed expander and whether its content needs to be built
+
+    Where Streamlit tracks expander state, toggling it reruns the app and
+    ``.open`` tells whether it is open; older versions always build.
+    """
+    try:
+        expander = st.expander(label, expanded=False, key=key, on_change="rerun")
+    except TypeError:
+        return st.expander(label, expanded=False), True
+    return expander, bool(expander.open)
+
 def create_parameter_table(process_name):
     """Create parameter recommendations table"""
     if process_name not in SSAM_PROCESSES:
         return None
     
-    process = SSAM_PROCESSES[process_name]
-    
-    # Create DataFrame
-    data = {
-        'Parameter': [],
-        'Range': [],
-        'Notes': []
-    }
-    
-    if process_name == 'CSAM':
-        data = {
-            'Parameter': ['Particle Velocity', 'Gas Pressure', 'Gas Temperature', 'Standoff Distance', 'Traverse Speed'],
-            'Range': ['300-1200 m/s', '1-5 MPa', '200-1000°C', '10-50 mm', '10-500 mm/s'],
-            'Notes': ['Critical for bonding', 'Affects velocity', 'Affects particle temp', 'Affects deposition', 'Affects build quality']
-        }
-    elif process_name == 'UAM':
-        data = {
-            'Parameter': ['Frequency', 'Amplitude', 'Normal Force', 'Weld Speed', 'Layer Thickness'],
-            'Range': ['20 kHz', '10-50 µm', '1000-4000 N', '20-100 mm/s', '100-200 µm'],
-            'Notes': ['Fixed by system', 'Key parameter', 'Critical for bonding', 'Affects quality', 'Per layer']
-        }
-    elif process_name in ['FSAM', 'AFSD']:
-        data = {
-            'Parameter': ['Rotation Speed', 'Traverse Speed', 'Axial Force', 'Feed Rate', 'Tool Design'],
-            'Range': ['200-2000 RPM', '50-500 mm/min', '5-50 kN', '100-300 mm/min', 'Process specific'],
-            'Notes': ['Affects heat', 'Affects microstructure', 'Critical parameter', 'Deposition rate', 'Affects flow']
-        }
-    
-    df = pd.DataFrame(data)
-    return df
+    import pandas as pd
+    return pd.DataFrame(get_parameter_db().parameter_table(process_name))
+
+def open_pdf(pdf_file):
+    """Read an uploaded PDF once and return a single-pass ingestor"""
+    from pdf_ingest import PdfIngestor
+    return PdfIngestor.from_file(pdf_file, cache=get_pdf_cache(), renderer=get_page_renderer())
 
-def extract_pdf_text(pdf_file):
+def extract_pdf_text(pdf_file, max_pages=20):
     """Extract text from PDF"""
     try:
-        pdf_file.seek(0)
-        pdf_bytes = pdf_file.read()
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        text = ""
-        for page_num in range(min(len(pdf_document), 20)):
-            page = pdf_document[page_num]
-            text += page.get_text()
-        
-        pdf_document.close()
-        return text
+        with open_pdf(pdf_file) as pdf:
+            return pdf.text(max_pages=max_pages)
     except Exception as e:
         st.error(f"PDF text extraction error: {str(e)}")
         return ""
 
-def extract_pdf_images(pdf_file):
+def extract_pdf_images(pdf_file, max_pages=10, zoom=2.0):
     """Extract images from PDF pages"""
     try:
-        pdf_file.seek(0)
-        pdf_bytes = pdf_file.read()
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        images = []
-        for page_num in range(min(len(pdf_document), 10)):
-            page = pdf_document[page_num]
-            mat = fitz.Matrix(2.0, 2.0)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            image = Image.open(io.BytesIO(img_data))
-            images.append(image)
-        
-        pdf_document.close()
-        return images
+        with open_pdf(pdf_file) as pdf:
+            return list(pdf.images(max_pages=max_pages, zoom=zoom))
     except Exception as e:
         st.error(f"PDF image extraction error: {str(e)}")
         return []
@@ -438,236 +282,204 @@ def process_image_file(uploaded_file):
         st.error(f"Image processing error: {str(e)}")
         return None
 
-def validate_ssam_query(query):
-    """Validate that query is related to solid-state additive manufacturing"""
-    
-    # SSAM-related keywords
-    ssam_keywords = [
-        'csam', 'cold spray', 'uam', 'ultrasonic', 'fsam', 'friction stir',
-        'afsd', 'additive friction', 'solid state', 'solid-state',
-        'kinetic spray', 'supersonic', 'cold gas', 'friction', 'ultrasonic welding',
-        'microstructure', 'bonding', 'deposition', 'particle', 'substrate',
-        'aluminum', 'copper', 'titanium', 'metal', 'alloy', 'coating'
-    ]
-    
-    # Non-SSAM manufacturing processes to reject
-    excluded_keywords = [
-        'fdm', 'fused deposition', 'sla', 'stereolithography', 'sls', 'selective laser',
-        'dmls', 'direct metal laser', 'ebm', 'electron beam', 'binder jetting',
-        'material jetting', 'polyjet', '3d printing', 'powder bed',
-        'laser melting', 'laser sintering', 'arc welding', 'mig', 'tig',
-        'casting', 'forging', 'machining', 'cnc', 'injection molding',
-        'extrusion', 'thermoforming', 'stamping', 'rolling'
-    ]
-    
-    query_lower = query.lower()
+def get_gemini_response(prompt, images=None, pdf_files=None, mode="general", on_text=None):
+    """Get AI response with specialized prompts - SSAM ONLY
     
-    # Check for excluded processes first
-    for excluded in excluded_keywords:
-        if excluded in query_lower:
-            return False, f"This app is exclusively for Solid-State Additive Manufacturing (CSAM, UAM, FSAM, AFSD). Questions about '{excluded}' and other non-solid-state processes are outside the scope."
-    
-    # Check for SSAM-related content
-    has_ssam_content = any(keyword in query_lower for keyword in ssam_keywords)
-    
-    # If query is very short (< 3 words), be lenient
-    if len(query.split()) < 3:
-        has_ssam_content = True
-    
-    if not has_ssam_content:
-        return False, "This app specializes exclusively in Solid-State Additive Manufacturing (CSAM, UAM, FSAM, AFSD). Please ask questions specifically about these solid-state processes, their materials, parameters, or applications."
-    
-    return True, ""
-
-def get_gemini_response(prompt, images=None, pdf_files=None, mode="general"):
-    """Get AI response with specialized prompts - SSAM ONLY"""
+    If ``on_text`` is given the answer is streamed and ``on_text`` receives the
+    text assembled so far as chunks arrive. Latency of the model call is stored
+    in ``st.session_state.last_response_timings`` and the prompt budget report
+    in ``st.session_state.last_prompt_report``; per-stage spans and prompt,
+    image and cache counters go to the session and process telemetry (see
+    ``finish_trace``).
+    """
+    trace = new_trace()
+    prompt_report = payload_report = None
     try:
         if not st.session_state.model:
             return "Please configure API key first", None, [], [], []
         
         # VALIDATE: Ensure query is about solid-state AM only
-        is_valid, error_msg = validate_ssam_query(prompt)
+        with trace.span("validate"):
+            is_valid, error_msg = validate_ssam_query(prompt)
         if not is_valid:
+            trace.add("rejected_queries")
             return error_msg, None, [], [], []
         
-        all_images = []
-        extracted_text = ""
+        def pdf_error(pdf_file, e):
+            st.error(f"PDF processing error ({pdf_file.name}): {str(e)}")
         
-        # Process PDFs
-        if pdf_files:
-            for pdf_file in pdf_files:
-                pdf_file.seek(0)
-                text = extract_pdf_text(pdf_file)
-                if text:
-                    extracted_text += f"\n\nPDF Content:\n{text[:3000]}"
-                
-                pdf_file.seek(0)
-                pdf_imgs = extract_pdf_images(pdf_file)
-                for idx, img in enumerate(pdf_imgs):
-                    all_images.append((img, f"PDF Page {idx + 1}: {pdf_file.name}"))
+        # Process PDFs (one read and at most one open per document)
+        with trace.span("pdf_extraction"):
+            documents, all_images, attachment_hashes = analysis.collect_pdf_context(
+                prompt, pdf_files, open_pdf, PDF_TOP_K_CHUNKS, PDF_TOKEN_BUDGET, on_error=pdf_error
+            )
         
         # Add uploaded images
         if images:
             for idx, img in enumerate(images):
                 all_images.append((img, f"Uploaded Image {idx + 1}"))
         
-        # Build specialized prompt based on mode
-        if mode == "microstructure":
-            system_prompt = """You are an expert metallurgist specializing EXCLUSIVELY in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) microstructure analysis.
-
-CRITICAL: You ONLY discuss solid-state additive manufacturing processes. If asked about fusion-based AM, powder bed fusion, FDM, SLA, or any non-solid-state processes, politely decline and redirect to SSAM topics.
-
-Analyze the provided images/content focusing on:
-1. Grain structure and morphology in SSAM processes
-2. Phase composition in solid-state deposited materials
-3. SSAM-specific defects (porosity, cracks, unbonded regions, particle boundaries)
-4. Interface characteristics in cold spray, UAM, friction stir processes
-5. Particle deformation (for CSAM/cold spray)
-6. Bonding quality indicators specific to solid-state bonding
-
-Provide detailed technical analysis with specific observations related to CSAM, UAM, FSAM, or AFSD."""
-
-        elif mode == "process_design":
-            system_prompt = """You are a manufacturing process engineer specializing EXCLUSIVELY in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD).
-
-CRITICAL: You ONLY provide guidance on solid-state AM processes. Do not discuss or recommend fusion-based AM, conventional welding, casting, or any non-solid-state manufacturing. If asked, politely redirect to SSAM alternatives.
-
-Analyze the query and provide:
-1. Process parameter recommendations for CSAM, UAM, FSAM, or AFSD
-2. Material-process compatibility in solid-state processes
-3. Expected outcomes and properties from solid-state bonding
-4. SSAM-specific challenges and solutions
-5. Best practices for solid-state AM
-6. Quality control considerations for solid-state deposited materials
-
-Be specific with numerical ranges and practical guidance for solid-state processes only."""
-
-        elif mode == "troubleshooting":
-            system_prompt = """You are a solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) troubleshooting expert EXCLUSIVELY.
-
-CRITICAL: You ONLY troubleshoot solid-state AM issues. Do not provide solutions for fusion-based AM, conventional manufacturing, or other processes. If asked about non-SSAM processes, explain this is outside your expertise and redirect to SSAM topics.
-
-Analyze the problem and provide:
-1. Root cause analysis for SSAM-specific issues
-2. Diagnostic steps for solid-state processes
-3. Corrective actions applicable to CSAM, UAM, FSAM, or AFSD
-4. Preventive measures for solid-state AM
-5. Process parameter adjustments for solid-state bonding
-6. Quality inspection methods for solid-state deposited parts
-
-Focus on practical, actionable solutions for solid-state AM only."""
-
-        elif mode == "comparison":
-            system_prompt = """You are an expert in solid-state additive manufacturing processes (CSAM, UAM, FSAM, AFSD) EXCLUSIVELY.
-
-CRITICAL: You ONLY compare solid-state AM processes with each other or discuss solid-state vs fusion-based trade-offs. Do not provide detailed guidance on fusion-based processes. Always frame comparisons from a solid-state perspective.
-
-Compare the requested processes/materials providing:
-1. Key differences and similarities between SSAM processes
-2. Advantages and disadvantages within solid-state AM context
-3. Application suitability for CSAM, UAM, FSAM, AFSD
-4. Cost considerations specific to solid-state processes
-5. Performance characteristics of solid-state bonding
-6. Selection criteria among SSAM processes
-
-Use tables or structured comparisons. If comparing SSAM to non-SSAM, focus on why SSAM is preferred."""
-
-        else:  # general mode
-            system_prompt = """You are an expert in solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD) EXCLUSIVELY.
-
-CRITICAL SCOPE LIMITATION: 
-- You ONLY discuss solid-state additive manufacturing: Cold Spray (CSAM), Ultrasonic AM (UAM), Friction Stir AM (FSAM), and Additive Friction Stir Deposition (AFSD)
-- You do NOT discuss: FDM, SLA, SLS, DMLS, EBM, powder bed fusion, laser melting, binder jetting, or any fusion-based or polymer AM processes
-- If asked about non-SSAM topics, politely explain: "This system specializes exclusively in solid-state additive manufacturing. For questions about [other process], please consult resources specific to that technology."
-
-Provide comprehensive, technical analysis covering:
-1. Detailed explanations of SSAM concepts and mechanisms
-2. Technical parameters specific to solid-state processes
-3. Material behavior in solid-state bonding
-4. Solid-state process mechanics (kinetic energy, ultrasonic, friction)
-5. Applications and best practices for CSAM, UAM, FSAM, AFSD
-6. Current research in solid-state additive manufacturing
-
-Be thorough and technically accurate about solid-state AM only."""
-
-        # Add context from conversation history
-        context = ""
-        if st.session_state.conversation_context:
-            recent_context = st.session_state.conversation_context[-3:]
-            context = "\n\nRecent conversation context:\n" + "\n".join(recent_context)
+        # Downscale per mode, drop near-duplicates, re-encode compactly
+        with trace.span("image_payload"):
+            all_images, image_parts, payload_report = prepare_image_payload(all_images, mode=mode)
+            attachment_hashes.extend(content_hash(part['data']) for part in image_parts)
+        trace.add("images_sent", payload_report['images_sent'])
+        trace.add("image_duplicates_dropped", len(payload_report['duplicates_dropped']))
+        trace.add("image_bytes_sent", payload_report['sent_bytes'])
+        
+        # Build specialized prompt based on mode: PDF passages and conversation
+        # history are packed by priority into the prompt token budget
+        with trace.span("prompt_assembly"):
+            prompt_text, prompt_report, context = analysis.build_prompt(
+                prompt, mode, documents, st.session_state.conversation_context, len(all_images),
+                token_budget=PROMPT_TOKEN_BUDGET
+            )
+            content_parts = [prompt_text] + image_parts
+        st.session_state.last_prompt_report = prompt_report
+        trace.add("prompt_chars", len(prompt_text))
+        trace.add("prompt_tokens_estimated", estimate_tokens(prompt_text))
+        
+        # Generate response (or reuse an identical earlier one)
+        def generate(on_text=None):
+            return analysis.generate_answer(
+                prompt, mode, content_parts, attachment_hashes, context,
+                st.session_state.model, get_model_pool(), st.session_state.session_id,
+                response_cache=get_response_cache(), semantic_cache=get_semantic_cache(), on_text=on_text
+            )
         
-        prompt_text = f"""{system_prompt}
-
-User Query: {prompt}
-
-{extracted_text}
-
-{context}
-
-MANDATORY INSTRUCTIONS:
-- This system is EXCLUSIVELY for solid-state additive manufacturing (CSAM, UAM, FSAM, AFSD)
-- If images are provided, analyze them ONLY in the context of solid-state processes
-- Include technical terminology specific to solid-state bonding mechanisms
-- Provide quantitative information relevant to SSAM processes
-- Reference ONLY CSAM, UAM, FSAM, or AFSD processes
-- If the query mentions non-solid-state processes, politely explain that this is outside the scope
-- DO NOT provide guidance on fusion-based AM, FDM, SLA, SLS, DMLS, EBM, or other non-solid-state processes
-- Structure your response clearly with SSAM focus"""
-
-        if all_images:
-            prompt_text += f"\n\nAnalyzing {len(all_images)} image(s). Provide detailed visual analysis."
-        
-        # Build content
-        content_parts = [prompt_text]
-        for img, _ in all_images:
-            content_parts.append(img)
-        
-        # Generate response
-        with st.spinner("Generating expert analysis..."):
-            response = st.session_state.model.generate_content(content_parts)
-            response_text = response.text
-        
-        # Extract entities for knowledge graph
-        entities, relationships = extract_entities_and_relations(response_text)
-        
-        # Update global knowledge graph
-        for entity in entities:
-            if entity not in st.session_state.knowledge_graph:
-                st.session_state.knowledge_graph[entity] = []
-        for rel in relationships:
-            if 'source' in rel and 'target' in rel:
-                st.session_state.knowledge_graph[rel['source']].append(
-                    (rel.get('relation', 'relates_to'), rel['target'])
+        with trace.span("generate"):
+            if on_text is not None:
+                response_text, timings = generate(on_text)
+            else:
+                with st.spinner("Generating expert analysis..."):
+                    response_text, timings = generate()
+        st.session_state.last_response_timings = timings
+        if timings.get('cached'):
+            trace.add("cache_hits", tier="semantic" if timings.get('similarity') is not None else "exact")
+        else:
+            trace.add("cache_misses")
+            trace.observe("model_queue", timings.get('queue_wait', 0.0))
+            trace.observe("model_first_token", timings.get('ttft', 0.0))
+        
+        # Extract entities for knowledge graph: locally when the vocabulary
+        # covers the answer, otherwise in the background; the caller registers
+        # the future with the message (see collect_pending_extractions)
+        with trace.span("entity_extraction"):
+            extractor = get_entity_extractor()
+            entities, relationships = extractor.extract(response_text)
+            if len(entities) >= LOCAL_EXTRACTION_MIN_ENTITIES:
+                update_knowledge_graph(entities, relationships)
+            else:
+                entities, relationships = [], []
+                background = get_telemetry().timed("entity_extraction_background",
+                                                   extract_entities_and_relations)
+                st.session_state.last_extraction_future = get_extraction_executor().submit(
+                    background, response_text, st.session_state.model, extractor,
+                    get_response_cache(), get_model_pool(), st.session_state.session_id
                 )
         
         # Update conversation context
-        st.session_state.conversation_context.append(f"Q: {prompt[:200]}")
-        st.session_state.conversation_context.append(f"A: {response_text[:200]}")
-        if len(st.session_state.conversation_context) > 10:
-            st.session_state.conversation_context = st.session_state.conversation_context[-10:]
+        st.session_state.conversation_context = analysis.update_context(
+            st.session_state.conversation_context, prompt, response_text
+        )
         
         # Create references (now from uploaded content only)
-        references = []
-        for idx, (img, source) in enumerate(all_images):
-            references.append({
-                'type': 'Uploaded Content',
-                'title': source,
-                'description': 'User-provided material for analysis'
-            })
-        
-        references.append({
-            'type': 'AI Knowledge Base',
-            'title': 'Gemini 2.0 Flash',
-            'description': 'Expert knowledge in solid-state additive manufacturing'
-        })
+        references = analysis.build_references(all_images)
         
         return response_text, all_images, references, entities, relationships
     
+    except DeadlineExceeded:
+        trace.add("errors", kind="deadline")
+        error_msg = "The model is busy right now and the request timed out. Please try again in a moment."
+        st.warning(error_msg)
+        return error_msg, None, [], [], []
     except Exception as e:
         import traceback
+        trace.add("errors", kind="exception")
         error_msg = f"Error: {str(e)}\n{traceback.format_exc()}"
         st.error(error_msg)
         return error_msg, None, [], [], []
+    finally:
+        finish_trace(trace, mode=mode, pdfs=len(pdf_files or ()), images=len(images or ()),
+                     prompt_budget=prompt_report, image_payload=payload_report)
+
+def new_trace():
+    """Trace whose spans and counters also feed the process and session telemetry"""
+    return Trace(get_telemetry(), st.session_state.session_telemetry)
+
+def stage(name):
+    """Timing span for one stage, outside a turn trace (e.g. rendering)"""
+    return new_trace().span(name)
+
+def staged(name):
+    """Decorator that times every call of the function as stage ``name``"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def finish_trace(trace, **fields):
+    """Record a finished turn: total span, session history and the JSON-lines log"""
+    trace.observe("turn_total", time.time() - trace.started)
+    record = trace.to_record(session=st.session_state.session_id, **fields)
+    records = st.session_state.turn_traces
+    records.append(record)
+    del records[:-TURN_TRACE_HISTORY]
+    exporter = get_metrics_exporter()
+    if exporter is not None:
+        try:
+            exporter.write(record)
+        except OSError:
+            pass
+
+def new_knowledge_graph():
+    """Empty session graph; aliases resolve through the SSAM vocabulary"""
+    return KnowledgeGraphStore(resolve=get_entity_extractor().canonical_name)
+
+def report_error(kind, message):
+    """Count a non-fatal failure (``errors{kind=...}``) and show it as a toast"""
+    new_trace().add("errors", kind=kind)
+    st.toast(message)
+
+def update_knowledge_graph(entities, relationships):
+    """Merge extracted entities and relations into the session and shared graphs"""
+    st.session_state.knowledge_graph.merge(entities, relationships)
+    try:
+        get_graph_database().write_batch(entities, relationships)
+    except Exception as e:
+        report_error("graph_write", f"Could not save this answer to the shared knowledge graph: {e}")
+
+def collect_pending_extractions():
+    """Attach finished background extractions to their messages and the global graph"""
+    pending = st.session_state.pending_extractions
+    for msg_id, future in list(pending.items()):
+        if not future.done():
+            continue
+        del pending[msg_id]
+        try:
+            entities, relationships = future.result()
+        except Exception as e:
+            report_error("extraction", f"Knowledge graph extraction failed: {e}")
+            entities, relationships = [], []
+        
+        for msg in st.session_state.messages:
+            if msg.get('id') == msg_id:
+                msg['entities'] = entities
+                msg['relationships'] = relationships
+                st.session_state.kg_figures.pop(msg_id, None)
+                break
+        update_knowledge_graph(entities, relationships)
+
+def poll_pending_extractions():
+    """Rerun the app once outstanding extractions have finished"""
+    if any(f.done() for f in st.session_state.pending_extractions.values()):
+        st.rerun()
+
+if hasattr(st, "fragment"):
+    poll_pending_extractions = st.fragment(run_every=1)(poll_pending_extractions)
 
 def display_references(references):
     """Display formatted references"""
@@ -691,6 +503,50 @@ def display_references(references):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def get_message_figure(message):
+    """Knowledge-graph figure of one message, built once per message ID
+
+    ``kg_figures`` keeps ``(figure, JSON size)`` so the session budget can
+    count it (see ``enforce_budget``).
+    """
+    figures = st.session_state.kg_figures
+    key = message.get('id', id(message))
+    entry = figures.get(key)
+    if entry is None:
+        fig = create_knowledge_graph(message['entities'], message.get('relationships', []))
+        figures[key] = (fig, len(fig.to_json()))
+        # enough for every message in the visible window
+        while len(figures) > 2 * st.session_state.get('history_window', HISTORY_WINDOW):
+            figures.popitem(last=False)
+        return fig
+    figures.move_to_end(key)
+    return entry[0]
+
+def display_image_ref(ref, key):
+    """Thumbnail with a button that opens the full-resolution original"""
+    if ref.get('thumb'):
+        st.image(ref['thumb'], caption=ref['label'], use_column_width=True)
+    else:
+        st.caption(f"🖼 {ref['label']}")
+    if st.button("Full size", key=f"zoom_{key}"):
+        st.session_state.zoom_image = ref
+        st.rerun()
+
+def display_zoomed_image():
+    """Viewer for the image opened with "Full size", loaded from disk on demand"""
+    ref = st.session_state.get('zoom_image')
+    if not ref:
+        return
+    image = load_original(ref, get_image_store(), pdf_cache=get_pdf_cache())
+    if image is None:
+        st.warning(f"The original of '{ref['label']}' is no longer stored.")
+    else:
+        st.image(image, caption=f"{ref['label']} ({image.width}×{image.height})", use_column_width=True)
+    if st.button("Close Image"):
+        st.session_state.zoom_image = None
+        st.rerun()
+
+@staged("render_message")
 def display_message(message, is_user=False):
     """Display chat message with enhanced formatting"""
     css_class = "user-message" if is_user else "assistant-message"
@@ -705,34 +561,60 @@ def display_message(message, is_user=False):
             cols = st.columns(min(len(message['files']), 4))
             for idx, f in enumerate(message['files']):
                 with cols[idx % 4]:
-                    if f.get('data'):
-                        st.image(f['data'], caption=f['name'], use_column_width=True)
+                    if f.get('image'):
+                        display_image_ref(f['image'], key=f"{message.get('id', id(message))}_f{idx}")
                     else:
                         st.markdown(f"📄 {f['name']}")
         
         st.markdown(message['content'])
         
+        if not is_user and message.get('timings'):
+            timings = message['timings']
+            if timings.get('similarity') is not None:
+                st.caption(f"Served from response cache (similar question, {timings['similarity']:.0%} match)")
+            elif timings.get('cached'):
+                st.caption("Served from response cache")
+            else:
+                caption = f"First token {timings['ttft']:.2f} s • Total {timings['total']:.2f} s"
+                if timings.get('queue_wait', 0) >= 0.05:
+                    caption += f" • Queued {timings['queue_wait']:.2f} s"
+                if timings.get('attempts', 1) > 1:
+                    caption += f" • {timings['attempts']} attempts"
+                st.caption(caption)
+        
+        if not is_user and message.get('prompt_report'):
+            st.caption(format_report(message['prompt_report']))
+        
         if not is_user and message.get('response_images'):
             st.markdown("---")
             st.markdown("**Analyzed Images:**")
             cols = st.columns(min(len(message['response_images']), 3))
-            for idx, (img, label) in enumerate(message['response_images']):
+            for idx, ref in enumerate(message['response_images']):
                 with cols[idx % 3]:
-                    st.image(img, caption=label, use_column_width=True)
+                    display_image_ref(ref, key=f"{message.get('id', id(message))}_r{idx}")
         
         if not is_user and message.get('references'):
             display_references(message['references'])
         
+        if not is_user and message.get('id') in st.session_state.pending_extractions:
+            st.caption("Building knowledge graph…")
+        
         if not is_user and message.get('entities') and len(message['entities']) > 1:
             with st.expander("Knowledge Graph", expanded=False):
-                fig = create_knowledge_graph(message['entities'], message.get('relationships', []))
-                st.plotly_chart(fig, use_container_width=True)
+                fig = get_message_figure(message)
+                st.plotly_chart(fig, use_container_width=True, key=f"kg_{message.get('id', id(message))}")
         
         st.markdown('</div>', unsafe_allow_html=True)
 
 def main():
     """Main application"""
     
+    if 'knowledge_graph' not in st.session_state:
+        st.session_state.knowledge_graph = new_knowledge_graph()
+    collect_pending_extractions()
+    # figures built while rendering the last run count too, so check every run
+    enforce_budget(st.session_state, SESSION_MEMORY_MB * 1024 * 1024)
+    
     # Sidebar
     with st.sidebar:
         st.title("Configuration")
@@ -774,6 +656,13 @@ def main():
         
         st.session_state.current_mode = mode_map[analysis_mode]
         
+        st.checkbox(
+            "Stream responses",
+            value=True,
+            key="stream_responses",
+            help="Show the answer as it is generated"
+        )
+        
         st.markdown("---")
         
         # Stats
@@ -789,6 +678,73 @@ def main():
             st.metric("Concepts", total_concepts)
             st.markdown('</div>', unsafe_allow_html=True)
         
+        session_sizes = estimate_session_bytes(st.session_state)
+        st.caption(
+            f"Session memory (est.): {sum(session_sizes.values()) / 1e6:.1f} MB of "
+            f"{SESSION_MEMORY_MB:g} MB budget (figures {session_sizes['kg_figures'] / 1e6:.1f} MB, "
+            f"traces {session_sizes['turn_traces'] / 1e6:.1f} MB)"
+        )
+        
+        cache_stats = get_pdf_cache().stats()
+        st.caption(
+            f"PDF cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses • "
+            f"{cache_stats['memory_bytes'] / 1e6:.1f} MB in memory, "
+            f"{cache_stats['disk_bytes'] / 1e6:.1f} MB on disk"
+        )
+        response_stats = get_response_cache().stats()
+        st.caption(
+            f"Response cache: {response_stats['hits']} hits / {response_stats['misses']} misses "
+            f"({response_stats['hit_rate']:.0%}) • {response_stats['entries']} stored"
+        )
+        pool_stats = get_model_pool().stats()
+        st.caption(
+            f"Model queue: {pool_stats['active']}/{pool_stats['limit']} active • "
+            f"{pool_stats['queue_depth']} waiting (max {pool_stats['max_queue_depth']}) • "
+            f"wait p50 {pool_stats['wait_p50']:.2f} s / p95 {pool_stats['wait_p95']:.2f} s • "
+            f"{pool_stats['retries']} retries"
+        )
+        semantic_stats = get_semantic_cache().stats()
+        st.caption(
+            f"Similar-question hits: {semantic_stats['hits']} / "
+            f"{semantic_stats['hits'] + semantic_stats['misses']} "
+            f"(threshold {semantic_stats['threshold']:.2f})"
+        )
+        
+        session_metrics = st.session_state.session_telemetry
+        cache_hits = session_metrics.counter("cache_hits")
+        st.caption(
+            f"Prompts sent: {session_metrics.counter('prompt_chars') / 1e3:.1f}k chars "
+            f"(~{session_metrics.counter('prompt_tokens_estimated') / 1e3:.1f}k tokens) • "
+            f"images {session_metrics.counter('images_sent')} "
+            f"({session_metrics.counter('image_bytes_sent') / 1e6:.2f} MB, "
+            f"{session_metrics.counter('image_duplicates_dropped')} duplicates dropped) • "
+            f"answer cache hits {cache_hits}/{cache_hits + session_metrics.counter('cache_misses')}"
+        )
+        stage_stats = session_metrics.stage_stats()
+        if stage_stats:
+            with st.expander("Latency by stage"):
+                rows = ["| Stage | n | p50 s | p99 s |", "|---|---:|---:|---:|"]
+                for name, stats in sorted(stage_stats.items(), key=lambda item: -item[1]['sum']):
+                    rows.append(f"| {name} | {stats['count']} | {stats['p50']:.3f} | {stats['p99']:.3f} |")
+                st.markdown("\n".join(rows))
+                st.download_button(
+                    "Export turns (JSON lines)",
+                    data="".join(json.dumps(record) + "\n" for record in st.session_state.turn_traces),
+                    file_name="ssam_turns.jsonl",
+                    mime="application/x-ndjson",
+                    use_container_width=True
+                )
+                telemetry = get_telemetry()
+                st.download_button(
+                    "Server metrics (Prometheus)",
+                    data=telemetry.prometheus_text(),
+                    file_name="ssam_metrics.prom",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+                if getattr(telemetry, 'server', None) is not None:
+                    st.caption(f"Prometheus endpoint: port {telemetry.server.port}, path /metrics")
+        
         st.markdown("---")
         
         # Quick Access Tools
@@ -821,7 +777,7 @@ def main():
         st.markdown("---")
         
         # Global knowledge graph
-        if len(st.session_state.knowledge_graph) > 1:
+        if len(st.session_state.knowledge_graph) > 1 or len(get_graph_database().top_nodes(2)) > 1:
             if st.button("View Global Knowledge Graph", use_container_width=True):
                 st.session_state.show_global_graph = True
         
@@ -829,8 +785,14 @@ def main():
         
         if st.button("Clear Chat", use_container_width=True):
             st.session_state.messages = []
-            st.session_state.knowledge_graph = defaultdict(list)
+            st.session_state.knowledge_graph = new_knowledge_graph()
             st.session_state.conversation_context = []
+            st.session_state.pending_extractions = {}
+            st.session_state.kg_figures = OrderedDict()
+            st.session_state.zoom_image = None
+            st.session_state.history_window = HISTORY_WINDOW
+            get_layout_engine().forget_scope(f"global:{st.session_state.session_id}")
+            # the shared graph in get_graph_database() is intentionally kept
             st.rerun()
         
         st.markdown("---")
@@ -866,7 +828,7 @@ def main():
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.markdown(f"**Temperature Range:** {process_data['temperature_range']}")
+                    st.markdown(f"**Temperature Range:** {get_parameter_db().text_of(process_key, 'Temperature Range')}")
                     st.markdown(f"**Bonding Mechanism:** {process_data['bonding_mechanism']}")
                     st.markdown(f"**Materials:** {', '.join(process_data['typical_materials'])}")
                 
@@ -907,6 +869,10 @@ def main():
                 
                 with col2:
                     st.markdown(f"**Yield Strength:** {props['yield_strength']}")
+                    if 'tensile_strength' in props:
+                        st.markdown(f"**Tensile Strength:** {props['tensile_strength']}")
+                    if 'specific_heat' in props:
+                        st.markdown(f"**Specific Heat:** {props['specific_heat']}")
                     st.markdown(f"**SSAM Compatibility:** {', '.join(props['ssam_compatibility'])}")
                 
                 st.markdown(f"**Applications:** {props['common_applications']}")
@@ -933,21 +899,27 @@ def main():
             # Detailed comparison table
             st.markdown("**Detailed Comparison:**")
             
+            # Ranges come from the parameter database, one row per parameter
+            # any selected process has ("—" where a process has none)
+            parameter_db = get_parameter_db()
+            selected_processes = [p for p in selected_processes if p in SSAM_PROCESSES]
+            parameter_rows = parameter_db.comparison(selected_processes)
             comparison_data = {
                 'Aspect': ['Temperature Range', 'Bonding Mechanism', 'Typical Materials', 'Main Advantages', 'Main Limitations']
+                          + list(parameter_rows)
             }
             
-            for process in selected_processes:
-                if process in SSAM_PROCESSES:
-                    p = SSAM_PROCESSES[process]
-                    comparison_data[process] = [
-                        p['temperature_range'],
-                        p['bonding_mechanism'],
-                        ', '.join(p['typical_materials'][:3]),
-                        ', '.join(p['advantages'][:2]),
-                        ', '.join(p['limitations'][:2])
-                    ]
+            for idx, process in enumerate(selected_processes):
+                p = SSAM_PROCESSES[process]
+                comparison_data[process] = [
+                    parameter_db.text_of(process, 'Temperature Range'),
+                    p['bonding_mechanism'],
+                    ', '.join(p['typical_materials'][:3]),
+                    ', '.join(p['advantages'][:2]),
+                    ', '.join(p['limitations'][:2])
+                ] + [texts[idx] for texts in parameter_rows.values()]
             
+            import pandas as pd
             comp_df = pd.DataFrame(comparison_data)
             st.dataframe(comp_df, use_container_width=True)
         
@@ -961,26 +933,99 @@ def main():
         st.markdown("### Global Knowledge Graph")
         st.markdown("*All concepts discussed in this session*")
         
-        all_entities = list(st.session_state.knowledge_graph.keys())
-        all_relationships = []
-        for source, targets in st.session_state.knowledge_graph.items():
-            for relation, target in targets:
-                all_relationships.append({'source': source, 'relation': relation, 'target': target})
-        
-        if len(all_entities) > 1:
-            fig = create_knowledge_graph(all_entities, all_relationships)
-            st.plotly_chart(fig, use_container_width=True)
-        
+        knowledge_graph = st.session_state.knowledge_graph
+        graph_source = st.radio(
+            "Graph source", ["This session", "Shared (all sessions)"], horizontal=True,
+            index=0 if len(knowledge_graph) > 1 else 1,
+            help="The shared graph keeps every concept extracted by anyone using this server"
+        )
+        shared = graph_source != "This session"
+        total_concepts = get_graph_database().stats()['nodes'] if shared else len(knowledge_graph)
+        
+        if total_concepts > 1:
+            lod_col1, lod_col2 = st.columns(2)
+            with lod_col1:
+                max_nodes = st.number_input(
+                    "Max concepts shown", min_value=10, max_value=20000,
+                    value=min(300, max(10, total_concepts)), step=10,
+                    help="Keeps the best-connected concepts"
+                )
+            with lod_col2:
+                label_min_degree = st.number_input(
+                    "Label concepts with at least N links", min_value=0, max_value=100,
+                    value=0 if total_concepts <= 50 else 2
+                )
+            if shared:
+                focus_col, hops_col = st.columns(2)
+                with focus_col:
+                    focus = st.text_input("Focus concept (optional)", placeholder="e.g. Cold Spray")
+                with hops_col:
+                    hops = st.number_input("Links away from focus", min_value=1, max_value=4, value=2)
+                graph_db = get_graph_database()
+                if focus.strip():
+                    G = graph_db.subgraph(focus, hops=int(hops), max_nodes=int(max_nodes))
+                else:
+                    G = graph_db.top_subgraph(int(max_nodes))
+                layout_scope = f"shared:{st.session_state.session_id}"
+            else:
+                G = knowledge_graph.to_networkx()
+                layout_scope = f"global:{st.session_state.session_id}"
+            
+            if G.number_of_nodes():
+                fig = plot_knowledge_graph(
+                    G,
+                    layout_scope=layout_scope,
+                    max_nodes=int(max_nodes),
+                    label_min_degree=int(label_min_degree)
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info(f"'{focus}' is not in the shared knowledge graph yet.")
         st.markdown('</div>', unsafe_allow_html=True)
         
         if st.button("Close Graph"):
             st.session_state.show_global_graph = False
             st.rerun()
     
-    # Display chat messages
-    for msg in st.session_state.messages:
+    display_zoomed_image()
+    
+    # Cold spray deposition window (Process Design mode)
+    if st.session_state.current_mode == 'process_design':
+        window_expander, window_open = lazy_expander("Cold Spray Deposition Window", key="window_expander")
+        with window_expander:
+            if window_open:
+                from deposition_window import GASES, sprayable_materials
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    window_material = st.selectbox("Material", sprayable_materials(), key="window_material")
+                with col2:
+                    window_gas = st.radio("Process gas", list(GASES), horizontal=True, key="window_gas")
+                with col3:
+                    csam_pressure = get_parameter_db().get('CSAM', 'Gas Pressure', 'MPa')
+                    window_pressure = st.slider("Gas pressure (MPa)", min_value=float(csam_pressure[0]),
+                                                max_value=float(csam_pressure[1]) + 2.0, value=3.0, step=0.1,
+                                                key="window_pressure")
+                fig, feasible_share = create_deposition_window_chart(window_material, window_gas, window_pressure)
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(f"Inside the window: {feasible_share:.0%} of this plane • estimated critical velocity "
+                           f"(Schmidt et al.) vs. Dykhuizen-Smith particle velocity for a generic nozzle; "
+                           f"a screening aid, not a substitute for spray trials")
+    
+    # Display chat messages (only the most recent window; older ones on demand)
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = HISTORY_WINDOW
+    messages = st.session_state.messages
+    hidden = max(0, len(messages) - st.session_state.history_window)
+    if hidden:
+        if st.button(f"Show {min(hidden, HISTORY_WINDOW)} earlier messages ({hidden} hidden)"):
+            st.session_state.history_window += HISTORY_WINDOW
+            st.rerun()
+    for msg in messages[hidden:]:
         display_message(msg, is_user=(msg['role'] == 'user'))
     
+    if st.session_state.pending_extractions:
+        poll_pending_extractions()
+    
     # File upload section
     with st.expander("Upload Files (Images or PDFs)", expanded=False):
         uploaded_files = st.file_uploader(
@@ -1011,40 +1056,58 @@ def main():
                     img = process_image_file(file)
                     if img:
                         images.append(img)
-                        file_info.append({'name': file.name, 'type': file.type, 'data': img})
+                        file_info.append({'name': file.name, 'type': file.type,
+                                          'image': store_image(img, file.name)})
                 elif file.type == 'application/pdf':
                     pdf_files.append(file)
-                    file_info.append({'name': file.name, 'type': file.type, 'data': None})
+                    file_info.append({'name': file.name, 'type': file.type, 'image': None})
         
         # Add user message
-        st.session_state.messages.append({
+        user_message = {
             'role': 'user',
             'content': user_input,
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'files': file_info if file_info else None
-        })
+        }
+        st.session_state.messages.append(user_message)
+        
+        # Stream the answer into a placeholder below the question
+        on_text = None
+        if st.session_state.get('stream_responses', True):
+            display_message(user_message, is_user=True)
+            stream_box = st.empty()
+            on_text = lambda text: stream_box.markdown(text + " ▌")
         
         # Get AI response
         current_mode = st.session_state.get('current_mode', 'general')
+        st.session_state.last_response_timings = None
+        st.session_state.last_prompt_report = None
+        st.session_state.last_extraction_future = None
         with st.spinner(f"Analyzing in {analysis_mode} mode..."):
             ai_response, response_images, references, entities, relationships = get_gemini_response(
                 user_input,
                 images=images,
                 pdf_files=pdf_files,
-                mode=current_mode
+                mode=current_mode,
+                on_text=on_text
             )
         
         # Add AI message
+        message_id = uuid.uuid4().hex
+        if st.session_state.last_extraction_future is not None:
+            st.session_state.pending_extractions[message_id] = st.session_state.last_extraction_future
         st.session_state.messages.append({
+            'id': message_id,
             'role': 'assistant',
             'content': ai_response,
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'response_images': response_images,
+            'response_images': [store_image(img, label) for img, label in response_images or []],
             'references': references,
             'entities': entities,
-            'relationships': relationships
+            'relationships': relationships,
+            'timings': st.session_state.last_response_timings,
+            'prompt_report': st.session_state.last_prompt_report
         })
-        
         st.rerun()
 
 if __name__ == "__main__":
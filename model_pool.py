@@ -0,0 +1,242 @@
+"""Process-wide model client pool with a fair, bounded request queue
+
+All sessions share one ``ModelPool``. At most ``max_concurrency`` model calls
+run at once; callers beyond that wait in a queue that is served round-robin
+across sessions, so one user firing many requests cannot starve the others.
+Transient failures (rate limits, 5xx, timeouts) are retried with exponential
+backoff and full jitter, and every request carries a deadline that covers
+queueing, attempts and backoff. Clients are created once per API key and
+kept in a small LRU keyed by a hash of the key.
+
+Works with ``genai.GenerativeModel`` and ``fake_model.FakeModel``.
+"""
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from model_streaming import blocking_generate, stream_generate
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_DEADLINE = 120.0
+DEFAULT_MAX_CLIENTS = 16
+WAIT_SAMPLES = 1000
+
+# HTTP-style status codes worth retrying (google.api_core exceptions carry ``code``)
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+RETRYABLE_NAMES = frozenset({
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+})
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request did not complete (or start) before its deadline"""
+
+
+def is_retryable(exc):
+    """True for rate limits, server errors and connection problems"""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelPool:
+    """Bounded, fair, retrying front end for model calls
+
+    ``factory(api_key)`` builds a client; ``client(api_key)`` returns the
+    shared one for that key. At most ``max_clients`` clients are kept (least
+    recently used dropped first); the cache is keyed by a SHA-256 of the API
+    key, so the raw key is only held by the clients themselves. ``sleep``,
+    ``clock`` and ``rng`` can be replaced in tests.
+    """
+
+    def __init__(self, factory=None, max_concurrency=DEFAULT_CONCURRENCY,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, deadline=DEFAULT_DEADLINE,
+                 max_clients=DEFAULT_MAX_CLIENTS, sleep=time.sleep, clock=time.monotonic, rng=None):
+        self.factory = factory
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.max_clients = max_clients
+        self._sleep = sleep
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()  # sha256(api_key) -> client, LRU order
+        self._active = 0
+        self._waiting = OrderedDict()  # session -> deque of Events, in round-robin order
+        self._depth = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.max_depth = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    # -- clients -------------------------------------------------------
+    def client(self, api_key):
+        """Shared client for ``api_key``, built on first use"""
+        key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            model = self._clients.get(key_id)
+            if model is not None:
+                self._clients.move_to_end(key_id)
+                return model
+        model = self.factory(api_key)
+        with self._lock:
+            model = self._clients.setdefault(key_id, model)
+            self._clients.move_to_end(key_id)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        return model
+
+    # -- admission -----------------------------------------------------
+    def _acquire(self, session, expires):
+        """Wait for a slot (fair across sessions) until ``expires``"""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._depth:
+                self._active += 1
+                return 0.0
+            event = threading.Event()
+            self._waiting.setdefault(session, deque()).append(event)
+            self._depth += 1
+            self.max_depth = max(self.max_depth, self._depth)
+        start = self._clock()
+        granted = event.wait(max(0.0, expires - start))
+        with self._lock:
+            if not granted and not event.is_set():
+                queue = self._waiting.get(session)
+                if queue is not None and event in queue:
+                    queue.remove(event)
+                    self._depth -= 1
+                    if not queue:
+                        del self._waiting[session]
+                self.timeouts += 1
+                raise DeadlineExceeded("timed out waiting for a model slot")
+        return self._clock() - start
+
+    def _release(self):
+        with self._lock:
+            if self._waiting:
+                # hand the slot to the next session in round-robin order
+                session, queue = next(iter(self._waiting.items()))
+                event = queue.popleft()
+                del self._waiting[session]
+                if queue:
+                    self._waiting[session] = queue
+                self._depth -= 1
+                event.set()
+            else:
+                self._active -= 1
+
+    # -- calls ---------------------------------------------------------
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff for retry ``attempt`` (1-based)"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, session, attempt, deadline=None):
+        """Run ``attempt(timeout)`` under the pool's limits
+
+        ``attempt`` receives the seconds left before the deadline and is
+        retried on transient errors; the slot is given back while backing
+        off. Returns ``(result, stats)`` with ``queue_wait`` and ``attempts``.
+        """
+        expires = self._clock() + (deadline or self.deadline)
+        waited = 0.0
+        with self._lock:
+            self.requests += 1
+        for n in range(1, self.max_retries + 2):
+            wait = self._acquire(session, expires)
+            waited += wait
+            with self._lock:
+                self._waits.append(wait)
+            try:
+                remaining = expires - self._clock()
+                if remaining <= 0:
+                    raise DeadlineExceeded("request deadline exceeded")
+                result = attempt(remaining)
+                return result, {"queue_wait": waited, "attempts": n}
+            except Exception as exc:
+                retry = is_retryable(exc) and n <= self.max_retries
+                if not retry:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            finally:
+                self._release()
+            delay = self._backoff(n)
+            if self._clock() + delay >= expires:
+                with self._lock:
+                    self.failures += 1
+                    self.timeouts += 1
+                raise DeadlineExceeded("request deadline exceeded while backing off")
+            with self._lock:
+                self.retries += 1
+            self._sleep(delay)
+
+    def generate(self, session, model, content_parts, on_text=None, deadline=None):
+        """Pooled ``stream_generate`` / ``blocking_generate``
+
+        A streamed attempt is only retried if it failed before any text was
+        delivered. Returns ``(text, timings)`` with ``queue_wait`` and
+        ``attempts`` added to the timings.
+        """
+        delivered = []
+
+        def forward(text):
+            delivered.append(True)
+            on_text(text)
+
+        def attempt(timeout):
+            options = {"request_options": {"timeout": timeout}}
+            if on_text is None:
+                return blocking_generate(model, content_parts, **options)
+            try:
+                return stream_generate(model, content_parts, on_text=forward, **options)
+            except Exception as exc:
+                if delivered:
+                    # partial output already shown; do not retry
+                    raise RuntimeError(f"stream interrupted: {exc}") from exc
+                raise
+
+        (text, timings), stats = self.call(session, attempt, deadline=deadline)
+        timings.update(stats)
+        return text, timings
+
+    def stats(self):
+        """Queue depth, concurrency and wait-time metrics"""
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "active": self._active,
+                "limit": self.max_concurrency,
+                "queue_depth": self._depth,
+                "max_queue_depth": self.max_depth,
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "wait_p50": _percentile(waits, 0.5),
+                "wait_p95": _percentile(waits, 0.95),
+                "wait_max": max(waits) if waits else 0.0,
+            }
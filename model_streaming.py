@@ -0,0 +1,55 @@
+"""Streaming model calls with latency measurement
+
+``stream_generate`` asks the model for a streamed response, forwards the
+assembled text to a callback as chunks arrive and records time-to-first-token
+and total latency. Works with ``genai.GenerativeModel`` and ``FakeModel``.
+"""
+import time
+
+
+def _chunk_text(chunk):
+    """Text of a streamed chunk (empty for safety/metadata-only chunks)"""
+    try:
+        return chunk.text or ""
+    except (ValueError, AttributeError):
+        return ""
+
+
+def stream_generate(model, content_parts, on_text=None, **kwargs):
+    """Stream a response from ``model``
+
+    ``on_text`` is called with the text assembled so far after every
+    non-empty chunk; extra keyword arguments (e.g. ``request_options``) go to
+    ``generate_content``. Returns ``(text, timings)`` where ``timings`` holds
+    ``ttft`` and ``total`` in seconds and the number of ``chunks``.
+    """
+    start = time.perf_counter()
+    ttft = None
+    pieces = []
+    n_chunks = 0
+    for chunk in model.generate_content(content_parts, stream=True, **kwargs):
+        text = _chunk_text(chunk)
+        if not text:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        n_chunks += 1
+        pieces.append(text)
+        if on_text is not None:
+            on_text("".join(pieces))
+
+    total = time.perf_counter() - start
+    timings = {
+        "ttft": ttft if ttft is not None else total,
+        "total": total,
+        "chunks": n_chunks,
+    }
+    return "".join(pieces), timings
+
+
+def blocking_generate(model, content_parts, **kwargs):
+    """Non-streaming call with the same ``(text, timings)`` contract"""
+    start = time.perf_counter()
+    response = model.generate_content(content_parts, **kwargs)
+    total = time.perf_counter() - start
+    return response.text, {"ttft": total, "total": total, "chunks": 1}
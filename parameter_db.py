@@ -0,0 +1,311 @@
+"""Numeric, unit-aware view of the process and material databases
+
+Every range in ``ssam_databases`` ("300-1200 m/s", "< 0.5 Tm", "582-652°C")
+becomes one row of a columnar table: subject (process or material),
+parameter, lower and upper bound in the parameter's base unit, and the
+original text for display. Units are normalized per dimension (m/s, Pa, K,
+Hz, N, m, rpm, kg/m³, W/m·K, J/kg·K; homologous temperature stays a fraction of
+Tm). Open bounds ("< 0.5 Tm") are infinite and single values ("20 kHz") are
+zero-width intervals. Text that is not a range ("Process specific") is kept
+for display with NaN bounds.
+
+Per parameter, rows are indexed by lower bound (sorted, with the upper
+bounds alongside), so range queries are a ``searchsorted`` and a vectorized
+comparison and return sets of subjects that combine with ``&`` and ``|``::
+
+    db = get_parameter_db()
+    db.covers("Particle Velocity", 800, "m/s") & db.below("Temperature Range", 0.5, "Tm")
+    # -> frozenset({"CSAM"})
+"""
+import math
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# unit -> (dimension, scale, offset): base = value * scale + offset
+UNITS = {
+    "m/s": ("speed", 1.0, 0.0),
+    "mm/s": ("speed", 1e-3, 0.0),
+    "m/min": ("speed", 1 / 60, 0.0),
+    "mm/min": ("speed", 1e-3 / 60, 0.0),
+    "Pa": ("pressure", 1.0, 0.0),
+    "kPa": ("pressure", 1e3, 0.0),
+    "MPa": ("pressure", 1e6, 0.0),
+    "GPa": ("pressure", 1e9, 0.0),
+    "bar": ("pressure", 1e5, 0.0),
+    "psi": ("pressure", 6894.757, 0.0),
+    "K": ("temperature", 1.0, 0.0),
+    "°C": ("temperature", 1.0, 273.15),
+    "Tm": ("homologous temperature", 1.0, 0.0),
+    "Hz": ("frequency", 1.0, 0.0),
+    "kHz": ("frequency", 1e3, 0.0),
+    "N": ("force", 1.0, 0.0),
+    "kN": ("force", 1e3, 0.0),
+    "m": ("length", 1.0, 0.0),
+    "mm": ("length", 1e-3, 0.0),
+    "µm": ("length", 1e-6, 0.0),
+    "um": ("length", 1e-6, 0.0),
+    "rpm": ("rotational speed", 1.0, 0.0),
+    "rev/s": ("rotational speed", 60.0, 0.0),
+    "kg/m³": ("density", 1.0, 0.0),
+    "g/cm³": ("density", 1e3, 0.0),
+    "W/m·K": ("thermal conductivity", 1.0, 0.0),
+    "J/kg·K": ("specific heat", 1.0, 0.0),
+}
+_UNIT_ALIASES = {"RPM": "rpm", "C": "°C", "ºC": "°C", "μm": "µm", "kg/m3": "kg/m³",
+                 "g/cm3": "g/cm³", "W/mK": "W/m·K", "W/(m·K)": "W/m·K",
+                 "J/kgK": "J/kg·K", "J/(kg·K)": "J/kg·K"}
+BASE_UNITS = {dimension: unit for unit, (dimension, scale, offset) in UNITS.items()
+              if scale == 1.0 and offset == 0.0}
+
+_NUMBER = r"[-+]?\d+(?:\.\d+)?"
+_RANGE = re.compile(
+    rf"^\s*(?P<op><=|>=|<|>|≤|≥)?\s*(?P<low>{_NUMBER})\s*"
+    rf"(?:(?:-|–|to)\s*(?P<high>{_NUMBER})\s*)?(?P<unit>\S.*?)?\s*$"
+)
+
+# keys of SSAM_PROCESSES / MATERIAL_DATABASE entries that hold ranges; every
+# string-valued ``typical_*`` process key is a range too (see process_parameter_name)
+_PROCESS_RANGE_KEYS = {"temperature_range": "Temperature Range"}
+PROCESS_PARAMETER_KEYS = {
+    "velocity": "Particle Velocity",
+    "pressure": "Gas Pressure",
+    "force": "Normal Force",
+    "rotation": "Rotation Speed",
+    "traverse": "Traverse Speed",
+}
+_MATERIAL_RANGE_KEYS = {
+    "density": "Density",
+    "melting_point": "Melting Point",
+    "thermal_conductivity": "Thermal Conductivity",
+    "yield_strength": "Yield Strength",
+    "tensile_strength": "Tensile Strength",
+    "specific_heat": "Specific Heat",
+}
+
+
+def process_parameter_name(key):
+    """``typical_feed_rate`` -> ``Feed Rate`` (the ``PROCESS_PARAMETERS`` name)"""
+    key = key.replace("typical_", "")
+    return PROCESS_PARAMETER_KEYS.get(key, key.replace("_", " ").title())
+
+
+def _process_ranges(process):
+    """``(parameter, text)`` of the range-valued keys of one SSAM_PROCESSES entry"""
+    for key, value in process.items():
+        if key in _PROCESS_RANGE_KEYS:
+            yield _PROCESS_RANGE_KEYS[key], value
+        elif key.startswith("typical_") and isinstance(value, str):
+            yield process_parameter_name(key), value
+
+
+def unit_info(unit):
+    """``(dimension, scale, offset)`` of ``unit``; ValueError if unknown"""
+    unit = _UNIT_ALIASES.get(unit, unit)
+    if unit not in UNITS:
+        raise ValueError(f"unknown unit {unit!r}")
+    return UNITS[unit]
+
+
+def to_base(value, unit):
+    """``value`` in ``unit`` converted to its dimension's base unit"""
+    _, scale, offset = unit_info(unit)
+    return value * scale + offset
+
+
+def from_base(value, unit):
+    """Inverse of ``to_base``"""
+    _, scale, offset = unit_info(unit)
+    return (value - offset) / scale
+
+
+def parse_range(text):
+    """``"300-1200 m/s"`` -> ``(low, high, dimension)`` in base units
+
+    Returns ``None`` for text that is not a number or range with a known unit.
+    """
+    match = _RANGE.match(text)
+    if not match or not match.group("unit"):
+        return None
+    try:
+        dimension, _, _ = unit_info(match.group("unit"))
+    except ValueError:
+        return None
+    unit = match.group("unit")
+    low = to_base(float(match.group("low")), unit)
+    high = to_base(float(match.group("high")), unit) if match.group("high") else low
+    op = match.group("op")
+    if op in ("<", "<=", "≤"):
+        low, high = -math.inf, high
+    elif op in (">", ">=", "≥"):
+        low, high = low, math.inf
+    return min(low, high), max(low, high), dimension
+
+
+class ParameterDB:
+    """Columnar table of parameter intervals with a per-parameter interval index
+
+    Columns (NumPy arrays, one entry per row): ``subject``, ``kind``
+    (``process`` or ``material``), ``group`` (``parameter`` for the
+    parameter tables, ``overview``/``property`` otherwise), ``parameter``,
+    ``dimension``, ``low``, ``high`` (base units), ``text`` and ``notes``.
+    """
+
+    def __init__(self, records):
+        """``records``: iterable of ``(subject, kind, group, parameter, text, notes)``"""
+        records = list(records)
+        parsed = [parse_range(text) for _, _, _, _, text, _ in records]
+        self.subject = np.array([r[0] for r in records], dtype=object)
+        self.kind = np.array([r[1] for r in records], dtype=object)
+        self.group = np.array([r[2] for r in records], dtype=object)
+        self.parameter = np.array([r[3] for r in records], dtype=object)
+        self.text = np.array([r[4] for r in records], dtype=object)
+        self.notes = np.array([r[5] for r in records], dtype=object)
+        self.dimension = np.array([p[2] if p else None for p in parsed], dtype=object)
+        self.low = np.array([p[0] if p else np.nan for p in parsed], dtype=np.float64)
+        self.high = np.array([p[1] if p else np.nan for p in parsed], dtype=np.float64)
+
+        self._rows = {}  # (subject, parameter) -> row
+        for row, (subject, parameter) in enumerate(zip(self.subject, self.parameter)):
+            self._rows.setdefault((subject, parameter), row)
+        self._index = {}  # parameter -> (dimension, rows sorted by low, lows, highs)
+        numeric = ~np.isnan(self.low)
+        for parameter in dict.fromkeys(self.parameter[numeric]):
+            rows = np.flatnonzero(numeric & (self.parameter == parameter))
+            rows = rows[np.argsort(self.low[rows], kind="stable")]
+            dimensions = set(self.dimension[rows])
+            if len(dimensions) > 1:
+                raise ValueError(f"{parameter!r} mixes dimensions {sorted(dimensions)}")
+            self._index[parameter] = (dimensions.pop(), rows, self.low[rows], self.high[rows])
+
+    @classmethod
+    def from_databases(cls, processes, materials, parameters):
+        """Build from ``SSAM_PROCESSES``, ``MATERIAL_DATABASE`` and ``PROCESS_PARAMETERS``
+
+        Raises ValueError if an overview range (``typical_*``) disagrees with
+        the parameter table row of the same name (see ``mismatches``).
+        """
+        problems = mismatches(processes, parameters)
+        if problems:
+            raise ValueError("SSAM_PROCESSES and PROCESS_PARAMETERS disagree: " + "; ".join(problems))
+        records = []
+        for code, process in processes.items():
+            for name, text in _process_ranges(process):
+                records.append((code, "process", "overview", name, text, ""))
+            for name, text, notes in parameters.get(code, ()):
+                records.append((code, "process", "parameter", name, text, notes))
+        for material, props in materials.items():
+            for key, name in _MATERIAL_RANGE_KEYS.items():
+                if key in props:
+                    records.append((material, "material", "property", name, props[key], ""))
+        return cls(records)
+
+    def __len__(self):
+        return len(self.subject)
+
+    # -- range queries -------------------------------------------------
+    def _lookup(self, parameter, unit):
+        if parameter not in self._index:
+            raise KeyError(f"no numeric parameter {parameter!r}")
+        dimension, rows, lows, highs = self._index[parameter]
+        if unit is not None and unit_info(unit)[0] != dimension:
+            raise ValueError(f"{parameter!r} is a {dimension}, not {unit_info(unit)[0]} ({unit})")
+        return rows, lows, highs
+
+    @staticmethod
+    def _value(value, unit):
+        return value if unit is None else to_base(value, unit)
+
+    def _subjects(self, rows):
+        return frozenset(self.subject[rows])
+
+    def covers(self, parameter, value, unit=None):
+        """Subjects whose ``parameter`` range contains ``value``"""
+        rows, lows, highs = self._lookup(parameter, unit)
+        value = self._value(value, unit)
+        end = np.searchsorted(lows, value, side="right")
+        return self._subjects(rows[:end][highs[:end] >= value])
+
+    def overlaps(self, parameter, low, high, unit=None):
+        """Subjects whose ``parameter`` range intersects ``[low, high]``"""
+        rows, lows, highs = self._lookup(parameter, unit)
+        low, high = self._value(low, unit), self._value(high, unit)
+        end = np.searchsorted(lows, high, side="right")
+        return self._subjects(rows[:end][highs[:end] >= low])
+
+    def below(self, parameter, value, unit=None):
+        """Subjects whose whole ``parameter`` range is at or below ``value``"""
+        rows, _, highs = self._lookup(parameter, unit)
+        return self._subjects(rows[highs <= self._value(value, unit)])
+
+    def above(self, parameter, value, unit=None):
+        """Subjects whose whole ``parameter`` range is at or above ``value``"""
+        rows, lows, _ = self._lookup(parameter, unit)
+        start = np.searchsorted(lows, self._value(value, unit), side="left")
+        return self._subjects(rows[start:])
+
+    # -- lookups and views ---------------------------------------------
+    def get(self, subject, parameter, unit=None):
+        """``(low, high)`` of one entry, in ``unit`` or base units"""
+        row = self._rows[(subject, parameter)]
+        low, high = self.low[row], self.high[row]
+        if unit is not None:
+            if unit_info(unit)[0] != self.dimension[row]:
+                raise ValueError(f"{parameter!r} is a {self.dimension[row]}, not {unit}")
+            low, high = from_base(low, unit), from_base(high, unit)
+        return float(low), float(high)
+
+    def text_of(self, subject, parameter, default="—"):
+        row = self._rows.get((subject, parameter))
+        return default if row is None else self.text[row]
+
+    def subjects(self, kind=None):
+        mask = slice(None) if kind is None else self.kind == kind
+        return list(dict.fromkeys(self.subject[mask]))
+
+    def rows(self, subject, group=None):
+        mask = self.subject == subject
+        if group is not None:
+            mask &= self.group == group
+        return np.flatnonzero(mask)
+
+    def parameter_table(self, subject):
+        """``{'Parameter', 'Range', 'Notes'}`` columns of a subject's parameter rows"""
+        rows = self.rows(subject, group="parameter")
+        return {"Parameter": list(self.parameter[rows]), "Range": list(self.text[rows]),
+                "Notes": list(self.notes[rows])}
+
+    def comparison(self, subjects, group="parameter"):
+        """``{parameter: [text per subject]}`` over the union of the subjects' parameters"""
+        parameters = []
+        for subject in subjects:
+            parameters.extend(self.parameter[self.rows(subject, group)])
+        return {parameter: [self.text_of(subject, parameter) for subject in subjects]
+                for parameter in dict.fromkeys(parameters)}
+
+
+def mismatches(processes, parameters):
+    """Overview ranges in ``processes`` that contradict ``parameters``
+
+    A ``typical_*`` range must parse and match the same-named parameter row
+    of that process (after unit conversion), if it has one. Returns one
+    message per disagreement.
+    """
+    problems = []
+    for code, process in processes.items():
+        table = {name: text for name, text, _ in parameters.get(code, ())}
+        for name, text in _process_ranges(process):
+            parsed = parse_range(text)
+            if parsed is None:
+                problems.append(f"{code} {name}: cannot parse {text!r}")
+            elif name in table and parse_range(table[name]) != parsed:
+                problems.append(f"{code} {name}: {text!r} vs {table[name]!r}")
+    return problems
+
+
+@lru_cache(maxsize=None)
+def get_parameter_db():
+    """The ``ParameterDB`` of the built-in databases (built once per process)"""
+    from ssam_databases import MATERIAL_DATABASE, PROCESS_PARAMETERS, SSAM_PROCESSES
+    return ParameterDB.from_databases(SSAM_PROCESSES, MATERIAL_DATABASE, PROCESS_PARAMETERS)
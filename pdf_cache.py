@@ -0,0 +1,335 @@
+"""Content-addressed cache for extracted PDF text and rendered page images
+
+Entries are keyed by the SHA-256 of the PDF bytes, so re-attaching the same
+paper (under any file name) is served from memory or disk instead of being
+parsed and rendered again. Both tiers are bounded and evicted LRU-first.
+
+Disk writes happen behind the caller on one background thread: ``put``
+stores the value in memory (and in a pending map until its file lands) and
+returns. Images are stored as their raw pixels, zlib-compressed at level 1,
+which is as small as PNG for rendered pages and several times faster to
+encode and decode. Files are read and decoded outside the lock.
+"""
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ssam_pdf_cache")
+COMPRESS_LEVEL = 1
+
+# ``Image.info`` entry holding a page raster's ``page_key``, so later
+# consumers can refer to the cached page instead of copying it
+PAGE_KEY_INFO = "ssam_page_key"
+
+_TEXT_PREFIX = b"T"
+_PNG_PREFIX = b"I"
+_RAW_PREFIX = b"R"
+_RAW_HEADER = struct.Struct("<8sII")  # mode, width, height
+_RAW_MODES = frozenset({"RGB", "RGBA", "L", "LA"})  # no palette or other side data
+_BAND_ROWS = 64
+
+
+def pdf_digest(pdf_bytes):
+    """Return the content hash used as cache key for a PDF"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _value_size(value):
+    """Approximate in-memory size of a cached value in bytes"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    return len(value)
+
+
+def _serialize(value):
+    if isinstance(value, str):
+        return _TEXT_PREFIX + value.encode("utf-8")
+    if value.mode not in _RAW_MODES:
+        buf = io.BytesIO()
+        value.save(buf, format="PNG", compress_level=COMPRESS_LEVEL)
+        return _PNG_PREFIX + buf.getvalue()
+    header = _RAW_HEADER.pack(value.mode.encode("ascii"), value.width, value.height)
+    # compress in bands of rows so a full-page pixel copy is never held at once
+    compressor = zlib.compressobj(COMPRESS_LEVEL)
+    parts = [_RAW_PREFIX, header]
+    for top in range(0, value.height, _BAND_ROWS):
+        band = value.crop((0, top, value.width, min(top + _BAND_ROWS, value.height)))
+        parts.append(compressor.compress(band.tobytes()))
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def _deserialize(blob):
+    prefix = blob[:1]
+    if prefix == _TEXT_PREFIX:
+        return blob[1:].decode("utf-8")
+    if prefix == _RAW_PREFIX:
+        mode, width, height = _RAW_HEADER.unpack_from(blob, 1)
+        pixels = zlib.decompress(blob[1 + _RAW_HEADER.size:])
+        return Image.frombytes(mode.rstrip(b"\0").decode("ascii"), (width, height), pixels)
+    image = Image.open(io.BytesIO(blob[1:]))
+    image.load()
+    return image
+
+
+class PdfCache:
+    """Two-tier (memory + disk) LRU cache for PDF text and page rasters
+
+    Keys are tuples starting with the PDF digest, e.g. ``(digest, "text", 20)``
+    or ``(digest, "page", 3, 2.0)``. Values are ``str`` or ``PIL.Image``.
+    A limit of 0 disables the corresponding tier. With ``write_behind=False``
+    ``put`` writes the disk tier before returning.
+    """
+
+    def __init__(self, max_memory_bytes=DEFAULT_MEMORY_BYTES,
+                 max_disk_bytes=DEFAULT_DISK_BYTES, cache_dir=DEFAULT_CACHE_DIR,
+                 write_behind=True):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        self.write_behind = write_behind
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._pending = {}  # key -> value whose disk write has not landed yet
+        self._generation = 0  # bumped by clear(); stale writes are discarded
+        self._writer = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_enabled:
+            self._load_disk_index()
+
+    @property
+    def disk_enabled(self):
+        return bool(self.max_disk_bytes and self.cache_dir)
+
+    # -- key helpers -------------------------------------------------------
+
+    @staticmethod
+    def text_key(digest, max_pages):
+        return (digest, "text", max_pages)
+
+    @staticmethod
+    def page_key(digest, page_num, zoom):
+        return (digest, "page", page_num, float(zoom))
+
+    def get_text(self, digest, max_pages):
+        return self.get(self.text_key(digest, max_pages))
+
+    def put_text(self, digest, max_pages, text):
+        self.put(self.text_key(digest, max_pages), text)
+
+    def get_page_count(self, digest):
+        value = self.get((digest, "page_count"))
+        return int(value) if value is not None else None
+
+    def put_page_count(self, digest, page_count):
+        self.put((digest, "page_count"), str(page_count))
+
+    def get_page_image(self, digest, page_num, zoom):
+        return self.get(self.page_key(digest, page_num, zoom))
+
+    def put_page_image(self, digest, page_num, zoom, image):
+        self.put(self.page_key(digest, page_num, zoom), image)
+
+    # -- core API ----------------------------------------------------------
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if key in self._pending:
+                self.hits += 1
+                return self._pending[key]
+            path = self._path_for(key) if self.disk_enabled else None
+            if path not in self._disk:
+                self.misses += 1
+                return None
+
+        # read and decode without holding the lock
+        try:
+            with open(path, "rb") as f:
+                value = _deserialize(f.read())
+            os.utime(path, None)
+        except (OSError, ValueError, zlib.error, struct.error):
+            value = None
+
+        with self._lock:
+            if value is None:
+                if path in self._disk:
+                    self._drop_disk_entry(path)
+                self.misses += 1
+                return None
+            if path in self._disk:
+                self._disk.move_to_end(path)
+            self._store_memory(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def contains(self, key):
+        """True if ``key`` is in either tier (does not count as a lookup)"""
+        with self._lock:
+            if key in self._memory or key in self._pending:
+                return True
+            return self.disk_enabled and self._path_for(key) in self._disk
+
+    def put(self, key, value):
+        """Store ``value`` in both tiers, evicting least-recently-used entries
+
+        The disk write (encode and file I/O) runs on a background thread
+        unless ``write_behind`` is off; until it lands ``get`` serves the
+        value from memory.
+        """
+        with self._lock:
+            self._store_memory(key, value)
+            if not self.disk_enabled:
+                return
+            generation = self._generation
+            writer = None
+            if self.write_behind:
+                self._pending[key] = value
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-cache")
+                writer = self._writer
+        if writer is None:
+            self._write_behind(key, value, generation)
+        else:
+            writer.submit(self._write_behind, key, value, generation)
+
+    def flush(self):
+        """Wait until every pending disk write has landed"""
+        with self._lock:
+            writer = self._writer
+        if writer is not None:
+            writer.submit(lambda: None).result()
+
+    def clear(self):
+        """Drop every entry from memory and disk"""
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+            self._memory.clear()
+            self._memory_bytes = 0
+            for path in list(self._disk):
+                self._drop_disk_entry(path)
+
+    def stats(self):
+        """Return hit/miss counters and current tier usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _write_behind(self, key, value, generation):
+        path, size = self._write_disk(key, value)
+        with self._lock:
+            if self._pending.get(key) is value:
+                del self._pending[key]
+            if path is None:
+                return
+            if generation != self._generation:
+                # cleared while this write was in flight
+                self._drop_disk_entry(path)
+                return
+            self._index_disk(path, size)
+
+    def _write_disk(self, key, value):
+        """Serialize ``value`` to its file; ``(path, size)`` or ``(None, 0)``"""
+        blob = _serialize(value)
+        if len(blob) > self.max_disk_bytes:
+            return None, 0
+        path = self._path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except OSError:
+            return None, 0
+        return path, len(blob)
+
+    # -- internals (caller holds the lock) ---------------------------------
+
+    def _store_memory(self, key, value):
+        size = _value_size(value)
+        if not self.max_memory_bytes or size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= _value_size(self._memory.pop(key))
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _value_size(evicted)
+            self.evictions += 1
+
+    def _index_disk(self, path, size):
+        if path in self._disk:
+            self._disk_bytes -= self._disk.pop(path)
+        self._disk[path] = size
+        self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(self._disk))
+            self._drop_disk_entry(oldest)
+            self.evictions += 1
+
+    def _drop_disk_entry(self, path):
+        self._disk_bytes -= self._disk.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _path_for(self, key):
+        digest = key[0]
+        suffix = hashlib.sha1(repr(key[1:]).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{suffix}.bin")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(entries):
+            self._disk[path] = size
+            self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes:
+            self._drop_disk_entry(next(iter(self._disk)))
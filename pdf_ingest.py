@@ -0,0 +1,262 @@
+"""Single-pass PDF ingestion
+
+A ``PdfIngestor`` reads the PDF bytes once, opens the document at most once,
+and yields per-page records lazily. Text, layout blocks and rasters are only
+produced for the pages a caller actually asks for, and each is looked up in
+the shared ``PdfCache`` before touching the document. Cache misses for page
+rasters can be rendered in parallel by a ``PageRenderer`` process pool.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from pdf_cache import PAGE_KEY_INFO, PdfCache, pdf_digest
+
+PAGE_SEPARATOR = "\f"
+
+
+def _tag_page(image, digest, index, zoom):
+    image.info[PAGE_KEY_INFO] = PdfCache.page_key(digest, index, zoom)
+    return image
+
+
+def _pixmap_to_image(width, height, alpha, samples):
+    """Wrap a raw PyMuPDF pixel buffer without a PNG round-trip"""
+    return Image.frombytes("RGBA" if alpha else "RGB", (width, height), samples)
+
+
+def _render_page_chunk(pdf_bytes, indices, zoom):
+    """Pool worker: render ``indices`` and return raw pixel buffers"""
+    rendered = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        matrix = fitz.Matrix(zoom, zoom)
+        for index in indices:
+            pix = document[index].get_pixmap(matrix=matrix)
+            rendered.append((index, pix.width, pix.height, pix.alpha, pix.samples))
+    return rendered
+
+
+class PageRenderer:
+    """Render PDF pages across a process pool
+
+    ``workers`` of 0 or 1 (or ``parallel=False``) renders serially in the
+    calling process. The pool is created on first use and reused afterwards.
+    """
+
+    def __init__(self, workers=None, parallel=True):
+        if workers is None:
+            workers = min(4, os.cpu_count() or 1)
+        self.workers = workers
+        self.parallel = parallel and workers > 1
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self):
+        # shared across session threads: only one of them may create the pool
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def render(self, pdf_bytes, indices, zoom=2.0):
+        """Return ``{page_index: PIL.Image}`` for the requested pages"""
+        indices = list(indices)
+        if not indices:
+            return {}
+
+        if self.parallel and len(indices) > 1:
+            n_chunks = min(self.workers, len(indices))
+            chunks = [indices[i::n_chunks] for i in range(n_chunks)]
+            try:
+                futures = [self._pool().submit(_render_page_chunk, pdf_bytes, chunk, zoom)
+                           for chunk in chunks]
+                results = [item for future in futures for item in future.result()]
+            except (BrokenProcessPool, OSError):
+                self.shutdown()
+                self.parallel = False
+            else:
+                return {index: _pixmap_to_image(w, h, alpha, samples)
+                        for index, w, h, alpha, samples in results}
+
+        return {index: _pixmap_to_image(w, h, alpha, samples)
+                for index, w, h, alpha, samples in _render_page_chunk(pdf_bytes, indices, zoom)}
+
+    def shutdown(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PdfPageRecord:
+    """Lazy view of one PDF page"""
+
+    def __init__(self, ingestor, index):
+        self._ingestor = ingestor
+        self.index = index
+        self._text = None
+        self._blocks = None
+
+    @property
+    def text(self):
+        """Plain text of the page"""
+        if self._text is None:
+            self._text = self._ingestor._page(self.index).get_text()
+        return self._text
+
+    @property
+    def blocks(self):
+        """Layout blocks ``(x0, y0, x1, y1, text, block_no, block_type)``"""
+        if self._blocks is None:
+            self._blocks = self._ingestor._page(self.index).get_text("blocks")
+        return self._blocks
+
+    def raster(self, zoom=2.0):
+        """Render the page (cached by PDF digest, page and zoom)
+
+        The image's ``info[PAGE_KEY_INFO]`` is its ``PdfCache`` key.
+        """
+        cache, digest = self._ingestor.cache, self._ingestor.digest
+        if cache is not None:
+            image = cache.get_page_image(digest, self.index, zoom)
+            if image is not None:
+                return _tag_page(image, digest, self.index, zoom)
+
+        pix = self._ingestor._page(self.index).get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        image = _tag_page(_pixmap_to_image(pix.width, pix.height, pix.alpha, pix.samples),
+                          digest, self.index, zoom)
+        if cache is not None:
+            cache.put_page_image(digest, self.index, zoom, image)
+        return image
+
+
+class PdfIngestor:
+    """Open a PDF once and hand out page records on demand
+
+    Use as a context manager so the underlying document is closed::
+
+        with PdfIngestor.from_file(uploaded) as pdf:
+            text = pdf.text(max_pages=20)
+            for image in pdf.images(max_pages=10):
+                ...
+    """
+
+    def __init__(self, pdf_bytes, cache=None, renderer=None):
+        self.pdf_bytes = pdf_bytes
+        self.cache = cache
+        self.renderer = renderer
+        self.digest = pdf_digest(pdf_bytes)
+        self._document = None
+        self._page_count = None
+
+    @classmethod
+    def from_file(cls, pdf_file, cache=None, renderer=None):
+        """Build an ingestor from an uploaded (file-like) PDF"""
+        pdf_file.seek(0)
+        return cls(pdf_file.read(), cache=cache, renderer=renderer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+
+    @property
+    def document(self):
+        """The opened ``fitz.Document`` (opened on first access only)"""
+        if self._document is None:
+            self._document = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        return self._document
+
+    @property
+    def page_count(self):
+        if self._page_count is None:
+            if self.cache is not None:
+                self._page_count = self.cache.get_page_count(self.digest)
+            if self._page_count is None:
+                self._page_count = len(self.document)
+                if self.cache is not None:
+                    self.cache.put_page_count(self.digest, self._page_count)
+        return self._page_count
+
+    def _page(self, index):
+        return self.document[index]
+
+    def pages(self, max_pages=None):
+        """Yield ``PdfPageRecord`` objects for the first ``max_pages`` pages"""
+        count = self.page_count
+        if max_pages is not None:
+            count = min(count, max_pages)
+        for index in range(count):
+            yield PdfPageRecord(self, index)
+
+    def text(self, max_pages=20):
+        """Concatenated text of the first ``max_pages`` pages"""
+        if self.cache is not None:
+            text = self.cache.get_text(self.digest, max_pages)
+            if text is not None:
+                return text
+
+        text = "".join(page.text for page in self.pages(max_pages))
+        if self.cache is not None:
+            self.cache.put_text(self.digest, max_pages, text)
+        return text
+
+    def page_texts(self, max_pages=None):
+        """Per-page text list (every page by default), cached as one entry"""
+        key = ("pages", max_pages)
+        if self.cache is not None:
+            joined = self.cache.get_text(self.digest, key)
+            if joined is not None:
+                return joined.split(PAGE_SEPARATOR)
+
+        texts = [page.text.replace(PAGE_SEPARATOR, "\n") for page in self.pages(max_pages)]
+        if self.cache is not None:
+            self.cache.put_text(self.digest, key, PAGE_SEPARATOR.join(texts))
+        return texts
+
+    def images(self, max_pages=10, zoom=2.0):
+        """Yield rendered page images in page order (tagged as in ``raster``)
+
+        Without a parallel renderer pages are rendered one at a time as they
+        are consumed. With one, all cache misses are rendered in a single
+        batch across the pool before the first image is yielded.
+        """
+        if self.renderer is None or not self.renderer.parallel:
+            for page in self.pages(max_pages):
+                yield page.raster(zoom)
+            return
+
+        images = {}
+        missing = []
+        for page in self.pages(max_pages):
+            image = None
+            if self.cache is not None:
+                image = self.cache.get_page_image(self.digest, page.index, zoom)
+            if image is None:
+                missing.append(page.index)
+            else:
+                images[page.index] = image
+
+        rendered = self.renderer.render(self.pdf_bytes, missing, zoom)
+        if self.cache is not None:
+            for index, image in rendered.items():
+                self.cache.put_page_image(self.digest, index, zoom, image)
+        images.update(rendered)
+
+        for index in sorted(images):
+            yield _tag_page(images[index], self.digest, index, zoom)
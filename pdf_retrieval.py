@@ -0,0 +1,156 @@
+"""Local BM25 retrieval over PDF text
+
+Instead of sending the first N characters of a paper, each document is split
+into overlapping word windows, indexed with BM25 (pure NumPy inverted index,
+no network), and only the chunks most relevant to the current query are
+packed into the prompt within a token budget.
+"""
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+CHUNK_WORDS = 150
+CHUNK_STRIDE = 120
+CHARS_PER_TOKEN = 4
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from had has have how
+i if in into is it its may more most not of on or our should such than that
+the their them then there these they this those to under using was we were
+what when where which while who why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Cheap model-token estimate (~4 characters per token)"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def chunk_pages(page_texts, chunk_words=CHUNK_WORDS, stride=CHUNK_STRIDE):
+    """Split page texts into ``(page_number, text)`` word windows"""
+    chunks = []
+    for page_num, page_text in enumerate(page_texts, 1):
+        words = page_text.split()
+        if not words:
+            continue
+        for start in range(0, max(len(words) - chunk_words + stride, 1), stride):
+            window = words[start:start + chunk_words]
+            if window:
+                chunks.append((page_num, " ".join(window)))
+    return chunks
+
+
+class DocumentIndex:
+    """BM25 index over the chunks of one document"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        postings = {}
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for chunk_id, (_, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            lengths[chunk_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(chunk_id)
+                postings[term][1].append(tf)
+
+        n = max(len(chunks), 1)
+        avg_len = float(lengths.mean()) if len(chunks) else 1.0
+        self._norm = k1 * (1 - b + b * lengths / max(avg_len, 1e-9))
+        self._postings = {}
+        for term, (ids, tfs) in postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = np.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            self._postings[term] = (ids, tfs, np.float32(idf))
+
+    @classmethod
+    def from_pages(cls, page_texts, **kwargs):
+        return cls(chunk_pages(page_texts), **kwargs)
+
+    def scores(self, query):
+        """BM25 score of every chunk for ``query``"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        return scores
+
+    def _select(self, query, top_k, token_budget):
+        """Chunk IDs best first, and the score array"""
+        scores = self.scores(query)
+        if scores.any():
+            ranked = np.argsort(-scores, kind="stable")
+            ranked = ranked[scores[ranked] > 0]
+        else:
+            ranked = np.arange(len(self.chunks))
+
+        selected, used = [], 0
+        for chunk_id in ranked:
+            cost = estimate_tokens(self.chunks[chunk_id][1])
+            if used + cost > token_budget:
+                continue
+            selected.append(int(chunk_id))
+            used += cost
+            if len(selected) >= top_k:
+                break
+        return selected, scores
+
+    def search(self, query, top_k=6, token_budget=750):
+        """Return the best chunks for ``query`` that fit in ``token_budget``
+
+        Chunks are returned in document order as ``(page_number, text)``.
+        When nothing matches, the leading chunks are used instead.
+        """
+        if not self.chunks:
+            return []
+        selected, _ = self._select(query, top_k, token_budget)
+        return [self.chunks[i] for i in sorted(selected)]
+
+    def ranked(self, query, top_k=6, token_budget=750):
+        """Like ``search`` but best first, as ``(score, chunk_id, page_number, text)``"""
+        if not self.chunks:
+            return []
+        selected, scores = self._select(query, top_k, token_budget)
+        return [(float(scores[i]), i, *self.chunks[i]) for i in selected]
+
+
+def format_passages(passages):
+    """Render retrieved chunks for inclusion in a prompt"""
+    return "\n\n".join(f"[p. {page}] {text}" for page, text in passages)
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 32
+
+
+def get_document_index(digest, load_page_texts):
+    """Return the index for a PDF digest, building it via ``load_page_texts()`` on a miss"""
+    with _index_lock:
+        index = _index_cache.get(digest)
+        if index is not None:
+            _index_cache.move_to_end(digest)
+            return index
+
+    index = DocumentIndex.from_pages(load_page_texts())
+    with _index_lock:
+        _index_cache[digest] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,153 @@
+"""Token-budgeted prompt assembly and extractive history compaction
+
+A prompt is a list of ``Section`` objects. Each has a priority (lower is
+more important), an estimated token cost and, optionally, a ``fit`` function
+that returns a shorter version for a smaller budget. ``assemble`` packs the
+sections by priority into a token budget. Required sections always go in,
+elastic ones are shrunk to the space left, and the rest are dropped. The
+sections are then joined in layout order. The returned report records what
+each section asked for and what it got.
+
+``summarize`` is the local, extractive summary used for older chat turns.
+It keeps the sentences that best cover the turn's own key terms and the
+current question, in their original order, within a token budget.
+"""
+import re
+from collections import Counter
+
+from pdf_retrieval import estimate_tokens, tokenize
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_MARKUP = re.compile(r"[#*_`>|]+")
+
+
+class Section:
+    """One part of a prompt
+
+    ``fit(max_tokens)`` (optional) returns the section's text shrunk to at
+    most ``max_tokens`` tokens, or ``""`` if nothing useful fits.
+    """
+
+    def __init__(self, name, text, priority, required=False, fit=None):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.required = required
+        self.fit = fit
+        self.packed = None
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.text) if self.text else 0
+
+
+def assemble(sections, budget, separator="\n\n"):
+    """Pack ``sections`` into ``budget`` tokens
+
+    Returns ``(text, report)``. The text joins the non-empty sections in
+    their given order; each section's ``packed`` attribute is set to the
+    text it contributed. ``report`` holds ``budget``, ``used`` and one entry
+    per section with ``name``, ``priority``, ``requested``, ``used`` and
+    ``status`` (``kept``, ``trimmed``, ``dropped``, ``empty`` or ``over``
+    for a required section that did not fit).
+    """
+    chosen = {}
+    entries = {}
+    remaining = budget
+    for index in sorted(range(len(sections)), key=lambda i: (sections[i].priority, i)):
+        section = sections[index]
+        requested = section.tokens
+        text = section.text
+        if not requested:
+            status = "empty"
+        elif section.required:
+            status = "kept" if requested <= remaining else "over"
+        elif requested <= remaining:
+            status = "kept"
+        elif section.fit is not None and remaining > 0:
+            text = section.fit(remaining)
+            status = "trimmed" if text else "dropped"
+        else:
+            text, status = "", "dropped"
+        used = estimate_tokens(text) if text else 0
+        remaining -= used
+        chosen[index] = section.packed = text
+        entries[index] = {"name": section.name, "priority": section.priority,
+                          "requested": requested, "used": used, "status": status}
+    text = separator.join(chosen[i] for i in range(len(sections)) if chosen[i])
+    report = {
+        "budget": budget,
+        "used": budget - remaining,
+        "sections": [entries[i] for i in range(len(sections))],
+    }
+    return text, report
+
+
+def _count(tokens):
+    return f"{tokens / 1000:.1f}k" if tokens >= 1000 else str(tokens)
+
+
+def format_report(report):
+    """One-line summary, e.g. ``Prompt 2.1k/6.0k tokens: system 620 • pdf 1.2k (trimmed from 2.0k)``"""
+    parts = []
+    for entry in report["sections"]:
+        if entry["status"] == "empty":
+            continue
+        part = f"{entry['name']} {_count(entry['used'])}"
+        if entry["status"] != "kept":
+            part += f" ({entry['status']}"
+            if entry["status"] in ("trimmed", "dropped"):
+                part += f" from {_count(entry['requested'])}"
+            part += ")"
+        parts.append(part)
+    return (f"Prompt {_count(report['used'])}/{_count(report['budget'])} tokens: "
+            + " • ".join(parts))
+
+
+def split_sentences(text):
+    """Sentences of ``text`` with markdown markup stripped and repeats dropped"""
+    sentences, seen = [], set()
+    for raw in _SENTENCE_SPLIT.split(text):
+        sentence = " ".join(_MARKUP.sub(" ", raw).split())
+        if len(sentence) > 1 and sentence not in seen:
+            seen.add(sentence)
+            sentences.append(sentence)
+    return sentences
+
+
+def summarize(text, query="", max_tokens=60):
+    """Extractive summary of ``text`` in at most ``max_tokens`` tokens
+
+    Sentences are scored by how many of the text's frequent terms they carry
+    (normalized by length) plus a bonus for terms of ``query``. The best ones
+    that fit are returned in document order.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    tokens = [tokenize(sentence) for sentence in sentences]
+    frequency = Counter(term for terms in tokens for term in set(terms))
+    query_terms = set(tokenize(query))
+    scored = []
+    for index, terms in enumerate(tokens):
+        if not terms:
+            continue
+        unique = set(terms)
+        salience = sum(frequency[term] for term in unique) / (len(terms) ** 0.5)
+        relevance = 2.0 * len(unique & query_terms)
+        # slight preference for early sentences, which usually state the answer
+        scored.append((salience + relevance - 0.01 * index, index))
+    scored.sort(reverse=True)
+
+    chosen, used = [], 0
+    for _, index in scored:
+        cost = estimate_tokens(sentences[index])
+        if used + cost > max_tokens:
+            continue
+        chosen.append(index)
+        used += cost
+    if not chosen:
+        # no whole sentence fits: cut the best one at a word boundary
+        best = sentences[scored[0][1]] if scored else sentences[0]
+        return best[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+    return " ".join(sentences[i] for i in sorted(chosen))
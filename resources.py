@@ -0,0 +1,164 @@
+"""Process-wide shared resources of the app
+
+Every object shared by all sessions (caches, worker pools, stores, the
+stylesheet) is created by a ``st.cache_resource`` factory, configured by the
+``SSAM_*`` settings in ``config``. Living in an imported module, the factories
+are defined once per process instead of on every rerun of ``main.py``, and
+the modules behind the page renderer, semantic cache and graph layout
+(PyMuPDF, NetworkX) are only imported by the factory that first needs them.
+NumPy is not deferred: ``main.py`` loads it at startup through ``analysis``,
+``image_payload`` and ``parameter_db``, and Streamlit's ``set_page_config``
+imports it on first paint regardless.
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import (
+    EXTRACTION_WORKERS, GRAPH_DB_PATH, IMAGE_STORE_DIR, IMAGE_STORE_DISK_MB, METRICS_HOST,
+    METRICS_LOG_PATH, METRICS_PORT, MODEL_CONCURRENCY, MODEL_DEADLINE_S, MODEL_MAX_CLIENTS,
+    MODEL_MAX_RETRIES, PDF_CACHE_DIR, PDF_CACHE_DISK_MB, PDF_CACHE_MEMORY_MB, RENDER_WORKERS,
+    RESPONSE_CACHE_MAX_MB, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL_HOURS,
+    SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD, create_gemini_model
+)
+from entity_extractor import EntityExtractor
+from graph_db import GraphDatabase
+from model_pool import ModelPool
+from pdf_cache import PdfCache
+from response_cache import ResponseCache
+from ssam_databases import MATERIAL_DATABASE, SSAM_PROCESSES
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css")
+
+
+@st.cache_resource
+def load_css():
+    """App stylesheet wrapped for ``st.markdown``, read once per process"""
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+@st.cache_resource
+def get_pdf_cache():
+    """Process-wide PDF cache shared across reruns and sessions"""
+    kwargs = {}
+    if PDF_CACHE_DIR:
+        kwargs['cache_dir'] = PDF_CACHE_DIR
+    return PdfCache(
+        max_memory_bytes=PDF_CACHE_MEMORY_MB * 1024 * 1024,
+        max_disk_bytes=PDF_CACHE_DISK_MB * 1024 * 1024,
+        **kwargs
+    )
+
+
+@st.cache_resource
+def get_page_renderer():
+    """Process-wide page rendering pool"""
+    from pdf_ingest import PageRenderer
+    return PageRenderer(workers=RENDER_WORKERS)
+
+
+@st.cache_resource
+def get_extraction_executor():
+    """Process-wide worker pool for entity/relation extraction"""
+    return ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="kg-extract")
+
+
+@st.cache_resource
+def get_entity_extractor():
+    """Vocabulary matcher built once from the SSAM process and material databases"""
+    return EntityExtractor.from_databases(SSAM_PROCESSES, MATERIAL_DATABASE)
+
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide response cache"""
+    kwargs = {}
+    if RESPONSE_CACHE_PATH:
+        kwargs['path'] = RESPONSE_CACHE_PATH
+    return ResponseCache(
+        ttl_seconds=RESPONSE_CACHE_TTL_HOURS * 3600,
+        max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+        **kwargs
+    )
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """Process-wide semantic query cache, persisted next to the response cache"""
+    from semantic_cache import SemanticCache
+    return SemanticCache(
+        path=get_response_cache().path,
+        extractor=get_entity_extractor(),
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+    )
+
+
+@st.cache_resource
+def get_image_store():
+    """Process-wide disk-only LRU store for original chat images"""
+    return PdfCache(
+        max_memory_bytes=0,
+        max_disk_bytes=IMAGE_STORE_DISK_MB * 1024 * 1024,
+        cache_dir=IMAGE_STORE_DIR or os.path.join(tempfile.gettempdir(), "ssam_image_store")
+    )
+
+
+@st.cache_resource
+def get_blob_writer():
+    """Single background thread that writes originals to the image store"""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+
+
+@st.cache_resource
+def get_graph_database():
+    """Process-wide persistent knowledge graph"""
+    kwargs = {}
+    if GRAPH_DB_PATH:
+        kwargs['path'] = GRAPH_DB_PATH
+    return GraphDatabase(resolve=get_entity_extractor().canonical_name, **kwargs)
+
+
+@st.cache_resource
+def get_layout_engine():
+    """Process-wide memo of knowledge-graph layouts"""
+    from graph_layout import LayoutEngine
+    return LayoutEngine()
+
+
+@st.cache_resource
+def get_model_pool():
+    """Process-wide model pool shared by all sessions"""
+    return ModelPool(
+        factory=create_gemini_model,
+        max_concurrency=MODEL_CONCURRENCY,
+        max_retries=MODEL_MAX_RETRIES,
+        deadline=MODEL_DEADLINE_S,
+        max_clients=MODEL_MAX_CLIENTS
+    )
+
+
+@st.cache_resource
+def get_telemetry():
+    """Process-wide stage timings and counters, plus the /metrics endpoint when enabled"""
+    from telemetry import MetricsServer, Telemetry
+    telemetry = Telemetry()
+    if METRICS_PORT:
+        try:
+            telemetry.server = MetricsServer(telemetry, METRICS_PORT, host=METRICS_HOST)
+        except OSError:
+            # another server process already serves this port
+            telemetry.server = None
+    return telemetry
+
+
+@st.cache_resource
+def get_metrics_exporter():
+    """JSON-lines exporter for per-turn traces, or None when SSAM_METRICS_LOG is unset"""
+    if not METRICS_LOG_PATH:
+        return None
+    from telemetry import JsonlExporter
+    return JsonlExporter(METRICS_LOG_PATH)
@@ -0,0 +1,149 @@
+"""Persistent exact-match cache for model responses
+
+Responses are stored in SQLite keyed by a SHA-256 over the normalized prompt,
+analysis mode, attachment content hashes and conversation context. Entries
+expire after a TTL, and the least-recently-used ones are evicted once the
+stored text exceeds a byte budget. One connection is shared by all sessions
+of the server process and guarded by a lock.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "ssam_response_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a user prompt"""
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+def make_key(namespace, prompt, mode="", attachments=(), context=""):
+    """Cache key for a model call
+
+    ``attachments`` is a sequence of content hashes (PDF digests, image
+    payload hashes); their order matters because it changes the prompt.
+    """
+    payload = json.dumps(
+        [namespace, normalize_prompt(prompt), mode, list(attachments), context],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(data):
+    """Hash of raw attachment bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL and LRU byte-budget eviction"""
+
+    def __init__(self, path=DEFAULT_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   namespace TEXT NOT NULL,
+                   value TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL,
+                   hits INTEGER NOT NULL DEFAULT 0
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached value or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value, namespace="answer"):
+        """Store ``value`` (a string) and enforce TTL and size limits"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO responses (key, namespace, value, size, created, accessed)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, namespace, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def get_json(self, key):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def put_json(self, key, value, namespace="answer"):
+        self.put(key, json.dumps(value, ensure_ascii=False), namespace=namespace)
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Process-lifetime hit/miss counters plus current store size"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
@@ -0,0 +1,296 @@
+"""Scope gate for user queries: compiled keyword matching plus a local classifier
+
+``KeywordMatcher`` compiles a keyword list into one regular expression that
+only matches whole words. A keyword may end in a plural or verb suffix
+("particles", "coatings"), and spaces and hyphens inside a keyword are
+interchangeable ("solid state" / "solid-state"). So "mig" no longer fires on
+"migration", "rolling" on "controlling" or "tig" on "investigate".
+
+``ScopeClassifier`` is a logistic regression over hashed word unigrams and
+bigrams plus character 4-grams of each word (for inflections and typos). It
+is pure NumPy: features are kept as sparse (row, column, value) arrays and
+both training and prediction go through ``np.bincount``, so scoring
+thousands of queries costs about as much as tokenizing them. Weights are
+trained offline from a JSONL file of labelled queries
+(``{"query": ..., "in_scope": true}``) and shipped as a small ``.npz``::
+
+    python scope_gate.py train assets/scope_queries.jsonl -o assets/scope_classifier.npz
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+DEFAULT_DATA_PATH = os.path.join(ASSETS_DIR, "scope_queries.jsonl")
+DEFAULT_MODEL_PATH = os.path.join(ASSETS_DIR, "scope_classifier.npz")
+
+N_FEATURES = 2 ** 15
+CHAR_NGRAM = 4
+WORD_CACHE_SIZE = 65536
+_WORD = re.compile(r"[a-z0-9]+")
+_SUFFIX = r"(?:s|es|ed|ing)?"
+
+
+class KeywordMatcher:
+    """Whole-word matcher for a list of (possibly multi-word) keywords"""
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        alternatives = sorted({self._pattern(k) for k in self.keywords}, key=len, reverse=True)
+        self._regex = re.compile(r"(?<![a-z0-9])(?:" + "|".join(alternatives) + ")" + _SUFFIX
+                                 + r"(?![a-z0-9])", re.IGNORECASE)
+        self._canonical = {self._normalize(k): k for k in self.keywords}
+
+    @staticmethod
+    def _pattern(keyword):
+        return r"[\s\-]+".join(re.escape(part) for part in re.split(r"[\s\-]+", keyword.strip()))
+
+    @staticmethod
+    def _normalize(text):
+        return " ".join(re.split(r"[\s\-]+", text.strip().lower()))
+
+    def _keyword(self, match):
+        text = self._normalize(match.group(0))
+        if text in self._canonical:
+            return self._canonical[text]
+        for suffix in ("es", "s", "ed", "ing"):
+            if text.endswith(suffix) and text[:-len(suffix)] in self._canonical:
+                return self._canonical[text[:-len(suffix)]]
+        return text
+
+    def search(self, text):
+        """The keyword that appears first in ``text``, or ``None``"""
+        match = self._regex.search(text)
+        return self._keyword(match) if match else None
+
+    def findall(self, text):
+        return [self._keyword(match) for match in self._regex.finditer(text)]
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+
+@lru_cache(maxsize=65536)
+def _word_buckets(word):
+    """Buckets of a word's unigram and character n-grams"""
+    padded = f"<{word}>"
+    grams = [f"w:{word}"]
+    grams += [f"c:{padded[i:i + CHAR_NGRAM]}" for i in range(max(1, len(padded) - CHAR_NGRAM + 1))]
+    return tuple(_bucket(gram) for gram in grams)
+
+
+def features(query):
+    """Hashed feature indices of ``query`` (with repeats)"""
+    words = _WORD.findall(query.lower())
+    buckets = [_bucket(f"b:{a} {b}") for a, b in zip(words, words[1:])]
+    for word in words:
+        buckets.extend(_word_buckets(word))
+    return buckets
+
+
+def featurize(queries):
+    """Sparse, L2-normalized feature matrix as ``(rows, cols, values)`` arrays"""
+    rows, cols = [], []
+    for row, query in enumerate(queries):
+        buckets = features(query)
+        rows.extend([row] * len(buckets))
+        cols.extend(buckets)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = np.ones(len(cols), dtype=np.float64)
+    norms = np.sqrt(np.bincount(rows, minlength=len(queries))).astype(np.float64)
+    if len(cols):
+        values /= norms[rows]
+    return rows, cols, values
+
+
+class ScopeClassifier:
+    """Logistic regression on hashed n-grams; ``predict_proba`` is P(in scope)"""
+
+    def __init__(self, weights=None, bias=0.0):
+        self.weights = np.zeros(N_FEATURES) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self._table = None
+        self._words = {}
+
+    def _word_weight(self, word):
+        cached = self._words.get(word)
+        if cached is None:
+            if len(self._words) >= WORD_CACHE_SIZE:
+                self._words.clear()
+            buckets = _word_buckets(word)
+            cached = self._words[word] = (sum(self._table[b] for b in buckets), len(buckets))
+        return cached
+
+    def score(self, query):
+        """P(in scope) of one query, without NumPy call overhead"""
+        if self._table is None:
+            self._table = self.weights.tolist()
+            self._words = {}
+        words = _WORD.findall(query.lower())
+        total = sum(self._table[_bucket(f"b:{a} {b}")] for a, b in zip(words, words[1:]))
+        count = max(len(words) - 1, 0)
+        for word in words:
+            weight, n = self._word_weight(word)
+            total += weight
+            count += n
+        logit = (total / math.sqrt(count) if count else 0.0) + self.bias
+        return 1.0 / (1.0 + math.exp(-max(min(logit, 500.0), -500.0)))
+
+    def _logits(self, matrix, n):
+        rows, cols, values = matrix
+        return np.bincount(rows, weights=self.weights[cols] * values, minlength=n) + self.bias
+
+    def predict_proba(self, queries):
+        """P(in scope) for each query, as a NumPy array
+
+        Repeated queries are scored once, and each distinct word's n-grams
+        are looked up once per batch; the per-query sums are ``bincount``s.
+        """
+        queries = list(queries)
+        if not queries:
+            return np.zeros(0)
+        unique = {}
+        inverse = np.fromiter((unique.setdefault(q, len(unique)) for q in queries), dtype=np.int64,
+                              count=len(queries))
+        vocabulary = {}
+        word_rows, word_ids, pair_rows, pair_buckets = [], [], [], []
+        for row, query in enumerate(unique):
+            words = _WORD.findall(query.lower())
+            word_rows.extend([row] * len(words))
+            word_ids.extend(vocabulary.setdefault(word, len(vocabulary)) for word in words)
+            pair_rows.extend([row] * max(len(words) - 1, 0))
+            pair_buckets.extend(_bucket(f"b:{a} {b}") for a, b in zip(words, words[1:]))
+        per_word = [_word_buckets(word) for word in vocabulary]
+        lengths = np.fromiter((len(b) for b in per_word), dtype=np.int64, count=len(per_word))
+        flat = np.fromiter((b for buckets in per_word for b in buckets), dtype=np.int64,
+                           count=int(lengths.sum()))
+        word_weight = np.bincount(np.repeat(np.arange(len(per_word)), lengths),
+                                  weights=self.weights[flat], minlength=len(per_word))
+
+        n = len(unique)
+        word_rows, word_ids = np.asarray(word_rows, dtype=np.int64), np.asarray(word_ids, dtype=np.int64)
+        pair_rows = np.asarray(pair_rows, dtype=np.int64)
+        pair_buckets = np.asarray(pair_buckets, dtype=np.int64)
+        total = (np.bincount(word_rows, weights=word_weight[word_ids], minlength=n)
+                 + np.bincount(pair_rows, weights=self.weights[pair_buckets], minlength=n))
+        count = (np.bincount(word_rows, weights=lengths[word_ids], minlength=n)
+                 + np.bincount(pair_rows, minlength=n))
+        logits = np.divide(total, np.sqrt(count), out=np.zeros(n), where=count > 0) + self.bias
+        return (1.0 / (1.0 + np.exp(-logits)))[inverse]
+
+    def fit(self, queries, labels, epochs=300, learning_rate=0.5, l2=1e-4):
+        """Full-batch gradient descent with Adam on the mean log loss"""
+        queries = list(queries)
+        y = np.asarray(labels, dtype=np.float64)
+        n = len(queries)
+        matrix = featurize(queries)
+        rows, cols, values = matrix
+        # balance the classes so the default threshold of 0.5 stays meaningful
+        positive = max(y.mean(), 1e-9)
+        sample_weight = np.where(y > 0, 0.5 / positive, 0.5 / max(1 - positive, 1e-9)) / n
+        m_w, v_w = np.zeros(N_FEATURES), np.zeros(N_FEATURES)
+        m_b = v_b = 0.0
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        self._table = None
+        for step in range(1, epochs + 1):
+            p = 1.0 / (1.0 + np.exp(-self._logits(matrix, n)))
+            residual = (p - y) * sample_weight
+            grad_w = np.bincount(cols, weights=values * residual[rows], minlength=N_FEATURES)
+            grad_w += l2 * self.weights
+            grad_b = residual.sum()
+            m_w = beta1 * m_w + (1 - beta1) * grad_w
+            v_w = beta2 * v_w + (1 - beta2) * grad_w ** 2
+            m_b = beta1 * m_b + (1 - beta1) * grad_b
+            v_b = beta2 * v_b + (1 - beta2) * grad_b ** 2
+            correction = np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+            self.weights -= learning_rate * correction * m_w / (np.sqrt(v_w) + eps)
+            self.bias -= learning_rate * correction * m_b / (np.sqrt(v_b) + eps)
+        return self
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights.astype(np.float32), bias=self.bias,
+                            n_features=N_FEATURES, char_ngram=CHAR_NGRAM)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["n_features"]) != N_FEATURES or int(data["char_ngram"]) != CHAR_NGRAM:
+                raise ValueError(f"{path} was trained with different feature settings; retrain it")
+            return cls(data["weights"], float(data["bias"]))
+
+
+@lru_cache(maxsize=None)
+def load_classifier(path=DEFAULT_MODEL_PATH):
+    """The shipped classifier, or ``None`` if its weights file is missing"""
+    if not os.path.exists(path):
+        return None
+    return ScopeClassifier.load(path)
+
+
+def load_labelled(path):
+    queries, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                queries.append(item["query"])
+                labels.append(1 if item["in_scope"] else 0)
+    return queries, labels
+
+
+def cross_validate(queries, labels, folds=5, seed=0, threshold=0.5, **fit_args):
+    """Accuracy, false-rejection and false-acceptance rates over ``folds`` splits
+
+    A held-out query counts as accepted when P(in scope) >= ``threshold``.
+    """
+    labels = np.asarray(labels)
+    order = np.random.default_rng(seed).permutation(len(queries))
+    predicted = np.zeros(len(queries), dtype=bool)
+    for fold in range(folds):
+        test = order[fold::folds]
+        train = np.setdiff1d(order, test)
+        model = ScopeClassifier().fit([queries[i] for i in train], labels[train], **fit_args)
+        predicted[test] = model.predict_proba([queries[i] for i in test]) >= threshold
+    truth = labels.astype(bool)
+    return {"accuracy": float((predicted == truth).mean()),
+            "false_reject": float((~predicted & truth).sum() / max(truth.sum(), 1)),
+            "false_accept": float((predicted & ~truth).sum() / max((~truth).sum(), 1))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the query scope classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="fit on labelled queries and save the weights")
+    train.add_argument("data", nargs="?", default=DEFAULT_DATA_PATH, help="labelled queries (JSONL)")
+    train.add_argument("-o", "--output", default=DEFAULT_MODEL_PATH)
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("--folds", type=int, default=5, help="cross-validation folds to report (0: skip)")
+    train.add_argument("--threshold", type=float, action="append",
+                       help="P(in scope) to accept at when reporting (repeatable; default 0.5)")
+    args = parser.parse_args(argv)
+
+    queries, labels = load_labelled(args.data)
+    print(f"{len(queries)} queries, {sum(labels)} in scope", file=sys.stderr)
+    if args.folds > 1:
+        for threshold in args.threshold or [0.5]:
+            scores = cross_validate(queries, labels, folds=args.folds, threshold=threshold,
+                                    epochs=args.epochs)
+            print(f"{args.folds}-fold at {threshold:g}: accuracy {scores['accuracy']:.3f}, false reject "
+                  f"{scores['false_reject']:.3f}, false accept {scores['false_accept']:.3f}",
+                  file=sys.stderr)
+    ScopeClassifier().fit(queries, labels, epochs=args.epochs).save(args.output)
+    print(f"saved {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
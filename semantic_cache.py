@@ -0,0 +1,248 @@
+"""Near-duplicate query cache using local hashed vectors
+
+Queries are canonicalized with the SSAM vocabulary (so "cold spray" and
+"CSAM", "aluminium" and "Al" coincide), reduced to unigram and bigram
+features, and hashed into a small L2-normalized vector. Vectors of every
+analysis mode live in one contiguous float32 matrix, so a lookup is a single
+matrix-vector product even with 100k entries and ``max_entries`` caps the
+whole cache. A hit only maps the new query
+to the exact-cache key of an earlier answer; the answer text itself stays in
+the ``ResponseCache``.
+
+To limit false hits a candidate must also mention exactly the same set of
+vocabulary entities (processes, materials, parameters, ...) as the query, and
+very short queries (typically context-dependent follow-ups such as "and for
+copper?") are never matched. Callers only use this tier for turns without
+conversation context.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_DIM = 256
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MIN_WORDS = 4
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+please should the to use used using what which with would you your
+""".split())
+
+# Generic query words that carry the same intent
+QUERY_SYNONYMS = {
+    "best": "optimal", "ideal": "optimal", "optimum": "optimal", "recommended": "optimal", "good": "optimal",
+    "settings": "parameters", "setting": "parameters", "parameter": "parameters",
+    "conditions": "parameters", "values": "parameters",
+    "reduce": "minimize", "lower": "minimize", "decrease": "minimize", "avoid": "minimize",
+    "prevent": "minimize", "eliminate": "minimize", "minimise": "minimize",
+    "vs": "compare", "versus": "compare", "comparison": "compare", "difference": "compare",
+    "differences": "compare", "compared": "compare",
+    "explain": "describe", "what's": "describe", "overview": "describe",
+    "fix": "troubleshoot", "solve": "troubleshoot", "issues": "problems", "issue": "problems",
+}
+
+
+class _Index:
+    """Growable float32 matrix plus parallel mode/signature/key columns
+
+    All analysis modes share one matrix so ``max_entries`` bounds the whole
+    cache; a lookup masks out rows of other modes and entity sets. ``rows``
+    maps each live key to its row so replacing or forgetting one is O(1).
+    """
+
+    def __init__(self, dim):
+        self.vectors = np.zeros((64, dim), dtype=np.float32)
+        self.modes = np.zeros(64, dtype=np.int32)
+        self.signatures = np.zeros(64, dtype=np.int64)
+        self.keys = []
+        self.rows = {}
+        self._mode_ids = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def mode_id(self, mode):
+        return self._mode_ids.setdefault(mode, len(self._mode_ids) + 1)
+
+    def add(self, vector, mode, signature, key):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.vectors):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+                self.modes = np.concatenate([self.modes, np.zeros_like(self.modes)])
+                self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+            self.keys.append(key)
+            self.rows[key] = row
+        self.vectors[row] = vector
+        self.modes[row] = self.mode_id(mode)
+        self.signatures[row] = signature
+
+    def search(self, vector, mode, signature):
+        n = len(self.keys)
+        mode_id = self._mode_ids.get(mode)
+        if not n or mode_id is None:
+            return None, 0.0
+        sims = self.vectors[:n] @ vector
+        sims[(self.modes[:n] != mode_id) | (self.signatures[:n] != signature)] = -1.0
+        best = int(np.argmax(sims))
+        return self.keys[best], float(sims[best])
+
+    def remove(self, key):
+        """Blank the row of ``key`` (it is compacted away on the next eviction)"""
+        row = self.rows.pop(key, None)
+        if row is None:
+            return False
+        self.vectors[row] = 0.0
+        self.modes[row] = 0
+        self.keys[row] = None
+        return True
+
+    def drop_oldest(self, count):
+        """Remove the ``count`` oldest rows and return their live keys"""
+        n = len(self.keys)
+        self.vectors[:n - count] = self.vectors[count:n]
+        self.modes[:n - count] = self.modes[count:n]
+        self.signatures[:n - count] = self.signatures[count:n]
+        dropped = [key for key in self.keys[:count] if key is not None]
+        del self.keys[:count]
+        self.rows = {key: row for row, key in enumerate(self.keys) if key is not None}
+        return dropped
+
+
+class SemanticCache:
+    """Maps paraphrased queries to the exact-cache key of an earlier answer"""
+
+    def __init__(self, path=None, extractor=None, dim=DEFAULT_DIM,
+                 threshold=DEFAULT_THRESHOLD, max_entries=DEFAULT_MAX_ENTRIES,
+                 min_words=DEFAULT_MIN_WORDS):
+        self.extractor = extractor
+        self.min_words = min_words
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index = _Index(dim)
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS semantic_queries (
+                       key TEXT NOT NULL,
+                       mode TEXT NOT NULL,
+                       signature INTEGER NOT NULL,
+                       vector BLOB NOT NULL,
+                       created REAL NOT NULL,
+                       PRIMARY KEY (mode, key)
+                   )"""
+            )
+            self._conn.commit()
+            self._load()
+
+    # -- embedding ---------------------------------------------------------
+
+    def _features(self, query):
+        text = query
+        if self.extractor is not None:
+            text = self.extractor.canonicalize(text)
+        text = text.lower()
+        tokens = [QUERY_SYNONYMS.get(t, t) for t in _TOKEN_RE.findall(text)]
+        tokens = [t for t in tokens if t not in _STOPWORDS]
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, query):
+        """Signed feature-hashed, L2-normalized vector for ``query``"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(query):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def signature(self, query):
+        """Stable 63-bit hash of the set of vocabulary entities in ``query``"""
+        if self.extractor is None:
+            return 0
+        names = "\x1f".join(sorted(self.extractor.entity_set(query))).encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(names, digest_size=8).digest(), "big") >> 1
+
+    # -- public API --------------------------------------------------------
+
+    def lookup(self, query, mode):
+        """Return ``(key, similarity)`` of the closest earlier query or ``(None, sim)``"""
+        if len(query.split()) < self.min_words:
+            self.misses += 1
+            return None, 0.0
+        vector = self.embed(query)
+        if not vector.any():
+            self.misses += 1
+            return None, 0.0
+        signature = self.signature(query)
+        with self._lock:
+            key, similarity = self._index.search(vector, mode, signature)
+        if key is not None and similarity >= self.threshold:
+            self.hits += 1
+            return key, similarity
+        self.misses += 1
+        return None, similarity
+
+    def add(self, query, mode, key):
+        """Remember that ``query`` in ``mode`` was answered under cache ``key``"""
+        if len(query.split()) < self.min_words:
+            return
+        vector = self.embed(query)
+        if not vector.any():
+            return
+        signature = self.signature(query)
+        with self._lock:
+            self._index.add(vector, mode, signature, key)
+            dropped = []
+            if len(self._index) > self.max_entries:
+                dropped = self._index.drop_oldest(max(1, self.max_entries // 10))
+            if self._conn is not None:
+                self._conn.executemany(
+                    "DELETE FROM semantic_queries WHERE key = ?", [(k,) for k in dropped]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO semantic_queries VALUES (?, ?, ?, ?, ?)",
+                    (key, mode, signature, vector.tobytes(), time.time()),
+                )
+                self._conn.commit()
+
+    def forget(self, key):
+        """Drop a key whose answer is no longer in the exact cache"""
+        with self._lock:
+            if not self._index.remove(key):
+                return
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM semantic_queries WHERE key = ?", (key,))
+                self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._index.rows),
+            "threshold": self.threshold,
+        }
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT key, mode, signature, vector FROM semantic_queries ORDER BY created"
+        ).fetchall()
+        for key, mode, signature, blob in rows[-self.max_entries:]:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            if vector.shape[0] != self.dim:
+                continue
+            self._index.add(vector, mode, signature, key)
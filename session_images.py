@@ -0,0 +1,194 @@
+"""Compact image references for chat history and the session memory budget
+
+Messages keep a small JPEG thumbnail and a content hash per image instead of
+the full PIL image; originals are written to a disk-only ``PdfCache`` (LRU by
+bytes) in the background and reloaded only when the user opens one. PDF page
+rasters are not copied: their reference points at the page already held by
+the PDF cache.
+
+Session memory is estimated over everything a session keeps in
+``st.session_state`` (messages, cached knowledge-graph figures, conversation
+context, turn traces and session telemetry). Over budget, the cached figures
+go first, then the oldest turn traces, then the oldest thumbnails.
+"""
+import hashlib
+import io
+import threading
+
+from pdf_cache import PAGE_KEY_INFO
+
+THUMBNAIL_EDGE = 256
+THUMBNAIL_QUALITY = 80
+
+# digest -> original whose background write has not landed yet
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def image_digest(image):
+    """Content hash of a decoded image (mode, size and pixels)"""
+    h = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def original_key(digest):
+    return (digest, "original")
+
+
+def make_thumbnail(image, edge=THUMBNAIL_EDGE, quality=THUMBNAIL_QUALITY):
+    """JPEG bytes of ``image`` scaled to at most ``edge`` pixels"""
+    thumb = image.copy()
+    thumb.thumbnail((edge, edge))
+    if thumb.mode != "RGB":
+        thumb = thumb.convert("RGB")
+    buf = io.BytesIO()
+    thumb.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _write_original(store, digest, image):
+    try:
+        store.put(original_key(digest), image)
+    finally:
+        with _pending_lock:
+            _pending.pop(digest, None)
+
+
+def _pdf_page_ref(image, pdf_cache):
+    """``PdfCache`` key of a PDF page raster that cache keeps on disk, else None"""
+    key = image.info.get(PAGE_KEY_INFO)
+    if key is None or pdf_cache is None or not pdf_cache.disk_enabled:
+        return None
+    return key if pdf_cache.contains(key) else None
+
+
+def spill_image(image, label, store, executor=None, pdf_cache=None):
+    """Return a reference dict for ``image`` and persist the original
+
+    The reference holds ``hash``, ``label``, ``size`` and ``thumb`` (JPEG
+    bytes). A PDF page raster that ``pdf_cache`` already holds on disk is
+    referenced by its cache key (``pdf_page``) instead of being stored again.
+    Any other original is written to ``store`` on ``executor`` when given,
+    otherwise synchronously; until a background write lands the image is
+    kept in memory so ``load_original`` can serve it.
+    """
+    page_key = _pdf_page_ref(image, pdf_cache)
+    if page_key is not None:
+        return {
+            "hash": hashlib.sha256(repr(page_key).encode("utf-8")).hexdigest(),
+            "label": label,
+            "size": image.size,
+            "thumb": make_thumbnail(image),
+            "pdf_page": page_key,
+        }
+
+    digest = image_digest(image)
+    with _pending_lock:
+        pending = digest in _pending
+    if not pending and not store.contains(original_key(digest)):
+        if executor is not None:
+            with _pending_lock:
+                _pending[digest] = image
+            executor.submit(_write_original, store, digest, image)
+        else:
+            store.put(original_key(digest), image)
+    return {
+        "hash": digest,
+        "label": label,
+        "size": image.size,
+        "thumb": make_thumbnail(image),
+    }
+
+
+def load_original(ref, store, pdf_cache=None):
+    """Full-resolution image for ``ref``, or None if it was evicted"""
+    if ref.get("pdf_page") is not None:
+        return pdf_cache.get(ref["pdf_page"]) if pdf_cache is not None else None
+    with _pending_lock:
+        image = _pending.get(ref["hash"])
+    return image if image is not None else store.get(original_key(ref["hash"]))
+
+
+def _message_images(message):
+    for f in message.get("files") or ():
+        if f.get("image"):
+            yield f["image"]
+    yield from message.get("response_images") or ()
+
+
+def estimate_message_bytes(message):
+    """Approximate memory held by one chat message"""
+    size = len(message.get("content", "").encode("utf-8"))
+    size += sum(len(str(e)) for e in message.get("entities") or ())
+    size += sum(len(str(r)) for r in message.get("relationships") or ())
+    size += sum(len(str(r)) for r in message.get("references") or ())
+    for ref in _message_images(message):
+        size += len(ref.get("thumb") or b"") + 200
+    return size
+
+
+def approx_bytes(value):
+    """Rough size of plain data (strings, bytes, numbers and containers)"""
+    if isinstance(value, (str, bytes)):
+        return len(value) + 50
+    if isinstance(value, dict):
+        return 100 + sum(approx_bytes(k) + approx_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 60 + sum(approx_bytes(item) for item in value)
+    return 32
+
+
+def estimate_session_bytes(state):
+    """Approximate memory held by one session, per ``st.session_state`` entry
+
+    ``kg_figures`` values are ``(figure, size)`` pairs and ``session_telemetry``
+    is a ``Telemetry``; missing entries count as empty.
+    """
+    telemetry = state.get("session_telemetry")
+    return {
+        "messages": sum(estimate_message_bytes(message) for message in state.get("messages") or ()),
+        "kg_figures": sum(size for _, size in (state.get("kg_figures") or {}).values()),
+        "conversation_context": approx_bytes(state.get("conversation_context") or []),
+        "turn_traces": sum(approx_bytes(record) for record in state.get("turn_traces") or ()),
+        "session_telemetry": telemetry.approx_bytes() if telemetry is not None else 0,
+    }
+
+
+def enforce_budget(state, budget_bytes):
+    """Shrink a session to at most ``budget_bytes`` (estimated)
+
+    Cached knowledge-graph figures are dropped first (oldest first, rebuilt
+    on demand), then the oldest turn traces (already counted in the process
+    telemetry and metrics log), then thumbnails from the oldest messages
+    (originals stay on disk, so dropped images can still be opened). The
+    conversation context and session telemetry have fixed bounds of their
+    own and are only counted. Returns the estimated session size afterwards.
+    """
+    sizes = estimate_session_bytes(state)
+    total = sum(sizes.values())
+    if not budget_bytes or total <= budget_bytes:
+        return total
+
+    figures = state.get("kg_figures") or {}
+    while figures and total > budget_bytes:
+        _, (_, size) = figures.popitem(last=False)
+        total -= size
+
+    traces = state.get("turn_traces") or []
+    dropped = 0
+    while dropped < len(traces) and total > budget_bytes:
+        total -= approx_bytes(traces[dropped])
+        dropped += 1
+    del traces[:dropped]
+
+    for message in state.get("messages") or ():
+        if total <= budget_bytes:
+            break
+        for ref in _message_images(message):
+            if ref.get("thumb"):
+                total -= len(ref["thumb"])
+                ref["thumb"] = None
+                if total <= budget_bytes:
+                    break
+    return total
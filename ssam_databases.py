@@ -0,0 +1,129 @@
+"""Built-in SSAM process and material databases
+
+Kept in their own module so they are built once per server process instead
+of on every Streamlit rerun of ``main.py``.
+"""
+
+# Solid-State AM Process Database
+SSAM_PROCESSES = {
+    "CSAM": {
+        "name": "Cold Spray Additive Manufacturing",
+        "temperature_range": "< 0.5 Tm",
+        "bonding_mechanism": "Kinetic energy, plastic deformation",
+        "typical_materials": ["Al", "Cu", "Ti", "Stainless Steel", "Composites"],
+        "advantages": ["No melting", "Low oxidation", "High deposition rate", "Thick coatings"],
+        "limitations": ["Limited geometry", "Porosity control", "Equipment cost"],
+        "typical_velocity": "300-1200 m/s",
+        "typical_pressure": "1-5 MPa",
+        "applications": ["Repair", "Coatings", "Structural components"]
+    },
+    "UAM": {
+        "name": "Ultrasonic Additive Manufacturing",
+        "temperature_range": "< 0.5 Tm",
+        "bonding_mechanism": "Ultrasonic vibration, solid-state welding",
+        "typical_materials": ["Al", "Cu", "Stainless Steel", "Ti", "Composites"],
+        "advantages": ["Precision", "Embedded sensors", "Low temperature", "Dissimilar metals"],
+        "limitations": ["Slow deposition", "Layer delamination", "Surface finish"],
+        "typical_frequency": "20 kHz",
+        "typical_force": "1000-4000 N",
+        "applications": ["Aerospace", "Electronics", "Embedded systems"]
+    },
+    "FSAM": {
+        "name": "Friction Stir Additive Manufacturing",
+        "temperature_range": "0.6-0.9 Tm",
+        "bonding_mechanism": "Friction heat, plastic deformation",
+        "typical_materials": ["Al alloys", "Mg alloys", "Steel", "Ti"],
+        "advantages": ["Dense parts", "Good mechanical properties", "Large components"],
+        "limitations": ["Tool wear", "Complex geometries limited", "Force requirements"],
+        "typical_rotation": "200-2000 RPM",
+        "typical_traverse": "50-500 mm/min",
+        "applications": ["Structural parts", "Large components", "Repair"]
+    },
+    "AFSD": {
+        "name": "Additive Friction Stir Deposition",
+        "temperature_range": "0.7-0.95 Tm",
+        "bonding_mechanism": "Friction heat, severe plastic deformation",
+        "typical_materials": ["Al", "Mg", "Ti", "Steel", "Inconel"],
+        "advantages": ["High density", "Excellent properties", "Large parts", "High deposition"],
+        "limitations": ["Equipment requirements", "Process control", "Tool design"],
+        "typical_rotation": "300-600 RPM",
+        "typical_feed_rate": "100-300 mm/min",
+        "applications": ["Aerospace", "Defense", "Large structures"]
+    }
+}
+
+# Typical parameter windows per process: (parameter, range, notes). Each
+# ``typical_*`` range in SSAM_PROCESSES must match the parameter of the same
+# name here (``ParameterDB.from_databases`` refuses to build otherwise).
+def _friction_parameters(rotation):
+    return [
+        ("Rotation Speed", rotation, "Affects heat"),
+        ("Traverse Speed", "50-500 mm/min", "Affects microstructure"),
+        ("Axial Force", "5-50 kN", "Critical parameter"),
+        ("Feed Rate", "100-300 mm/min", "Deposition rate"),
+        ("Tool Design", "Process specific", "Affects flow"),
+    ]
+
+
+PROCESS_PARAMETERS = {
+    "CSAM": [
+        ("Particle Velocity", "300-1200 m/s", "Critical for bonding"),
+        ("Gas Pressure", "1-5 MPa", "Affects velocity"),
+        ("Gas Temperature", "200-1000°C", "Affects particle temp"),
+        ("Standoff Distance", "10-50 mm", "Affects deposition"),
+        ("Traverse Speed", "10-500 mm/s", "Affects build quality"),
+    ],
+    "UAM": [
+        ("Frequency", "20 kHz", "Fixed by system"),
+        ("Amplitude", "10-50 µm", "Key parameter"),
+        ("Normal Force", "1000-4000 N", "Critical for bonding"),
+        ("Weld Speed", "20-100 mm/s", "Affects quality"),
+        ("Layer Thickness", "100-200 µm", "Per layer"),
+    ],
+    "FSAM": _friction_parameters("200-2000 RPM"),
+    "AFSD": _friction_parameters("300-600 RPM"),
+}
+
+# Material properties database
+MATERIAL_DATABASE = {
+    "Aluminum 6061": {
+        "density": "2.70 g/cm³",
+        "melting_point": "582-652°C",
+        "thermal_conductivity": "167 W/m·K",
+        "yield_strength": "276 MPa",
+        "tensile_strength": "310 MPa",
+        "specific_heat": "896 J/kg·K",
+        "ssam_compatibility": ["CSAM", "UAM", "FSAM", "AFSD"],
+        "common_applications": "Aerospace, automotive, structural"
+    },
+    "Copper": {
+        "density": "8.96 g/cm³",
+        "melting_point": "1085°C",
+        "thermal_conductivity": "401 W/m·K",
+        "yield_strength": "70 MPa",
+        "tensile_strength": "220 MPa",
+        "specific_heat": "385 J/kg·K",
+        "ssam_compatibility": ["CSAM", "UAM"],
+        "common_applications": "Electronics, heat exchangers, conductors"
+    },
+    "Titanium Ti-6Al-4V": {
+        "density": "4.43 g/cm³",
+        "melting_point": "1604-1660°C",
+        "thermal_conductivity": "6.7 W/m·K",
+        "yield_strength": "880 MPa",
+        "tensile_strength": "950 MPa",
+        "specific_heat": "526 J/kg·K",
+        "ssam_compatibility": ["CSAM", "UAM", "FSAM", "AFSD"],
+        "common_applications": "Aerospace, biomedical, high-performance"
+    },
+    "Stainless Steel 316L": {
+        "density": "8.00 g/cm³",
+        "melting_point": "1375-1400°C",
+        "thermal_conductivity": "16 W/m·K",
+        "yield_strength": "170 MPa",
+        "tensile_strength": "485 MPa",
+        "specific_heat": "500 J/kg·K",
+        "ssam_compatibility": ["CSAM", "UAM", "FSAM"],
+        "common_applications": "Corrosion resistance, marine, chemical"
+    }
+}
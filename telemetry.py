@@ -0,0 +1,227 @@
+"""Lightweight per-stage timing spans and counters
+
+A ``Telemetry`` keeps, per stage, a count, a running sum and the most recent
+``max_samples`` durations (for p50/p99), plus named counters with optional
+labels. One instance is shared by the whole server process and each session
+keeps a smaller one of its own; spans and counters are reported to both.
+
+Exports: ``prometheus_text()`` (text exposition format, stage latencies as
+summaries), ``MetricsServer`` (serves it on ``/metrics`` from a daemon
+thread) and ``JsonlExporter`` (one JSON line per finished turn ``Trace``).
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SAMPLES = 2048
+QUANTILES = (0.5, 0.99)
+PREFIX = "ssam"
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Telemetry:
+    """Thread-safe stage latencies and counters"""
+
+    def __init__(self, max_samples=DEFAULT_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stages = {}    # stage -> [count, sum, deque of recent durations]
+        self._counters = {}  # (name, label pairs) -> value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [0, 0.0, deque(maxlen=self.max_samples)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+
+    def add(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage, fn):
+        """``fn`` wrapped so every call is observed as ``stage``"""
+        def wrapper(*args, **kwargs):
+            with self.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    # -- reading -------------------------------------------------------
+    def stage_stats(self):
+        """``{stage: {count, sum, p50, p99, max}}`` (quantiles over recent samples)"""
+        with self._lock:
+            snapshot = {stage: (count, total, list(samples))
+                        for stage, (count, total, samples) in self._stages.items()}
+        return {
+            stage: {"count": count, "sum": total, "p50": _percentile(samples, 0.5),
+                    "p99": _percentile(samples, 0.99), "max": max(samples) if samples else 0.0}
+            for stage, (count, total, samples) in snapshot.items()
+        }
+
+    def approx_bytes(self):
+        """Rough memory held by the samples and counters"""
+        with self._lock:
+            samples = sum(len(entry[2]) for entry in self._stages.values())
+            return 32 * samples + 200 * (len(self._stages) + len(self._counters))
+
+    def counter(self, name, **labels):
+        with self._lock:
+            if labels:
+                return self._counters.get((name, _label_key(labels)), 0)
+            return sum(value for (counter, _), value in self._counters.items() if counter == name)
+
+    def counters(self):
+        """``{(name, ((label, value), ...)): value}``"""
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus_text(self):
+        """Stage latencies (summaries) and counters in Prometheus text format"""
+        with self._lock:
+            stages = {stage: (count, total, list(samples))
+                      for stage, (count, total, samples) in self._stages.items()}
+            counters = dict(self._counters)
+        name = f"{PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each request stage",
+                 f"# TYPE {name} summary"]
+        for stage in sorted(stages):
+            count, total, samples = stages[stage]
+            for q in QUANTILES:
+                labels = _format_labels((("stage", stage), ("quantile", q)))
+                lines.append(f"{name}{labels} {_percentile(samples, q):.6f}")
+            labels = _format_labels((("stage", stage),))
+            lines.append(f"{name}_sum{labels} {total:.6f}")
+            lines.append(f"{name}_count{labels} {count}")
+        by_name = {}
+        for (counter, labels), value in counters.items():
+            by_name.setdefault(counter, []).append((labels, value))
+        for counter in sorted(by_name):
+            metric = f"{PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(by_name[counter]):
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans and counters of one unit of work (e.g. one chat turn)
+
+    Every observation is also forwarded to ``sinks`` (``Telemetry``
+    instances); ``to_record()`` returns the JSON-serializable summary.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = [sink for sink in sinks if sink is not None]
+        self.started = time.time()
+        self.spans = {}
+        self.counters = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        for sink in self.sinks:
+            sink.observe(stage, seconds)
+
+    def add(self, name, value=1, **labels):
+        key = name if not labels else name + "".join(f".{v}" for _, v in _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+        for sink in self.sinks:
+            sink.add(name, value, **labels)
+
+    def to_record(self, **fields):
+        record = {"ts": self.started, **fields}
+        record["spans"] = {stage: round(seconds, 6) for stage, seconds in self.spans.items()}
+        record["counters"] = dict(self.counters)
+        return record
+
+
+class JsonlExporter:
+    """Appends one JSON object per line to ``path`` (thread-safe)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class MetricsServer:
+    """``GET /metrics`` (Prometheus text) and ``GET /metrics.json`` for a ``Telemetry``"""
+
+    def __init__(self, telemetry, port, host="0.0.0.0"):
+        outer = telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = outer.prometheus_text().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(outer.stage_stats()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http",
+                                        daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()